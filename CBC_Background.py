@@ -112,12 +112,10 @@ def main():
 
     detectors_ids = args.detectors
 
-    parameters = pd.read_hdf(pop_file)
+    # the population is streamed from disk in blocks, instead of being loaded at once
+    ns = gw.storage.population_length(pop_file)
 
-    ns = len(parameters)
-
-    network = gw.detection.Network(detectors_ids, detection_SNR=threshold_SNR, parameters=parameters,
-                                   fisher_parameters=None, config=ConfigDet)
+    network = gw.detection.Network(detectors_ids, detection_SNR=(0., threshold_SNR), config=ConfigDet)
 
     waveform_model = 'IMRPhenomD'
     #waveform_model = 'TaylorF2'
@@ -131,8 +129,12 @@ def main():
     cnt = np.zeros((N,))
 
     print('Processing CBC population')
-    for k in tqdm(np.arange(ns)):
-        parameter_values = parameters.iloc[k]
+    population = (
+        parameter_values
+        for chunk in gw.storage.read_population_chunks(pop_file)
+        for _, parameter_values in chunk.iterrows()
+    )
+    for parameter_values in tqdm(population, total=ns):
         tc = parameter_values['geocent_time']
 
         # make a precut on the signals; note that this depends on how long signals stay in band (here not more than 3 days)
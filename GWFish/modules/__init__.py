@@ -1,2 +1,2 @@
 from __future__ import absolute_import
-from . import auxiliary, detection, fishermatrix, waveforms, constants, fft
+from . import auxiliary, detection, fishermatrix, waveforms, constants, fft, storage, covariance, reparameterization
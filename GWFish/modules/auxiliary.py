@@ -135,7 +135,10 @@ def scalar_product(deriv1, deriv2, detector):
 
     scalar_prods = np.zeros(len(components))
     for k in np.arange(len(components)):
-        scalar_prods[k] = 4 * np.trapz(
-                np.real(deriv1[:, k] * np.conjugate(deriv2[:, k])) / components[k].Sn(ff[:, 0]), ff[:, 0], axis=0)
+        # the products of single-precision strains would underflow, so they are taken in double precision;
+        # the columns are made contiguous, since numpy may take the scalar loop for a product of strided
+        # complex arrays depending on where the result is allocated (see detection.projection_earth)
+        product = np.ascontiguousarray(deriv1[:, k], dtype=np.complex128) * np.conjugate(np.ascontiguousarray(deriv2[:, k], dtype=np.complex128))
+        scalar_prods[k] = 4 * np.trapz(np.real(product) / components[k].Sn(ff[:, 0]), ff[:, 0], axis=0)
 
     return scalar_prods
\ No newline at end of file
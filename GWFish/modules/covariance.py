@@ -0,0 +1,245 @@
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Union
+
+import GWFish.modules.fishermatrix as fishermatrix
+import GWFish.modules.storage as storage
+
+def _parameter_indices(parameter_names: list[str], parameters: list[str]) -> list[int]:
+    unknown = [parameter for parameter in parameters if parameter not in parameter_names]
+    if unknown:
+        raise ValueError(f'Parameters {unknown} are not among the parameters of the matrices, {parameter_names}')
+    return [parameter_names.index(parameter) for parameter in parameters]
+
+def conditional_covariance(
+    covariances: np.ndarray,
+    parameter_names: list[str],
+    parameters: list[str],
+    known_parameters: list[str] = [],
+) -> np.ndarray:
+    """
+    Covariance of some of the parameters, marginalized over the parameters
+    which are neither requested nor known, and conditioned on the `known_parameters`
+    (e.g. the sky position of a signal with an electromagnetic counterpart).
+
+    It is computed from the full covariance $\\Sigma$ (the inverse of the Fisher matrix)
+    through the Schur complement
+    $\\Sigma_{PP} - \\Sigma_{PK} \\Sigma_{KK}^{-1} \\Sigma_{KP}$,
+    where $P$ are the requested parameters and $K$ the known ones,
+    for a whole stack of covariance matrices at once.
+    Marginalization only requires selecting the $\\Sigma_{PP}$ block.
+
+    Example usage:
+
+    ```
+    >>> fisher = np.array([[[2., 1., 0.], [1., 2., 1.], [0., 1., 2.]]])
+    >>> covariance = np.linalg.inv(fisher)
+    >>> print(conditional_covariance(covariance, ['a', 'b', 'c'], ['a'], known_parameters=['b', 'c']))
+    [[[0.5]]]
+    >>> print(conditional_covariance(covariance, ['a', 'b', 'c'], ['a']))
+    [[[0.75]]]
+
+    ```
+
+    :param covariances: array with shape `(n_signals, n_params, n_params)` - covariance matrices, such as the inverse Fisher matrices saved by `compute_network_errors`
+    :param parameter_names: names of the `n_params` parameters of the matrices
+    :param parameters: parameters whose covariance is returned
+    :param known_parameters: parameters whose value is assumed to be known exactly
+
+    :return: array with shape `(n_signals, len(parameters), len(parameters))`
+    """
+
+    overlap = set(parameters) & set(known_parameters)
+    if overlap:
+        raise ValueError(f'Parameters {sorted(overlap)} cannot be both requested and known')
+
+    requested = _parameter_indices(parameter_names, parameters)
+    known = _parameter_indices(parameter_names, known_parameters)
+
+    covariances = np.asarray(covariances)
+    covariance_PP = covariances[:, requested][:, :, requested]
+
+    if not known:
+        return covariance_PP
+
+    covariance_PK = covariances[:, requested][:, :, known]
+    covariance_KK = covariances[:, known][:, :, known]
+
+    # the inverse of the known block is computed as the one of a Fisher matrix,
+    # i.e. with a pseudo-inverse if it is ill-conditioned
+    inverse_KK, _, _ = fishermatrix.invert_fisher_matrices(covariance_KK)
+
+    return covariance_PP - covariance_PK @ inverse_KK @ np.swapaxes(covariance_PK, 1, 2)
+
+def conditional_errors(
+    covariances: Union[np.ndarray, storage.MatrixStore],
+    parameters: list[str],
+    known_parameters: list[str] = [],
+    parameter_names: Optional[list[str]] = None,
+    block_size: int = 10_000,
+) -> np.ndarray:
+    """
+    One-sigma errors on some of the parameters, marginalized over the
+    ones which are neither requested nor known, and conditioned on the known ones;
+    see `conditional_covariance`.
+
+    This allows to change the set of parameters which are assumed to be known
+    without recomputing the Fisher matrices: they only need to be computed once,
+    with all the parameters, and saved with `save_matrices=True`.
+
+    :param covariances: array with shape `(n_signals, n_params, n_params)`, or a `storage.MatrixStore` of inverse Fisher matrices, which is read `block_size` matrices at a time
+    :param parameters: parameters whose errors are returned
+    :param known_parameters: parameters whose value is assumed to be known exactly
+    :param parameter_names: names of the parameters of the matrices; only needed for arrays, since stores keep them
+    :param block_size: number of matrices processed at a time
+
+    :return: array with shape `(n_signals, len(parameters))`
+    """
+
+    if isinstance(covariances, storage.MatrixStore):
+        parameter_names = covariances.parameter_names
+    elif parameter_names is None:
+        raise ValueError('The parameter names are needed to query an array of covariances')
+
+    n_signals = len(covariances)
+    errors = np.zeros((n_signals, len(parameters)))
+
+    for start in range(0, n_signals, block_size):
+        block = slice(start, min(start + block_size, n_signals))
+        block_covariance = conditional_covariance(
+            np.asarray(covariances[block], dtype=np.float64), parameter_names, parameters, known_parameters
+        )
+        errors[block] = np.sqrt(np.einsum('...ii->...i', block_covariance))
+
+    return errors
+
+# physical ranges of the parameters, enforced on the samples drawn by `sample_from_covariances`
+DEFAULT_BOUNDS = {
+    'mass_1': (0., np.inf),
+    'mass_2': (0., np.inf),
+    'mass_1_source': (0., np.inf),
+    'mass_2_source': (0., np.inf),
+    'chirp_mass': (0., np.inf),
+    'chirp_mass_source': (0., np.inf),
+    'mass_ratio': (0., np.inf),
+    'luminosity_distance': (0., np.inf),
+    'redshift': (0., np.inf),
+    'a_1': (-1., 1.),
+    'a_2': (-1., 1.),
+    'chi_eff': (-1., 1.),
+    'lambda_1': (0., np.inf),
+    'lambda_2': (0., np.inf),
+}
+
+def _sampling_factors(covariances: np.ndarray) -> np.ndarray:
+    """
+    Matrices $A$ such that $\\Sigma = A A^T$: the Cholesky factors if all covariances
+    in the block are positive definite, otherwise the square roots from their
+    eigendecomposition, with negative eigenvalues (from rounding) set to zero.
+    """
+
+    try:
+        return np.linalg.cholesky(covariances)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariances)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0., None))[:, np.newaxis, :]
+
+def sample_from_covariances(
+    covariances: Union[np.ndarray, storage.MatrixStore],
+    parameter_values: pd.DataFrame,
+    n_samples: int,
+    parameter_names: Optional[list[str]] = None,
+    bounds: Optional[dict[str, tuple[float, float]]] = None,
+    max_redraws: int = 100,
+    rng: Optional[np.random.Generator] = None,
+    filename: Optional[Union[Path, str]] = None,
+    block_size: int = 10_000,
+) -> Optional[pd.DataFrame]:
+    """
+    Draw Gaussian samples around the parameters of each signal, with the
+    covariance given by its inverse Fisher matrix, `block_size` signals at a time.
+
+    Samples falling outside of the physical `bounds` of any parameter are
+    drawn again, up to `max_redraws` times; the few which are still outside
+    are then clipped to the bounds.
+
+    Example usage:
+
+    ```
+    >>> values = pd.DataFrame({'mass_1': [30., 10.], 'luminosity_distance': [100., 500.]})
+    >>> covariances = np.array([np.diag([1., 100.]), np.diag([4., 1e4])])
+    >>> samples = sample_from_covariances(covariances, values, 1000, parameter_names=['mass_1', 'luminosity_distance'], rng=np.random.default_rng(1))
+    >>> print(samples.shape, samples['luminosity_distance'].min() > 0)
+    (2000, 4) True
+
+    ```
+
+    :param covariances: array with shape `(n_signals, n_params, n_params)`, or a `storage.MatrixStore` of inverse Fisher matrices
+    :param parameter_values: parameters of the signals, around which the samples are drawn; for an array of covariances, its rows correspond to the matrices, while for a store they are selected through the index saved in the store
+    :param n_samples: number of samples per signal
+    :param parameter_names: names of the parameters of the matrices; only needed for arrays, since stores keep them
+    :param bounds: lower and upper bounds of the parameters; defaults to `DEFAULT_BOUNDS`
+    :param max_redraws: maximum number of times the samples outside of the bounds are drawn again
+    :param rng: numpy random generator; if `None`, a new one is created
+    :param filename: if given, the samples are appended block by block to a table in this HDF5 file (see `storage.append_table`) instead of being returned
+    :param block_size: number of signals processed at a time
+
+    :return: dataframe with columns `event` (the index of the signal in `parameter_values`), `sample` and the parameters, or `None` if `filename` is given
+    """
+
+    if isinstance(covariances, storage.MatrixStore):
+        parameter_names = covariances.parameter_names
+        events = pd.Index(covariances.index)
+        means = parameter_values.loc[events, parameter_names].to_numpy(dtype=float)
+    elif parameter_names is None:
+        raise ValueError('The parameter names are needed to sample from an array of covariances')
+    else:
+        events = parameter_values.index
+        means = parameter_values[parameter_names].to_numpy(dtype=float)
+
+    if bounds is None:
+        bounds = DEFAULT_BOUNDS
+    if rng is None:
+        rng = np.random.default_rng()
+
+    lower = np.array([bounds.get(name, (-np.inf, np.inf))[0] for name in parameter_names])
+    upper = np.array([bounds.get(name, (-np.inf, np.inf))[1] for name in parameter_names])
+
+    n_signals, n_params = means.shape
+    blocks = []
+
+    for start in range(0, n_signals, block_size):
+        block = slice(start, min(start + block_size, n_signals))
+        factors = _sampling_factors(np.asarray(covariances[block], dtype=np.float64))
+        block_means = means[block]
+
+        normal = rng.standard_normal((len(block_means), n_samples, n_params))
+        samples = block_means[:, np.newaxis, :] + np.einsum('eij,ekj->eki', factors, normal)
+
+        outside = np.any((samples < lower) | (samples > upper), axis=-1)
+        for _ in range(max_redraws):
+            if not np.any(outside):
+                break
+            i_event, _ = np.nonzero(outside)
+            normal = rng.standard_normal((len(i_event), n_params))
+            samples[outside] = block_means[i_event] + np.einsum('eij,ej->ei', factors[i_event], normal)
+            outside = np.any((samples < lower) | (samples > upper), axis=-1)
+
+        if np.any(outside):
+            logging.warning(f'Clipping {np.sum(outside)} samples which are still outside of the bounds after {max_redraws} redraws')
+            samples = np.clip(samples, lower, upper)
+
+        block_samples = pd.DataFrame(samples.reshape(-1, n_params), columns=parameter_names)
+        block_samples.insert(0, 'event', np.repeat(events[block].to_numpy(), n_samples))
+        block_samples.insert(1, 'sample', np.tile(np.arange(n_samples), len(block_means)))
+
+        if filename is not None:
+            storage.append_table(Path(filename), block_samples, key='samples', append=start > 0)
+        else:
+            blocks.append(block_samples)
+
+    if filename is not None:
+        return None
+    return pd.concat(blocks, ignore_index=True)
@@ -6,6 +6,7 @@ from pathlib import Path
 import copy
 import GWFish.modules.constants as cst
 import GWFish.modules.ephemeris as ephem
+import GWFish.modules.storage as storage
 from astropy.coordinates import EarthLocation
 import warnings
 from GWFish.modules.waveforms import t_of_f_PN
@@ -551,14 +552,18 @@ def projection_earth(parameters, detector, polarizations, timevector, in_band_sl
 
         if long_wavelength_approx:
             
-            proj[in_band_slice, k] = 0.5 * (e1[0] ** 2 - e2[0] ** 2) * hxx \
+            response = 0.5 * (e1[0] ** 2 - e2[0] ** 2) * hxx \
                         + 0.5 * (e1[1] ** 2 - e2[1] ** 2) * hyy \
                         + 0.5 * (e1[2] ** 2 - e2[2] ** 2) * hzz \
                         + (e1[0] * e1[1] - e2[0] * e2[1]) * hxy \
                         + (e1[0] * e1[2] - e2[0] * e2[2]) * hxz \
                         + (e1[1] * e1[2] - e2[1] * e2[2]) * hyz
 
-            proj[in_band_slice, k] *= np.exp(-1.j * phase_shift)
+            # the phase factor is not applied in place on the strided column of proj:
+            # numpy's overlap check of the complex product overestimates the extent of a strided
+            # operand, so, depending on where the next array was allocated, it can take the scalar loop,
+            # which rounds differently from the FMA one, and the result would depend on the memory layout
+            proj[in_band_slice, k] = response * np.exp(-1.j * phase_shift)
         
         else:
             # the detailed calculation can be found at this link
@@ -573,14 +578,14 @@ def projection_earth(parameters, detector, polarizations, timevector, in_band_sl
             T1 = Michelson_transfer_function(np.squeeze(ff), f_c, proj_arm1[:,0])
             T2 = Michelson_transfer_function(np.squeeze(ff), f_c, proj_arm2[:,0])
                         
-            proj[in_band_slice, k] = 0.5 * (T1 * e1[0] ** 2  - T2 * e2[0] ** 2) * hxx \
+            response = 0.5 * (T1 * e1[0] ** 2  - T2 * e2[0] ** 2) * hxx \
             + 0.5 * (T1 * e1[1] ** 2 - T2 * e2[1] ** 2) * hyy \
             + 0.5 * (T1 * e1[2] ** 2 - T2 * e2[2] ** 2) * hzz \
             + (T1 * e1[0] * e1[1] - T2 * e2[0] * e2[1]) * hxy \
             + (T1 * e1[0] * e1[2] - T2 * e2[0] * e2[2]) * hxz \
             + (T1 * e1[1] * e1[2] - T2 * e2[1] * e2[2]) * hyz
 
-            proj[in_band_slice, k] *= np.exp(-1.j * phase_shift)
+            proj[in_band_slice, k] = response * np.exp(-1.j * phase_shift)
         
     #print("Calculation of projection: %s seconds" % (time.time() - start_time))
 
@@ -661,14 +666,15 @@ def projection_moon(parameters, detector, polarizations, timevector, in_band_sli
         phase_shift = components[k].ephem.phase_term(ra, dec, np.squeeze(timevector)[in_band_slice], np.squeeze(detector.frequencyvector)[in_band_slice])
 
         # proj[:, k] = np.einsum('i,jik,k->j', e1, hij, e2)
-        proj[in_band_slice, k] = e1[0] * e2[0] * hxx \
+        response = e1[0] * e2[0] * hxx \
                      + e1[1] * e2[1] * hyy \
                      + e1[2] * e2[2] * hzz \
                      + (e1[0] * e2[1] + e2[0] * e1[1]) * hxy \
                      + (e1[0] * e2[2] + e2[0] * e1[2]) * hxz \
                      + (e1[1] * e2[2] + e2[1] * e1[2]) * hyz
-                     
-        proj[in_band_slice, k] *= np.exp(-1.j * phase_shift)
+
+        # not in place on the strided column, as in projection_earth
+        proj[in_band_slice, k] = response * np.exp(-1.j * phase_shift)
 
     #print("Calculation of projection: %s seconds" % (time.time() - start_time))
 
@@ -746,7 +752,12 @@ def lisaGWresponse(detector):
     plt.close()
 
 
-def SNR(detector, signals, use_duty_cycle: bool = False, frequencyvector = None):
+def SNR(detector, signals, use_duty_cycle: bool = False, frequencyvector = None, duty_cycle_draws = None):
+    """
+    duty_cycle_draws: optional uniform random numbers in [0, 1), one per detector component,
+    compared with the duty factors when use_duty_cycle is True. If not given, they are drawn
+    with np.random.rand, one component at a time.
+    """
     if signals.ndim == 1:
         signals = signals[:, np.newaxis]
 
@@ -756,12 +767,16 @@ def SNR(detector, signals, use_duty_cycle: bool = False, frequencyvector = None)
 
     SNRs = np.zeros(len(components))
     for k, component in enumerate(components):
-        integrand = np.abs(signals[:, k]) ** 2 / component.Sn(frequencyvector)
+        # in double precision, since the squares of single-precision strains would underflow
+        integrand = np.abs(signals[:, k].astype(np.complex128, copy=False)) ** 2 / component.Sn(frequencyvector)
         SNRs[k] = np.sqrt(4 * np.trapz(integrand, frequencyvector, axis=0))
 
         # set SNRs to zero if interferometer is not operating (according to its duty factor [0,1])
         if use_duty_cycle:
-            operating = np.random.rand()
+            if duty_cycle_draws is None:
+                operating = np.random.rand()
+            else:
+                operating = duty_cycle_draws[k]
             #print('operating = ',operating)
             if components[k].duty_factor < operating:
                 SNRs[k] = 0.
@@ -769,7 +784,11 @@ def SNR(detector, signals, use_duty_cycle: bool = False, frequencyvector = None)
     return SNRs
 
 
-def analyzeDetections(network, parameters, population, networks_ids):
+def analyzeDetections(network, parameters, population, networks_ids, output_format='txt'):
+    """
+    :param output_format: `'txt'` (default) to save the SNRs to `Signals_{population}.txt`,
+        or `'hdf5'` to save them in full precision to the HDF5 table `Signals_{population}.hdf5`
+    """
 
     detSNR = network.detection_SNR
 
@@ -780,6 +799,7 @@ def analyzeDetections(network, parameters, population, networks_ids):
 
     delim = " "
     header = delim.join(parameters.keys())
+    snrs = {}
 
     for n in np.arange(N):
         maxz = 0
@@ -796,6 +816,7 @@ def analyzeDetections(network, parameters, population, networks_ids):
 
         save_data = np.c_[save_data, SNR]
         header += " " + network_name + "_SNR"
+        snrs[network_name + "_SNR"] = SNR
 
         threshold = SNR > detSNR[1]
 
@@ -809,7 +830,12 @@ def analyzeDetections(network, parameters, population, networks_ids):
 
         print('SNR: {:.3f} (min) , {:.3f} (max) '.format(np.min(SNR), np.max(SNR)))
 
-    if 'id' in parameters.columns:
+    if output_format == 'hdf5':
+        signals = parameters.copy()
+        for name, SNR in snrs.items():
+            signals[name] = SNR
+        storage.append_table('Signals_' + population + '.hdf5', signals, key='signals', append=False)
+    elif 'id' in parameters.columns:
         np.savetxt('Signals_' + population + '.txt', save_data, delimiter=' ', fmt='%s '+"%.3f "*(len(save_data[0,:])-1),
                    header=header, comments='')
     else:
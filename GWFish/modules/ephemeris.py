@@ -80,12 +80,22 @@ class EphemerisInterpolate:
             time_interval = t1 - t0
             if time_interval < self.time_step_seconds:
                 time_interval = self.time_step_seconds
-            self.interp_gps_time_range = t0 - time_interval / 10, t1 + time_interval / 10
-            
+
+            # the interpolation nodes lie on a fixed grid of multiples of the time step,
+            # so that the interpolated coordinates at a given time do not depend on
+            # which signals were processed before (e.g. when splitting a population among processes);
+            # otherwise the interpolation error, up to ~100 m for a detector on Earth, would depend on them
+            t_start = np.floor((t0 - time_interval / 10) / self.time_step_seconds) * self.time_step_seconds
+            t_end = np.ceil((t1 + time_interval / 10) / self.time_step_seconds) * self.time_step_seconds
+
             # ensure at least two points for linear interpolation, four for cubic
-            n_points = int(np.ceil(time_interval / self.time_step_seconds)) + self.interp_kind
+            n_points = max(
+                int(round((t_end - t_start) / self.time_step_seconds)) + 1,
+                self.interp_kind + 1
+            )
 
-            new_times = np.linspace(*self.interp_gps_time_range, num=n_points)
+            new_times = t_start + self.time_step_seconds * np.arange(n_points)
+            self.interp_gps_time_range = new_times[0], new_times[-1]
 
             self.interp_gps_position = self.create_position_interp(new_times)
 
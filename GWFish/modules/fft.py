@@ -1,14 +1,51 @@
 """
 Functions for LAL FFD of derivatives of time-domain waveforms
 """
+import functools
 import logging
 
+import numpy as np
+
 try:
     import lal
 except ModuleNotFoundError:
     logging.warning('LAL package is not installed.'+\
                     'Only GWFish waveforms available.')
 
+# number of (length, data type) pairs whose FFT plans and output series are kept alive
+FFT_PLAN_CACHE_SIZE = 16
+# longest time series whose output series are kept alive; longer ones get a new output series at each call,
+# released with it, since a cached one would take its memory (16 bytes per frequency bin) for the whole run
+FFT_WORKSPACE_CACHE_LENGTH = 2 ** 22
+
+def _data_type(lal_timeseries):
+    """ 'REAL4' for single-precision time series, 'REAL8' otherwise """
+    return 'REAL4' if isinstance(lal_timeseries, lal.REAL4TimeSeries) else 'REAL8'
+
+@functools.lru_cache(maxsize=FFT_PLAN_CACHE_SIZE)
+def forward_plan(length, data_type='REAL8'):
+    """
+    Forward FFT plan of LAL for real time series of a given length, created at the first
+    request and then reused: creating it takes longer than many of the transforms.
+    """
+    if data_type == 'REAL4':
+        return lal.CreateForwardREAL4FFTPlan(length, 0)
+    return lal.CreateForwardREAL8FFTPlan(length, 0)
+
+def _create_frequency_series(lal_timeseries, delta_f, f_start=0.):
+    n_frequencies = int(lal_timeseries.data.length / 2 + 1)
+    if _data_type(lal_timeseries) == 'REAL4':
+        return lal.CreateCOMPLEX8FrequencySeries('FD_H', lal_timeseries.epoch, f_start, delta_f,
+                                                 lal.DimensionlessUnit, n_frequencies)
+    return lal.CreateCOMPLEX16FrequencySeries('FD_H', lal_timeseries.epoch, f_start, delta_f,
+                                              lal.DimensionlessUnit, n_frequencies)
+
+def _time_freq_fft(lal_frequency_series, lal_timeseries):
+    plan = forward_plan(lal_timeseries.data.length, _data_type(lal_timeseries))
+    if _data_type(lal_timeseries) == 'REAL4':
+        lal.REAL4TimeFreqFFT(lal_frequency_series, lal_timeseries, plan)
+    else:
+        lal.REAL8TimeFreqFFT(lal_frequency_series, lal_timeseries, plan)
 
 def fft_lal_timeseries(lal_timeseries, delta_f, f_start=0.):
     """
@@ -19,11 +56,47 @@ def fft_lal_timeseries(lal_timeseries, delta_f, f_start=0.):
     https://git.ligo.org/lscsoft/lalsuite/-/blob/master/lalsimulation/lib/LALSimInspiral.c#L3044
     """
 
-    chirplen = lal_timeseries.data.length
-    lal_frequency_series = lal.CreateCOMPLEX16FrequencySeries('FD_H', lal_timeseries.epoch, f_start, delta_f,
-                           lal.DimensionlessUnit,int(chirplen / 2 + 1))
-    plan = lal.CreateForwardREAL8FFTPlan(chirplen,0)
-    lal.REAL8TimeFreqFFT(lal_frequency_series,lal_timeseries,plan)
+    lal_frequency_series = _create_frequency_series(lal_timeseries, delta_f, f_start)
+    _time_freq_fft(lal_frequency_series, lal_timeseries)
     return lal_frequency_series
 
+def _create_workspace(length, data_type='REAL8'):
+    """ Frequency series into which the batched transforms are computed, before their in-band bins are copied out """
+    if data_type == 'REAL4':
+        return lal.CreateCOMPLEX8FrequencySeries('FD_H', lal.LIGOTimeGPS(0), 0., 1., lal.DimensionlessUnit, length // 2 + 1)
+    return lal.CreateCOMPLEX16FrequencySeries('FD_H', lal.LIGOTimeGPS(0), 0., 1., lal.DimensionlessUnit, length // 2 + 1)
+
+_cached_workspace = functools.lru_cache(maxsize=FFT_PLAN_CACHE_SIZE)(_create_workspace)
+
+def _workspace(length, data_type='REAL8'):
+    if length > FFT_WORKSPACE_CACHE_LENGTH:
+        return _create_workspace(length, data_type)
+    return _cached_workspace(length, data_type)
+
+def fft_lal_timeseries_in_band(lal_timeseries_list, first_bin, stop_bin):
+    """
+    Fourier transforms of several time series with the same length and data type
+    (e.g. the two polarizations of a waveform, or the derivatives of a projected signal),
+    as in `fft_lal_timeseries`, keeping only the frequency bins from `first_bin` to `stop_bin` (excluded).
+
+    The transforms share a cached plan and an output series (cached, up to `FFT_WORKSPACE_CACHE_LENGTH` samples),
+    from which only the requested bins are copied, into the columns of a single array: the full frequency series
+    of each time series are never allocated. The epoch of the transforms is the one of the time series.
+
+    :return: array with shape `(n_bins, len(lal_timeseries_list))`
+    """
+
+    length = lal_timeseries_list[0].data.length
+    data_type = _data_type(lal_timeseries_list[0])
+    if any(ts.data.length != length or _data_type(ts) != data_type for ts in lal_timeseries_list):
+        raise ValueError('The time series transformed together must have the same length and data type')
+
+    workspace = _workspace(length, data_type)
+    n_bins = len(range(*slice(first_bin, stop_bin).indices(length // 2 + 1)))
+    in_band = np.empty((n_bins, len(lal_timeseries_list)), dtype=np.complex64 if data_type == 'REAL4' else np.complex128)
+
+    for i, lal_timeseries in enumerate(lal_timeseries_list):
+        _time_freq_fft(workspace, lal_timeseries)
+        in_band[:, i] = workspace.data.data[first_bin:stop_bin]
 
+    return in_band
@@ -3,12 +3,15 @@ import GWFish.modules.waveforms as wf
 import GWFish.modules.detection as det
 import GWFish.modules.auxiliary as aux
 import GWFish.modules.fft as fft
+import GWFish.modules.storage as storage
 
 import copy
+import itertools
 import pandas as pd
 from typing import Optional, Union
 
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import logging
 from pathlib import Path
@@ -32,20 +35,207 @@ def invertSVD(matrix):
 
     return matrix_inverse_norm / normalizer, S
 
+def invert_fisher_matrices(
+    matrices: np.ndarray,
+    svd_threshold: float = 1e-10,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Invert a stack of Fisher matrices at once.
+
+    As in `invertSVD`, each matrix is first normalized by its diagonal.
+    All matrices are first inverted through a Cholesky decomposition, which is kept
+    if it shows that the normalized eigenvalues are all above `svd_threshold`:
+    the smallest one is below the smallest squared diagonal entry of the Cholesky factor,
+    and above the inverse of the Frobenius norm of the inverse.
+    The others, ill-conditioned or not positive definite, fall back to the pseudo-inverse
+    computed from the singular values above `svd_threshold`, as `invertSVD` does,
+    so that well-conditioned matrices never need an eigenvalue or singular value decomposition.
+    The results agree with calling `invertSVD` on each matrix, up to rounding;
+    matrices with a vanishing diagonal entry, which `invertSVD` cannot invert,
+    get an inverse filled with `nan`.
+
+    Example usage:
+
+    ```
+    >>> matrices = np.array([[[4., 1.], [1., 2.]], [[1., 1.], [1., 1.]]])
+    >>> inverses, condition_numbers, n_kept = invert_fisher_matrices(matrices)
+    >>> print(np.round(inverses[0] @ matrices[0], 10))
+    [[1. 0.]
+     [0. 1.]]
+    >>> print(n_kept)
+    [2 1]
+
+    ```
+
+    :param matrices: array with shape `(n_matrices, n_params, n_params)`
+    :param svd_threshold: smallest normalized singular value kept in the inversion
+
+    :return:
+    - `inverses`: array with shape `(n_matrices, n_params, n_params)` - (pseudo-)inverses of the matrices
+    - `condition_numbers`: array with shape `(n_matrices,)` - condition numbers of the normalized matrices, `inf` for singular ones; for the matrices inverted through the Cholesky decomposition, the one in the Frobenius norm, which is between the one in the 2-norm and `n_params` times it
+    - `n_kept`: array with shape `(n_matrices,)` - number of singular values kept in the inversion
+    """
+
+    matrices = np.asarray(matrices)
+    n_matrices, n_params, _ = matrices.shape
+
+    diagonal_sqrt = np.sqrt(np.einsum('...ii->...i', matrices))
+    normalizer = diagonal_sqrt[:, :, np.newaxis] * diagonal_sqrt[:, np.newaxis, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        matrices_norm = matrices / normalizer
+
+    inverses_norm = np.empty_like(matrices_norm)
+    condition_numbers = np.full(n_matrices, np.inf)
+    n_kept = np.zeros(n_matrices, dtype=int)
+
+    finite = np.all(np.isfinite(matrices_norm), axis=(1, 2))
+    cholesky = finite.copy()
+    lower = np.zeros_like(matrices_norm)
+    if np.any(cholesky):
+        try:
+            lower[cholesky] = np.linalg.cholesky(matrices_norm[cholesky])
+        except np.linalg.LinAlgError:
+            # some matrix is not positive definite: only the ones which are keep the decomposition
+            for i in np.nonzero(cholesky)[0]:
+                try:
+                    lower[i] = np.linalg.cholesky(matrices_norm[i])
+                except np.linalg.LinAlgError:
+                    cholesky[i] = False
+
+    # the smallest eigenvalue is below the smallest pivot of the decomposition
+    cholesky &= np.min(np.einsum('...ii->...i', lower), axis=1) ** 2 > svd_threshold
+
+    if np.any(cholesky):
+        lower_inverse = np.linalg.inv(lower[cholesky])
+        inverse_norm = np.swapaxes(lower_inverse, 1, 2) @ lower_inverse
+        # and above the inverse of the Frobenius norm of the inverse, which also gives the condition number
+        inverse_frobenius = np.linalg.norm(inverse_norm, axis=(1, 2))
+        well_conditioned = inverse_frobenius < 1. / svd_threshold
+        cholesky[cholesky] = well_conditioned
+        inverses_norm[cholesky] = inverse_norm[well_conditioned]
+        condition_numbers[cholesky] = np.linalg.norm(matrices_norm[cholesky], axis=(1, 2)) * inverse_frobenius[well_conditioned]
+        n_kept[cholesky] = n_params
+
+    # matrices with a vanishing diagonal entry cannot be normalized
+    inverses_norm[~finite] = np.nan
+
+    svd = finite & ~cholesky
+    if np.any(svd):
+        U, S, Vh = np.linalg.svd(matrices_norm[svd])
+        keep = S > svd_threshold
+        S_inverse = np.where(keep, 1. / np.where(keep, S, 1.), 0.)
+        inverses_norm[svd] = np.swapaxes(Vh, 1, 2) @ (S_inverse[:, :, np.newaxis] * np.swapaxes(U, 1, 2))
+        with np.errstate(divide='ignore'):
+            condition_numbers[svd] = S[:, 0] / S[:, -1]
+        n_kept[svd] = np.sum(keep, axis=1)
+        logging.debug(f'Inverted {np.sum(svd)}/{n_matrices} matrices with the SVD')
+
+    return inverses_norm / normalizer, condition_numbers, n_kept
+
+def marginalize_fisher_matrices(
+    matrices: np.ndarray,
+    indices: list[int],
+) -> np.ndarray:
+    """
+    Fisher matrices of some of the parameters, marginalized over all the others:
+    for each matrix, the Schur complement $F_{SS} - F_{SO} F_{OO}^{-1} F_{OS}$,
+    where $S$ are the kept parameters and $O$ the others.
+    The inverse of the $F_{OO}$ blocks is computed with `invert_fisher_matrices`,
+    i.e. with a pseudo-inverse for the ill-conditioned ones.
+
+    Example usage:
+
+    ```
+    >>> matrices = np.array([[[2., 1.], [1., 2.]]])
+    >>> print(marginalize_fisher_matrices(matrices, [0]))
+    [[[1.5]]]
+
+    ```
+
+    :param matrices: array with shape `(n_matrices, n_params, n_params)`
+    :param indices: indices of the parameters which are kept
+
+    :return: array with shape `(n_matrices, len(indices), len(indices))`
+    """
+
+    matrices = np.asarray(matrices)
+    others = [i for i in range(matrices.shape[-1]) if i not in indices]
+
+    fisher_SS = matrices[:, indices][:, :, indices]
+    if not others or len(matrices) == 0:
+        return fisher_SS
+
+    fisher_SO = matrices[:, indices][:, :, others]
+    inverse_OO, _, _ = invert_fisher_matrices(matrices[:, others][:, :, others])
+
+    return fisher_SS - fisher_SO @ inverse_OO @ np.swapaxes(fisher_SO, 1, 2)
+
+def bordered_fisher_errors(
+    fisher_matrices: np.ndarray,
+    n_base: int,
+) -> np.ndarray:
+    """
+    One-sigma errors on each of the extra parameters of extended Fisher matrices,
+    when it is added alone to the base parameters (e.g. one deviation from GR at a time
+    on top of the GR parameters), marginalized over the base parameters.
+
+    The base block $F_{BB}$ is only factored once: bordering it with the row and column of a parameter $d$,
+    the inverse of the bordered matrix has $\\sigma_d^{-2} = F_{dd} - F_{dB} F_{BB}^{-1} F_{Bd}$,
+    i.e. a rank-one update of the inverse, computed for all the extra parameters at once.
+    As in `invert_fisher_matrices`, the matrices are normalized by their diagonal, 
+    and the update is computed through the Cholesky factor of the base block,
+    which is more accurate than going through its inverse;
+    if some base block is not positive definite, its pseudo-inverse is used instead.
+
+    Example usage:
+
+    ```
+    >>> fisher = np.array([[[2., 1., 1.], [1., 2., 0.], [1., 0., 1.]]])
+    >>> print(bordered_fisher_errors(fisher, 1) ** 2)
+    [[0.66666667 2.        ]]
+
+    ```
+
+    :param fisher_matrices: array with shape `(n_matrices, n_base + n_extra, n_base + n_extra)`, with the base parameters first
+    :param n_base: number of base parameters
+
+    :return: array with shape `(n_matrices, n_extra)`
+    """
+
+    fisher_matrices = np.asarray(fisher_matrices)
+
+    diagonal_sqrt = np.sqrt(np.einsum('...ii->...i', fisher_matrices))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        matrices_norm = fisher_matrices / diagonal_sqrt[:, :, np.newaxis] / diagonal_sqrt[:, np.newaxis, :]
+
+    base = matrices_norm[:, :n_base, :n_base]
+    border = matrices_norm[:, :n_base, n_base:]
+
+    try:
+        # F_dB F_BB^-1 F_Bd = |L^-1 F_Bd|^2
+        solved = np.linalg.solve(np.linalg.cholesky(base), border)
+        correction = np.sum(solved ** 2, axis=1)
+    except np.linalg.LinAlgError:
+        base_inverses, _, _ = invert_fisher_matrices(base)
+        correction = np.einsum('nbd,nbc,ncd->nd', border, base_inverses, border)
+
+    # the normalized diagonal entries are 1
+    schur = 1. - correction
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(schur > 0, 1. / np.sqrt(np.abs(schur)), np.inf) / diagonal_sqrt[:, n_base:]
+
 def fft_derivs_at_detectors(deriv_list, frequency_vector):
     """
-    A wrapper for fft_lal_timeseries
+    A wrapper for fft_lal_timeseries_in_band: the derivatives are transformed
+    with the same cached plan, keeping only the bins of the frequency grid
     """
     delta_f = frequency_vector[1,0] - frequency_vector[0,0]
-    ffd_deriv_list = []
-    for deriv in deriv_list:
-        ffd_deriv_list.append(fft.fft_lal_timeseries(deriv, delta_f, f_start=0.).data.data)
 
     # Because f_start = 0 Hz, we need to mask some frequencies
     idx_f_low = int(frequency_vector[0,0]/delta_f)
     idx_f_high = int(frequency_vector[-1,0]/delta_f)
 
-    return np.vstack(ffd_deriv_list).T[idx_f_low:idx_f_high+1,:]
+    return fft.fft_lal_timeseries_in_band(deriv_list, idx_f_low, idx_f_high+1)
 
 class Derivative:
     """
@@ -54,16 +244,22 @@ class Derivative:
     Derivatives of other parameters are calculated numerically.
 
     eps: 1e-5, this follows the simple "cube root of numerical precision" recommendation, which is 1e-16 for double
+
+    dtype: complex data type in which the polarizations, the projected signal and the derivatives are kept;
+    with `complex64`, they take half the memory, while the differences of the numerical derivatives
+    and the phases of the projections are still computed in double precision, and only their results are rounded
     """
-    def __init__(self, waveform, parameters, detector, eps=1e-5, waveform_class=wf.Waveform):
+    def __init__(self, waveform, parameters, detector, eps=1e-5, waveform_class=wf.Waveform, dtype=np.complex128):
         self.waveform = waveform
         self.detector = detector
         self.eps = eps
         self.waveform_class = waveform_class
+        self.dtype = np.dtype(dtype)
         self.data_params = {'frequencyvector': detector.frequencyvector, 'f_ref': 50.}
         self.waveform_object = waveform_class(waveform, parameters, self.data_params)
         self.waveform_at_parameters = None
         self.projection_at_parameters = None
+        self.phase_derivatives_at_parameters = {}
 
         # For central parameters and their epsilon-neighbourhood
         self.local_params = parameters.copy()
@@ -80,9 +276,10 @@ class Derivative:
         Returns tuple, (wave, t_of_f).
         """
         if self._waveform_at_parameters is None:
-            wave = self.waveform_object()
+            wave = self.waveform_object().astype(self.dtype, copy=False)
             t_of_f = self.waveform_object.t_of_f
             self._waveform_at_parameters = (wave, t_of_f)
+            self.phase_derivatives_at_parameters = self.waveform_object.phase_derivatives
         return self._waveform_at_parameters
 
     @waveform_at_parameters.setter
@@ -94,7 +291,7 @@ class Derivative:
         if self._projection_at_parameters is None:
             self._projection_at_parameters = det.projection(self.local_params, self.detector,
                                                             self.waveform_at_parameters[0], # wave
-                                                            self.waveform_at_parameters[1]) # t(f)
+                                                            self.waveform_at_parameters[1]).astype(self.dtype, copy=False) # t(f)
         return self._projection_at_parameters
 
     @projection_at_parameters.setter
@@ -106,7 +303,16 @@ class Derivative:
         Return a derivative with respect to target_parameter at the point in 
         parameter space determined by the argument parameters.
         """
-        if target_parameter == 'luminosity_distance':
+        if target_parameter in wf.DEVIATION_PARAMETERS:
+            # the phase is linear in the deviation parameters
+            projection = self.projection_at_parameters
+            if target_parameter not in self.phase_derivatives_at_parameters:
+                raise ValueError(
+                    f'The waveform {self.waveform} does not support the deviation parameter {target_parameter}'
+                    + (' (the ppE index ppe_b must be among the signal parameters)' if target_parameter == 'ppe_beta' else '')
+                )
+            derivative = 1j * self.phase_derivatives_at_parameters[target_parameter] * projection
+        elif target_parameter == 'luminosity_distance':
             derivative = -1. / self.local_params[target_parameter] * self.projection_at_parameters
         elif target_parameter == 'geocent_time':
             derivative = 2j * np.pi * self.detector.frequencyvector * self.projection_at_parameters
@@ -123,12 +329,14 @@ class Derivative:
             self.pv_set2[target_parameter] = pv + dp / 2.
 
             if target_parameter in ['ra', 'dec', 'psi']:  # these parameters do not influence the waveform
+                # the projections are differenced in double precision
+                wave = self.waveform_at_parameters[0].astype(np.complex128, copy=False)
     
                 signal1 = det.projection(self.pv_set1, self.detector, 
-                                         self.waveform_at_parameters[0], 
+                                         wave, 
                                          self.waveform_at_parameters[1])
                 signal2 = det.projection(self.pv_set2, self.detector, 
-                                         self.waveform_at_parameters[0], 
+                                         wave, 
                                          self.waveform_at_parameters[1])
     
                 derivative = (signal2 - signal1) / dp
@@ -156,29 +364,47 @@ class Derivative:
                                     
         self.waveform_object.update_gw_params(self.local_params)
 
-        return derivative
+        return derivative.astype(self.dtype, copy=False)
 
     def __call__(self, target_parameter):
         return self.with_respect_to(target_parameter)
 
 class FisherMatrix:
-    def __init__(self, waveform, parameters, fisher_parameters, detector, eps=1e-5, waveform_class=wf.Waveform):
+    def __init__(self, waveform, parameters, fisher_parameters, detector, eps=1e-5, waveform_class=wf.Waveform, dtype=np.complex128):
         self.fisher_parameters = fisher_parameters
         self.detector = detector
-        self.derivative = Derivative(waveform, parameters, detector, eps=eps, waveform_class=waveform_class)
+        self.derivative = Derivative(waveform, parameters, detector, eps=eps, waveform_class=waveform_class, dtype=dtype)
         self.nd = len(fisher_parameters)
         self.fm = None
+        self._derivatives = {}
+
+    def derivative_of(self, parameter):
+        """Derivative of the projected signal with respect to `parameter`, computed once and cached."""
+        if parameter not in self._derivatives:
+            self._derivatives[parameter] = self.derivative(parameter)
+        return self._derivatives[parameter]
+
+    def inner_products(self, signal):
+        """
+        Noise-weighted inner products of the derivatives with respect to the 
+        Fisher parameters with `signal`, summed over the detector components;
+        the derivatives computed for the Fisher matrix are reused.
+        """
+        return np.array([
+            np.sum(aux.scalar_product(self.derivative_of(parameter), signal, self.detector), axis=0)
+            for parameter in self.fisher_parameters
+        ])
 
     def update_fm(self):
         self._fm = np.zeros((self.nd, self.nd))
         for p1 in np.arange(self.nd):
             deriv1_p = self.fisher_parameters[p1]
-            deriv1 = self.derivative(deriv1_p)
+            deriv1 = self.derivative_of(deriv1_p)
             
             self._fm[p1, p1] = np.sum(aux.scalar_product(deriv1, deriv1, self.detector), axis=0)
             for p2 in np.arange(p1+1, self.nd):
                 deriv2_p = self.fisher_parameters[p2]
-                deriv2 = self.derivative(deriv2_p)
+                deriv2 = self.derivative_of(deriv2_p)
                 self._fm[p1, p2] = np.sum(aux.scalar_product(deriv1, deriv2, self.detector), axis=0)
                 self._fm[p2, p1] = self._fm[p1, p2]
 
@@ -195,6 +421,153 @@ class FisherMatrix:
     def __call__(self):
         return self.fm
 
+# derivatives which do not need waveforms at perturbed parameters,
+# computed on the full grid from the signal at the parameters
+ANALYTIC_DERIVATIVE_PARAMETERS = ['luminosity_distance', 'geocent_time', 'phase', 'ra', 'dec', 'psi']
+
+def relative_binning_edges(frequencyvector: np.ndarray, bin_width: float = 0.02) -> np.ndarray:
+    """
+    Indices of the points of a frequency grid which are the edges of the bins 
+    used by `RelativeBinningFisherMatrix`: the first and last points of the grid,
+    and the ones closest to a geometric sequence of frequencies with relative spacing `bin_width`.
+    Bins narrower than the grid spacing collapse, so that the edges are at most all the points of the grid.
+
+    Example usage:
+
+    ```
+    >>> frequencyvector = np.geomspace(8., 1024., 5000)
+    >>> edges = relative_binning_edges(frequencyvector)
+    >>> print(len(edges), frequencyvector[edges[[0, -1]]])
+    247 [   8. 1024.]
+
+    ```
+
+    :param frequencyvector: frequency grid, in Hz
+    :param bin_width: relative width of the bins
+
+    :return: sorted array of indices, starting at 0 and ending at `len(frequencyvector) - 1`
+    """
+
+    frequencyvector = np.ravel(frequencyvector)
+    n_bins = max(int(np.ceil(np.log(frequencyvector[-1] / frequencyvector[0]) / np.log1p(bin_width))), 1)
+    targets = np.geomspace(frequencyvector[0], frequencyvector[-1], n_bins + 1)
+    indices = np.clip(np.searchsorted(frequencyvector, targets), 1, len(frequencyvector) - 1)
+    # the closest of the two neighbouring points
+    indices -= targets - frequencyvector[indices - 1] < frequencyvector[indices] - targets
+    return np.unique(np.concatenate([[0], indices, [len(frequencyvector) - 1]]))
+
+class RelativeBinningFisherMatrix(FisherMatrix):
+    """
+    Fisher matrix computed with relative binning: the derivatives of the projected signal
+    differ from the signal $h_0$ at the parameters by factors $r(f)$ which are smooth in frequency,
+    so they are computed only at the edges of bins spanning the grid (see `relative_binning_edges`),
+    as ratios to $h_0$, and interpolated linearly within each bin.
+    The inner products then reduce to sums over the bin edges, 
+    $(\\partial_i h | \\partial_j h) = \\mathrm{Re} \\sum_{b, c} r_i(f_b) M_{bc} r^*_j(f_c)$,
+    with the summary data $M_{bc}$ (nonzero for $|b - c| \\leq 1$), 
+    computed once from $|h_0|^2$ and the PSD on the full grid.
+    
+    The signal at the parameters is computed on the full grid, and so are the derivatives
+    which do not need any other waveform (see `ANALYTIC_DERIVATIVE_PARAMETERS` and `Derivative`); 
+    the waveforms at the perturbed parameters of the numerical derivatives are only computed at the bin edges.
+    The results are the ones of a `FisherMatrix` whose derivatives are replaced by the interpolated ones, 
+    which `derivative_of` returns on the full grid (e.g. for the systematic biases).
+    The interpolation error of the leading-order phase derivatives, scaling as $f^{-5/3}$, 
+    is about $0.6 \\, \\mathrm{bin\\_width}^2$ relative to them; features of the merger 
+    and ringdown narrower than the bins are not resolved.
+    """
+
+    def __init__(self, waveform, parameters, fisher_parameters, detector, bin_width=0.02, eps=1e-5, waveform_class=wf.Waveform, dtype=np.complex128):
+        super().__init__(waveform, parameters, fisher_parameters, detector, eps=eps, waveform_class=waveform_class, dtype=dtype)
+        frequencyvector = detector.frequencyvector[:, 0]
+        self.edges = relative_binning_edges(frequencyvector, bin_width)
+        # the ratios and the summary data are computed in double precision in any case
+        self.edge_derivative = Derivative(
+            waveform, parameters, _detector_on_grid(detector, frequencyvector[self.edges]), eps=eps, waveform_class=waveform_class
+        )
+        self._ratios = {}
+        self._summary_data = None
+
+        # bin of each point of the grid, and its position within the bin
+        edge_frequencies = frequencyvector[self.edges]
+        self._bins = np.clip(np.searchsorted(self.edges, np.arange(len(frequencyvector)), side='right') - 1, 0, len(self.edges) - 2)
+        self._positions = (
+            (frequencyvector - edge_frequencies[self._bins]) 
+            / (edge_frequencies[self._bins + 1] - edge_frequencies[self._bins])
+        )[:, np.newaxis]
+
+    def ratio_of(self, parameter):
+        """
+        Ratio of the derivative with respect to `parameter` to the signal, at the bin edges,
+        with shape `(n_edges, n_components)`; where the signal vanishes, the ratio at the closest
+        edge of the same bin is used, or zero if it vanishes at both.
+        """
+        if parameter not in self._ratios:
+            signal = self.derivative.projection_at_parameters[self.edges].astype(np.complex128)
+            if parameter in ANALYTIC_DERIVATIVE_PARAMETERS or parameter in wf.DEVIATION_PARAMETERS:
+                derivative = self.derivative(parameter)
+                self._derivatives[parameter] = derivative
+                derivative = derivative[self.edges].astype(np.complex128)
+            else:
+                derivative = self.edge_derivative(parameter)
+
+            vanishing = signal == 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(vanishing, 0., derivative / np.where(vanishing, 1., signal))
+            below = np.concatenate([ratio[:1] * 0, ratio[:-1]])
+            above = np.concatenate([ratio[1:], ratio[-1:] * 0])
+            ratio = np.where(vanishing, np.where(np.concatenate([vanishing[:1], vanishing[:-1]]), above, below), ratio)
+            self._ratios[parameter] = ratio
+        return self._ratios[parameter]
+
+    def derivative_of(self, parameter):
+        """Derivative of the projected signal with respect to `parameter` on the full grid, interpolated from the bin edges."""
+        if parameter not in self._derivatives:
+            ratio = self.ratio_of(parameter)
+            self._derivatives[parameter] = (self.derivative.projection_at_parameters * (
+                ratio[self._bins] * (1 - self._positions) + ratio[self._bins + 1] * self._positions
+            )).astype(self.derivative.dtype, copy=False)
+        return self._derivatives[parameter]
+
+    @property
+    def summary_data(self):
+        """
+        Weights of the products of the ratios at the same edge, with shape `(n_edges, n_components)`,
+        and at consecutive edges, with shape `(n_edges - 1, n_components)`.
+        """
+        if self._summary_data is None:
+            frequencyvector = self.detector.frequencyvector[:, 0]
+            signal = self.derivative.projection_at_parameters.astype(np.complex128, copy=False)
+            weights = 4 * _trapezoid_weights(frequencyvector)[:, np.newaxis] * np.abs(signal) ** 2 / np.stack(
+                [component.Sn(frequencyvector) for component in self.detector.components], axis=1
+            )
+            n_edges = len(self.edges)
+
+            def bin_sums(values):
+                return np.stack([
+                    np.bincount(self._bins, values[:, k], minlength=n_edges - 1) for k in range(values.shape[1])
+                ], axis=1)
+
+            lower = bin_sums(weights * (1 - self._positions) ** 2)
+            upper = bin_sums(weights * self._positions ** 2)
+            mixed = bin_sums(weights * self._positions * (1 - self._positions))
+
+            diagonal = np.zeros((n_edges, weights.shape[1]))
+            diagonal[:-1] += lower
+            diagonal[1:] += upper
+            self._summary_data = (diagonal, mixed)
+        return self._summary_data
+
+    def update_fm(self):
+        diagonal, mixed = self.summary_data
+        ratios = np.stack([self.ratio_of(parameter) for parameter in self.fisher_parameters])
+
+        self._fm = np.zeros((self.nd, self.nd))
+        for k in range(ratios.shape[2]):
+            ratios_k = ratios[:, :, k]
+            consecutive = np.real((ratios_k[:, :-1] * mixed[:, k]) @ np.conjugate(ratios_k[:, 1:]).T)
+            self._fm += np.real((ratios_k * diagonal[:, k]) @ np.conjugate(ratios_k).T) + consecutive + consecutive.T
+
 def sky_localization_area(
     network_fisher_inverse: np.ndarray,
     declination_angle: np.ndarray,
@@ -204,14 +577,16 @@ def sky_localization_area(
     """
     Compute the 1-sigma sky localization ellipse area starting
     from the full network Fisher matrix inverse and the inclination.
+    A stack of inverses with shape `(n_signals, n_params, n_params)` can be passed
+    together with an array of declinations.
     """
     return (
         np.pi
         * np.abs(np.cos(declination_angle))
         * np.sqrt(
-            network_fisher_inverse[right_ascension_index, right_ascension_index]
-            * network_fisher_inverse[declination_index, declination_index]
-            - network_fisher_inverse[right_ascension_index, declination_index] ** 2
+            network_fisher_inverse[..., right_ascension_index, right_ascension_index]
+            * network_fisher_inverse[..., declination_index, declination_index]
+            - network_fisher_inverse[..., right_ascension_index, declination_index] ** 2
         )
     )
 
@@ -238,6 +613,13 @@ def compute_detector_fisher(
     use_duty_cycle: bool = False,
     redefine_tf_vectors: bool = False,
     long_wavelength: bool = True,
+    duty_cycle_draws: Optional[np.ndarray] = None,
+    true_parameters: Optional[dict[str, float]] = None,
+    true_waveform_model: Optional[str] = None,
+    true_waveform_class: Optional[type(wf.Waveform)] = None,
+    return_derivatives: bool = False,
+    relative_binning_width: Optional[float] = None,
+    signal_dtype: Union[str, np.dtype] = np.complex128,
 ) -> tuple[np.ndarray, float]:
     """Compute the Fisher matrix and SNR for a single detector.
     
@@ -272,15 +654,22 @@ def compute_detector_fisher(
     :param waveform_class: The waveform class to use (see [choosing an approximant](../how-to/choosing_an_approximant.md));
     :param use_duty_cycle: Whether to use the detector duty cycle (i.e. stochastically set the SNR to zero some of the time); defaults to `False`
     :param redefine_tf_vectors: Whether to redefine the time-frequency vectors in order to correctly model signals with small frequency evolution. Defaults to `False`.
+    :param duty_cycle_draws: Uniform random numbers, one per detector component, used to decide whether each component is operating when `use_duty_cycle` is `True`. If `None` (default), they are drawn with `np.random.rand`.
+    :param true_parameters: Parameters of the true signal which differ from the ones of the template, e.g. `{'delta_phi_2': 0.1}`; giving this or one of the following arguments also returns the inner products needed for the systematic bias, see `compute_network_biases`.
+    :param true_waveform_model: Waveform model of the true signal, if different from the one of the template.
+    :param true_waveform_class: Waveform class of the true signal, if different from the one of the template.
+    :param return_derivatives: Whether to also return the projected signal and its derivatives, which do not depend on the detector noise (see `storage.DerivativeStore`).
+    :param relative_binning_width: If given, the Fisher matrix is computed with relative binning, with bins of this relative width (see `RelativeBinningFisherMatrix`): the waveforms at the perturbed parameters of the numerical derivatives are only computed at the bin edges. The SNR is computed on the full grid in any case.
+    :param signal_dtype: Complex data type in which the polarizations, the projected signal and its derivatives are kept (see `Derivative`); `complex64` halves their memory, while the inner products, the Fisher matrix and the SNR are still accumulated in double precision. Defaults to `complex128`.
     
-    :return: The Fisher matrix, and the square of the detector SNR.
+    :return: The Fisher matrix, and the square of the detector SNR; if a true signal is given, also the inner products $(\\partial_i h | h_{\\rm true} - h)$ of the derivatives with the difference between the true signal and the template; if `return_derivatives` is `True`, as the last element, an array with shape `(n_params + 1, n_frequencies, n_components)` with the projected signal followed by its derivatives with respect to the `fisher_parameters`.
     """
     data_params = {
         'frequencyvector': detector.frequencyvector,
         'f_ref': 50.
     }
     waveform_obj = waveform_class(waveform_model, signal_parameter_values, data_params)
-    wave = waveform_obj()
+    wave = waveform_obj().astype(signal_dtype, copy=False)
     t_of_f = waveform_obj.t_of_f
 
     if redefine_tf_vectors:
@@ -288,8 +677,9 @@ def compute_detector_fisher(
     else:
         signal = det.projection(signal_parameter_values, detector, wave, t_of_f, long_wavelength_approx = long_wavelength)
         frequencyvector = detector.frequencyvector[:, 0]
+    signal = signal.astype(signal_dtype, copy=False)
 
-    component_SNRs = det.SNR(detector, signal, use_duty_cycle, frequencyvector=frequencyvector)
+    component_SNRs = det.SNR(detector, signal, use_duty_cycle, frequencyvector=frequencyvector, duty_cycle_draws=duty_cycle_draws)
     detector_SNR_square = np.sum(component_SNRs ** 2)
 
     if fisher_parameters is None:
@@ -298,156 +688,1462 @@ def compute_detector_fisher(
         else:
             fisher_parameters = signal_parameter_values.columns
 
-    return FisherMatrix(waveform_model, signal_parameter_values, fisher_parameters, detector, waveform_class=waveform_class).fm, detector_SNR_square
+    if relative_binning_width is None:
+        fisher_matrix = FisherMatrix(waveform_model, signal_parameter_values, fisher_parameters, detector, waveform_class=waveform_class, dtype=signal_dtype)
+    elif redefine_tf_vectors:
+        raise ValueError('Relative binning cannot be used with redefine_tf_vectors')
+    else:
+        fisher_matrix = RelativeBinningFisherMatrix(
+            waveform_model, signal_parameter_values, fisher_parameters, detector, bin_width=relative_binning_width, waveform_class=waveform_class, dtype=signal_dtype
+        )
 
-def compute_network_errors(
-    network: det.Network,
-    parameter_values: pd.DataFrame,
+    results = (fisher_matrix.fm, detector_SNR_square)
+
+    if return_derivatives:
+        n_frequencies = len(detector.frequencyvector)
+        projected = np.stack([np.reshape(signal, (n_frequencies, -1))] + [
+            np.reshape(fisher_matrix.derivative_of(parameter), (n_frequencies, -1)) for parameter in fisher_parameters
+        ])
+
+    if true_parameters is None and true_waveform_model is None and true_waveform_class is None:
+        return results + (projected,) if return_derivatives else results
+
+    if redefine_tf_vectors:
+        raise ValueError('The systematic bias cannot be computed with redefine_tf_vectors')
+
+    if isinstance(signal_parameter_values, pd.DataFrame):
+        signal_parameter_values = signal_parameter_values.iloc[0]
+    template_parameter_values = dict(signal_parameter_values)
+    true_parameter_values = {**template_parameter_values, **(true_parameters or {})}
+    tc = template_parameter_values['geocent_time']
+
+    def signal_at_zero_time(waveform_class, waveform_model, parameter_values):
+        # as for the numerical derivatives, the waveforms are computed with geocent_time = 0,
+        # otherwise the large phase 2 pi f tc would swamp their difference with rounding errors
+        waveform_obj = waveform_class(waveform_model, {**parameter_values, 'geocent_time': 0.}, data_params)
+        wave = waveform_obj()
+        return det.projection(parameter_values, detector, wave, waveform_obj.t_of_f + tc, long_wavelength_approx = long_wavelength)
+
+    # the derivatives are reused, only the true and template waveforms are computed again
+    difference = np.exp(2j * np.pi * detector.frequencyvector * tc) * (
+        signal_at_zero_time(true_waveform_class or waveform_class, true_waveform_model or waveform_model, true_parameter_values)
+        - signal_at_zero_time(waveform_class, waveform_model, template_parameter_values)
+    )
+
+    results = results + (fisher_matrix.inner_products(difference),)
+
+    return results + (projected,) if return_derivatives else results
+
+def _trapezoid_weights(frequencyvector: np.ndarray) -> np.ndarray:
+    """Weights $w_m$ such that `np.trapz(y, frequencyvector)` equals $\\sum_m w_m y_m$."""
+    weights = np.zeros_like(frequencyvector)
+    steps = np.diff(frequencyvector)
+    weights[:-1] += steps / 2
+    weights[1:] += steps / 2
+    return weights
+
+def compute_detector_early_warning(
+    detector: det.Detector,
+    signal_parameter_values: Union[pd.DataFrame, dict[str, float]],
+    times_before_merger: Union[list[float], np.ndarray],
     fisher_parameters: Optional[list[str]] = None,
     waveform_model: str = wf.DEFAULT_WAVEFORM_MODEL,
-    waveform_class = wf.LALFD_Waveform,
+    waveform_class: type(wf.Waveform) = wf.LALFD_Waveform,
     use_duty_cycle: bool = False,
-    redefine_tf_vectors: bool = False,
-    save_matrices: bool = False,
-    save_matrices_path: Union[Path, str] = Path('.'),
-    matrix_naming_postfix: str = '',
     long_wavelength: bool = True,
-) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
-    """
-    Compute Fisher matrix errors for a network whose
-    SNR and Fisher matrices have already been calculated.
+    duty_cycle_draws: Optional[np.ndarray] = None,
+) -> tuple[np.ndarray, float, np.ndarray, np.ndarray]:
+    """Compute the Fisher matrix and SNR for a single detector, as `compute_detector_fisher` does,
+    together with the ones accumulated up to some times before merger.
+
+    The signal observed until a time $\\tau$ before merger (`geocent_time`) 
+    is made of the frequency bins where the time-frequency relation of the waveform 
+    (`t_of_f`, e.g. `t_of_f_PN`) is earlier than `geocent_time` $- \\tau$. 
+    Their contributions to the integrals are summed with the trapezoid weights 
+    of the full frequency grid, which gives the same result as cutting the signal
+    at the corresponding frequency with `max_frequency_cutoff`; the derivatives
+    of the waveform are computed once, for all the times.
 
-    Will only return output for the `n_above_thr` signals 
-    for which the network SNR is above `network.detection_SNR[1]`.
-    
-    :param network: detector network to use
-    :param parameter_values: dataframe with parameters for one or more signals
-    :param fisher_parameters: list of parameters to use for the Fisher matrix analysis - if `None` (default), all waveform parameters are used
-    :param waveform_model: waveform model to use - refer to [choosing an approximant](../how-to/choosing_an_approximant.md)
-    :param waveform_model: waveform class to use - refer to [choosing an approximant](../how-to/choosing_an_approximant.md)
-    :param redefine_tf_vectors: Whether to redefine the time-frequency vectors in order to correctly model signals with small frequency evolution. Defaults to `False`.
-    :param use_duty_cycle: Whether to use the detector duty cycle (i.e. stochastically set the SNR to zero some of the time); defaults to `False`
-    :param save_matrices: Whether to save the Fisher matrices and their inverses to disk; defaults to `False`
-    :param save_matrices_path: Path (expressed with Pathlib or through a string) where  to save the Fisher matrices and their inverses to disk; defaults to `Path('.')` (the current folder)
-    :param matrix_naming_postfix: string to be appended to the names of the Fisher matrices and their inverses: they will look like `fisher_matrices_postfix.npy` and `inv_fisher_matrices_postfix.npy`
-    
-    :return:
-    - `detected`: array with shape `(n_above_thr,)` - array of indices for the detected signals.
-    - `network_snr`: array with shape `(n_signals,)` - Network SNR for all signals.
-    - `parameter_errors`: array with shape `(n_signals, n_parameters)` - One-sigma     Fisher errors for the parameters.
-    - `sky_localization`: array with shape `(n_signals,)` or `None` - One-sigma sky localization area in steradians, returned if the signals have both right ascension and declination, or `None` otherwise.
+    Example usage:
+
+    ```
+    >>> from GWFish.modules.detection import Detector
+    >>> detector = Detector('ET')
+    >>> params = {
+    ...    'mass_1': 1.4,
+    ...    'mass_2': 1.4,
+    ...    'luminosity_distance': 40.,
+    ...    'theta_jn': 0.,
+    ...    'ra': 0.,
+    ...    'dec': 0.,
+    ...    'phase': 0.,
+    ...    'psi': 0.,
+    ...    'geocent_time': 1e9,
+    ...    }
+    >>> fisher, detector_SNR_square, cumulative_fisher, cumulative_SNR_square = compute_detector_early_warning(
+    ...    detector, params, [600., 60.], ['luminosity_distance', 'phase', 'geocent_time'],
+    ... )
+    >>> print(cumulative_fisher.shape)
+    (2, 3, 3)
+    >>> print(np.all(np.diff(cumulative_SNR_square) > 0), cumulative_SNR_square[-1] < detector_SNR_square)
+    True True
+
+    ```
+
+    :param detector: The detector to compute the Fisher matrices for
+    :param signal_parameter_values: The parameter values for the signal, as in `compute_detector_fisher`
+    :param times_before_merger: Times before merger, in seconds, until which the signal is observed
+    :param fisher_parameters: The parameters to compute the Fisher matrix for. If None, all parameters are used.
+    :param waveform_model: The waveform model to use (see [choosing an approximant](../how-to/choosing_an_approximant.md));
+    :param waveform_class: The waveform class to use (see [choosing an approximant](../how-to/choosing_an_approximant.md));
+    :param use_duty_cycle: Whether to use the detector duty cycle; a component which is not operating does not contribute to the SNR at any time
+    :param long_wavelength: Whether to use the long-wavelength approximation in the projection
+    :param duty_cycle_draws: Uniform random numbers, one per detector component, as in `compute_detector_fisher`
+
+    :return: The Fisher matrix and the square of the detector SNR for the whole signal, and the ones accumulated until each of the `times_before_merger`, with shapes `(n_times, n_params, n_params)` and `(n_times,)`.
     """
+    data_params = {
+        'frequencyvector': detector.frequencyvector,
+        'f_ref': 50.
+    }
+    waveform_obj = waveform_class(waveform_model, signal_parameter_values, data_params)
+    wave = waveform_obj()
+    t_of_f = waveform_obj.t_of_f
+
+    signal = det.projection(signal_parameter_values, detector, wave, t_of_f, long_wavelength_approx = long_wavelength)
+    frequencyvector = detector.frequencyvector[:, 0]
+
+    component_SNRs = det.SNR(detector, signal, use_duty_cycle, frequencyvector=frequencyvector, duty_cycle_draws=duty_cycle_draws)
+    detector_SNR_square = np.sum(component_SNRs ** 2)
 
     if fisher_parameters is None:
-        fisher_parameters = list(parameter_values.keys())
-        
-    if 'max_frequency_cutoff' in fisher_parameters:
-        fisher_parameters.remove('max_frequency_cutoff')
-    
-    if 'redshift' in fisher_parameters:
-        fisher_parameters.remove('redshift')
+        if isinstance(signal_parameter_values, dict):
+            fisher_parameters = list(signal_parameter_values.keys())
+        else:
+            fisher_parameters = signal_parameter_values.columns
 
-    n_params = len(fisher_parameters)
-    n_signals = len(parameter_values)
+    fisher_matrix = FisherMatrix(waveform_model, signal_parameter_values, fisher_parameters, detector, waveform_class=waveform_class)
 
-    assert n_params > 0
-    assert n_signals > 0
-    
-    if isinstance(save_matrices_path, str):
-        save_matrices_path = Path(save_matrices_path)
-    
-    if save_matrices:
-        save_matrices_path.mkdir(parents=True, exist_ok=True)
-        fisher_matrices = np.zeros((n_signals, n_params, n_params))
-        inv_fisher_matrices = np.zeros((n_signals, n_params, n_params))
+    if isinstance(signal_parameter_values, pd.DataFrame):
+        signal_parameter_values = signal_parameter_values.iloc[0]
 
-    signals_havesky = False
-    if ("ra" in fisher_parameters) and ("dec" in fisher_parameters):
-        signals_havesky = True
-        i_ra = fisher_parameters.index("ra")
-        i_dec = fisher_parameters.index("dec")
+    n_frequencies = len(frequencyvector)
+    n_components = len(detector.components)
 
-    detector_snr_thr, network_snr_thr = network.detection_SNR
+    # noise-weighted integration weights, the trapezoid rule being exact also for signals cut at some bin
+    weights = 4 * _trapezoid_weights(frequencyvector)[:, np.newaxis] / np.stack(
+        [component.Sn(frequencyvector) for component in detector.components], axis=1
+    )
+    # components which are not operating (see `det.SNR`) do not contribute at any time
+    weights_SNR = weights * (component_SNRs > 0)
+
+    derivatives = np.stack([
+        np.reshape(fisher_matrix.derivative_of(parameter), (n_frequencies, n_components))
+        for parameter in fisher_parameters
+    ])
+    signal = np.reshape(signal, (n_frequencies, n_components))
+
+    # number of frequency bins observed before each time, the bins being ordered in time
+    times_before_merger = np.atleast_1d(np.asarray(times_before_merger, dtype=float))
+    n_observed = np.sum(
+        np.ravel(t_of_f)[np.newaxis, :] <= signal_parameter_values['geocent_time'] - times_before_merger[:, np.newaxis], axis=1
+    )
 
-    parameter_errors = np.zeros((n_signals, n_params))
-    if signals_havesky:
-        sky_localization = np.zeros((n_signals,))
-    network_snr = np.zeros((n_signals,))
+    cumulative_fisher = np.zeros((len(times_before_merger), len(fisher_parameters), len(fisher_parameters)))
+    cumulative_SNR_square = np.zeros(len(times_before_merger))
+
+    # the bins are summed once, from the earliest time to the latest
+    fisher_sum = np.zeros(cumulative_fisher.shape[1:])
+    SNR_square_sum = 0.
+    start = 0
+    for i_time in np.argsort(n_observed, kind='stable'):
+        stop = n_observed[i_time]
+        for k in range(n_components):
+            weighted = derivatives[:, start:stop, k] * weights[start:stop, k]
+            fisher_sum += np.real(weighted @ np.conjugate(derivatives[:, start:stop, k]).T)
+        SNR_square_sum += np.sum(np.abs(signal[start:stop]) ** 2 * weights_SNR[start:stop])
+        cumulative_fisher[i_time] = fisher_sum
+        cumulative_SNR_square[i_time] = SNR_square_sum
+        start = stop
+
+    return fisher_matrix.fm, detector_SNR_square, cumulative_fisher, cumulative_SNR_square
+
+# initial number of points and largest number of points of the grids of `adaptive_frequency_grid`
+ADAPTIVE_GRID_INITIAL_POINTS = 65
+ADAPTIVE_GRID_MAX_POINTS = 2**15 + 1
+
+def _detector_on_grid(detector: det.Detector, frequencyvector: np.ndarray) -> det.Detector:
+    """Shallow copy of the detector, sharing its components and PSDs, with another frequency grid."""
+    grid_detector = copy.copy(detector)
+    grid_detector.frequencyvector = np.ravel(frequencyvector)[:, np.newaxis]
+    return grid_detector
+
+def _grid_integrands(
+    detector: det.Detector,
+    signal_parameter_values: Union[pd.Series, dict[str, float]],
+    waveform_model: str,
+    waveform_class,
+    long_wavelength: bool,
+) -> np.ndarray:
+    """
+    Integrands which bound the accuracy of the SNR and Fisher matrix on the frequency grid
+    of the detector, with shape `(n_frequencies, 3)`: the one of the square of the SNR,
+    $4 |h|^2 / S_n$ summed over the components, the one of the `geocent_time` element
+    of the Fisher matrix, $(2 \\pi f)^2$ times it, and $(f / 1 {\\rm Hz})^{-10/3}$ times it,
+    the leading post-Newtonian term of the elements of the masses, whose derivatives
+    of the phase scale as $f^{-5/3}$.
+    """
+    data_params = {
+        'frequencyvector': detector.frequencyvector,
+        'f_ref': 50.
+    }
+    waveform_obj = waveform_class(waveform_model, signal_parameter_values, data_params)
+    signal = det.projection(signal_parameter_values, detector, waveform_obj(), waveform_obj.t_of_f, long_wavelength_approx = long_wavelength)
 
-    for k in tqdm(range(n_signals)):
-        network_fisher_matrix = np.zeros((n_params, n_params))
+    frequencyvector = detector.frequencyvector[:, 0]
+    SNR_integrand = 4 * np.sum(np.abs(np.reshape(signal, (len(frequencyvector), -1))) ** 2 / np.stack(
+        [component.Sn(frequencyvector) for component in detector.components], axis=1
+    ), axis=1)
 
-        network_snr_square = 0.
-        
-        signal_parameter_values = parameter_values.iloc[k]
+    return np.stack([
+        SNR_integrand, (2 * np.pi * frequencyvector) ** 2 * SNR_integrand, frequencyvector ** (-10 / 3) * SNR_integrand
+    ], axis=1)
 
-        for detector in network.detectors:
-            
-            detector_fisher, detector_snr_square = compute_detector_fisher(detector, signal_parameter_values, fisher_parameters, waveform_model, waveform_class, use_duty_cycle, long_wavelength = long_wavelength)
-            
-            network_snr_square += detector_snr_square
-        
-            if np.sqrt(detector_snr_square) > detector_snr_thr:
-                network_fisher_matrix += detector_fisher
+def adaptive_frequency_grid(
+    detector: det.Detector,
+    signal_parameter_values: Union[pd.Series, dict[str, float]],
+    waveform_model: str = wf.DEFAULT_WAVEFORM_MODEL,
+    waveform_class: type(wf.Waveform) = wf.LALFD_Waveform,
+    tolerance: float = 1e-2,
+    long_wavelength: bool = True,
+    n_initial: int = ADAPTIVE_GRID_INITIAL_POINTS,
+    max_points: int = ADAPTIVE_GRID_MAX_POINTS,
+) -> np.ndarray:
+    """
+    Frequency grid adapted to one signal in a detector, on which its SNR and Fisher matrix
+    reach a relative accuracy of about `tolerance` with as few bins as possible.
+
+    The band is first truncated with the signal projected on the grid of the detector:
+    the bins where it vanishes (e.g. above the cutoff of `TaylorF2`, or outside of the
+    in-band window) are dropped, together with the low- and high-frequency tails which
+    contribute less than `tolerance / 4` each to the square of the SNR, to the
+    `geocent_time` element of the Fisher matrix (the most weighted towards high frequencies)
+    and to the leading term of the elements of the masses (the most weighted towards low frequencies).
+    For detectors with a `mission_lifetime`, the upper end of the band is kept,
+    since their in-band window is counted back from it.
+    Geometric grids on this band, with `n_initial` points and then twice as many at each step,
+    are then refined until these three integrals change by less than `tolerance / 2`;
+    the grid before the last refinement is returned. Each grid is made of every other
+    point of the next one, so that, for the waveforms evaluated point by point in frequency,
+    each refinement only computes the signal at the new points. Since this change overestimates
+    the error of the coarser grid, the SNR and Fisher matrix elements are usually a few times
+    more accurate than `tolerance`.
 
-        network_fisher_inverse, _ = invertSVD(network_fisher_matrix)
-        
-        if save_matrices:
-            fisher_matrices[k, :, :] = network_fisher_matrix
-            inv_fisher_matrices[k, :, :] = network_fisher_inverse
-        
-        parameter_errors[k, :] = np.sqrt(np.diagonal(network_fisher_inverse))
+    Example usage:
 
-        network_snr[k] = np.sqrt(network_snr_square)
+    ```
+    >>> from GWFish.modules.detection import Detector
+    >>> detector = Detector('ET')
+    >>> params = {
+    ...    'mass_1': 50.,
+    ...    'mass_2': 50.,
+    ...    'luminosity_distance': 1000.,
+    ...    'theta_jn': 0.,
+    ...    'ra': 0.,
+    ...    'dec': 0.,
+    ...    'phase': 0.,
+    ...    'psi': 0.,
+    ...    'geocent_time': 1e9,
+    ...    }
+    >>> grid = adaptive_frequency_grid(detector, params, 'TaylorF2', wf.TaylorF2)
+    >>> print(len(grid), len(detector.frequencyvector))
+    513 1000
+    >>> print(f'{4 * aux.fisco(params):.1f} {grid[-1]:.1f}')
+    175.9 176.9
 
-        if signals_havesky:
-            sky_localization[k] = sky_localization_area(
-                network_fisher_inverse, parameter_values["dec"].iloc[k], i_ra, i_dec
-            )
+    ```
 
-    detected, = np.where(network_snr > network_snr_thr)
+    :param detector: The detector whose grid is adapted; the new grid lies within its frequency range
+    :param signal_parameter_values: The parameter values for the signal, as in `compute_detector_fisher`
+    :param waveform_model: The waveform model to use (see [choosing an approximant](../how-to/choosing_an_approximant.md));
+    :param waveform_class: The waveform class to use (see [choosing an approximant](../how-to/choosing_an_approximant.md));
+    :param tolerance: Target relative accuracy of the SNR and Fisher matrix elements
+    :param long_wavelength: Whether to use the long-wavelength approximation in the projection
+    :param n_initial: Number of points of the first geometric grid
+    :param max_points: Largest number of points of the grid; if it is reached before the target accuracy, a warning is logged
 
-    if save_matrices:
-        
-        if matrix_naming_postfix != '':
-            if not matrix_naming_postfix.startswith('_'):
-                matrix_naming_postfix = f'_{matrix_naming_postfix}'
-        
-        fisher_matrices = fisher_matrices[detected, :, :]
-        inv_fisher_matrices = inv_fisher_matrices[detected, :, :]
-        
-        np.save(save_matrices_path /  f"fisher_matrices{matrix_naming_postfix}.npy", fisher_matrices)
-        np.save(save_matrices_path /  f"inv_fisher_matrices{matrix_naming_postfix}.npy", inv_fisher_matrices)
-
-    if signals_havesky:
-        return (
-            detected,
-            network_snr,
-            parameter_errors,
-            sky_localization,
-        )
+    :return: The frequency grid, in Hz, as a one-dimensional array
+    """
 
-    return detected, network_snr, parameter_errors, None
+    if isinstance(signal_parameter_values, pd.DataFrame):
+        signal_parameter_values = signal_parameter_values.iloc[0]
+
+    frequencyvector = detector.frequencyvector[:, 0]
+    integrands = _grid_integrands(detector, signal_parameter_values, waveform_model, waveform_class, long_wavelength)
+    contributions = _trapezoid_weights(frequencyvector)[:, np.newaxis] * integrands
+    totals = np.sum(contributions, axis=0)
+
+    if not np.all(totals > 0):
+        # no signal in band: its SNR and Fisher matrix vanish on any grid
+        return np.geomspace(frequencyvector[0], frequencyvector[-1], n_initial)
+
+    # fractions of the integrals below and above each bin, the bin included
+    fractions = contributions / totals
+    below = np.cumsum(fractions, axis=0)
+    above = np.cumsum(fractions[::-1], axis=0)[::-1]
+
+    # the last dropped bin on each side is kept as the edge of the band
+    i_low = max(np.sum(np.all(below <= tolerance / 4, axis=1)) - 1, 0)
+    i_high = min(len(frequencyvector) - np.sum(np.all(above <= tolerance / 4, axis=1)), len(frequencyvector) - 1)
+    if getattr(detector, 'mission_lifetime', None) is not None:
+        i_high = len(frequencyvector) - 1
+
+    point_by_point = wf._evaluated_point_by_point(waveform_class, waveform_model)
+
+    n_points = n_initial
+    refined_grid = refined_integrands = None
+    while True:
+        next_grid = np.geomspace(frequencyvector[i_low], frequencyvector[i_high], 2 * n_points - 1)
+        if refined_grid is not None and point_by_point:
+            # the previous refined grid is made of every other point of this one,
+            # so the signal is only computed at the points in between
+            next_grid[::2] = refined_grid
+            next_integrands = np.empty((len(next_grid), refined_integrands.shape[1]))
+            next_integrands[::2] = refined_integrands
+            next_integrands[1::2] = _grid_integrands(
+                _detector_on_grid(detector, next_grid[1::2]), signal_parameter_values, waveform_model, waveform_class, long_wavelength
+            )
+        else:
+            next_integrands = _grid_integrands(
+                _detector_on_grid(detector, next_grid), signal_parameter_values, waveform_model, waveform_class, long_wavelength
+            )
+        refined_grid, refined_integrands = next_grid, next_integrands
+        grid = refined_grid[::2]
+        refined_integrals = np.trapz(refined_integrands, refined_grid, axis=0)
+        integrals = np.trapz(refined_integrands[::2], grid, axis=0)
+
+        if np.all(np.abs(integrals - refined_integrals) <= tolerance / 2 * np.abs(refined_integrals)):
+            return grid
+
+        if 2 * len(refined_grid) - 1 > max_points:
+            logging.warning(
+                f'The adaptive grid of {detector.name} did not reach a relative accuracy of {tolerance} '
+                f'with {len(refined_grid)} points'
+            )
+            return refined_grid
 
+        n_points = len(refined_grid)
 
-def errors_file_name(
-    network: det.Network, sub_network_ids: list[int], population_name: str
-) -> str:
+class SharedParameterFisher:
+    """
+    Population Fisher matrix of parameters shared by all the signals,
+    such as the deviations from general relativity in a test of GR.
 
-    sub_network = "_".join([network.detectors[k].name for k in sub_network_ids])
+    Each detected signal contributes its network Fisher matrix
+    marginalized over its own parameters (see `marginalize_fisher_matrices`),
+    and the contributions are summed as the signals are analyzed,
+    so that the Fisher matrices of the single signals never need to be saved.
+    The errors on the shared parameters after each signal are kept,
+    giving the population constraints as a function of the number of detections.
 
-    return (
-        f"Errors_{sub_network}_{population_name}_SNR{network.detection_SNR[1]:.0f}")
+    Example usage:
 
+    ```
+    >>> shared_fisher = SharedParameterFisher(['beta'])
+    >>> shared_fisher.add(np.array([[[1.]], [[3.]]]))
+    >>> print(shared_fisher.n_signals, shared_fisher.errors)
+    2 [0.5]
+    >>> print(shared_fisher.cumulative_errors[:, 0])
+    [1.  0.5]
 
-def output_to_txt_file(
-    parameter_values: pd.DataFrame,
-    network_snr: np.ndarray,
+    ```
+    """
+
+    def __init__(self, shared_parameters: list[str]):
+        """
+        :param shared_parameters: names of the shared parameters; they must be among the Fisher parameters of the analysis
+        """
+
+        self.shared_parameters = list(shared_parameters)
+        n_shared = len(self.shared_parameters)
+        self.fisher_matrix = np.zeros((n_shared, n_shared))
+        self._cumulative_errors = [np.zeros((0, n_shared))]
+
+    @property
+    def n_signals(self) -> int:
+        return sum(len(errors) for errors in self._cumulative_errors)
+
+    @property
+    def cumulative_errors(self) -> np.ndarray:
+        """Array with shape `(n_signals, n_shared)` - one-sigma errors on the shared parameters after each signal."""
+        return np.concatenate(self._cumulative_errors)
+
+    @property
+    def errors(self) -> np.ndarray:
+        """Array with shape `(n_shared,)` - one-sigma errors on the shared parameters from all the signals added so far."""
+        inverse, _, _ = invert_fisher_matrices(self.fisher_matrix[np.newaxis])
+        return np.sqrt(np.diag(inverse[0]))
+
+    def add(self, marginalized_fisher_matrices: np.ndarray) -> None:
+        """
+        Add the contributions of some signals, in the order in which they are counted.
+
+        :param marginalized_fisher_matrices: array with shape `(n_signals, n_shared, n_shared)` - Fisher matrices of the shared parameters, marginalized over the other ones
+        """
+
+        if len(marginalized_fisher_matrices) == 0:
+            return
+
+        cumulative = self.fisher_matrix + np.cumsum(marginalized_fisher_matrices, axis=0)
+        inverses, _, _ = invert_fisher_matrices(cumulative)
+
+        self._cumulative_errors.append(np.sqrt(np.einsum('...ii->...i', inverses)))
+        self.fisher_matrix = cumulative[-1]
+
+# maximum number of network Fisher matrices inverted at once
+INVERSION_BATCH_SIZE = 1000
+
+def _compute_signals_errors(
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    fisher_parameters: list[str],
+    waveform_model: str,
+    waveform_class,
+    use_duty_cycle: bool,
+    long_wavelength: bool,
+    save_matrices: bool,
+    duty_cycle_draws: Optional[np.ndarray] = None,
+    progress_bar: bool = False,
+    shared_parameters: Optional[list[str]] = None,
+    sweep_parameters: Optional[list[str]] = None,
+    true_parameters: Optional[dict[str, float]] = None,
+    true_waveform_model: Optional[str] = None,
+    true_waveform_class = None,
+    early_warning_times: Optional[list[float]] = None,
+    derivatives_dtype: Optional[str] = None,
+    multiband: bool = False,
+    adaptive_grid_tolerance: Optional[float] = None,
+    interpolation_tolerance: Optional[float] = None,
+    relative_binning_width: Optional[float] = None,
+    signal_dtype: Optional[str] = None,
+) -> dict[str, Optional[np.ndarray]]:
+    """
+    Compute network SNRs, Fisher errors and sky localizations for
+    a block of signals, in the order of the rows of `parameter_values`.
+    This is the body of the population loop, shared by the serial path
+    and by the process-pool workers.
+    The network Fisher matrices are inverted in batches with `invert_fisher_matrices`,
+    whose condition numbers and numbers of kept singular values are returned as well.
+    If `save_matrices` is `True`, the Fisher matrices and their inverses
+    are returned for the signals above the network SNR threshold only.
+    If `shared_parameters` are given, the Fisher matrices of the detected signals
+    marginalized over all the other parameters are returned as well.
+    If `sweep_parameters` are given, the Fisher matrices are computed for them as well,
+    and the errors on each of them, added alone to the `fisher_parameters`,
+    are returned from the factorization of the `fisher_parameters` block (see `bordered_fisher_errors`);
+    all other results only refer to the `fisher_parameters`.
+    If a true signal is given (`true_parameters`, `true_waveform_model` or `true_waveform_class`),
+    the systematic biases of the `fisher_parameters` are returned as well.
+    With `early_warning_times`, the network SNRs, errors and sky localizations
+    of the signals observed until each of these times before merger are returned as well
+    (see `compute_detector_early_warning`); a detector contributes to the Fisher matrix 
+    at a given time if its SNR accumulated until then is above the threshold.
+    With `derivatives_dtype`, the projected signals and derivatives of all signals and detectors
+    are returned as well, with this data type, in the format of `storage.DerivativeStore`
+    (the first column of `derivative_records` being the position of the signal in `parameter_values`).
+    The waveforms of each signal are computed once for all the detectors with the same
+    frequency grid, and with `multiband` once for all detectors, on the union of their grids
+    (see `_frequency_grid_groups` and `wf.MergedGridWaveforms`).
+    With `adaptive_grid_tolerance`, each signal is computed in each detector on its own
+    frequency grid, given by `adaptive_frequency_grid` with this tolerance, instead of
+    the one of the detector; the detectors are then grouped by these grids.
+    With `interpolation_tolerance`, the waveforms are interpolated from coarse sets of
+    frequencies with this relative tolerance (see `wf.InterpolatedWaveforms`).
+    With `relative_binning_width`, the Fisher matrices are computed with relative binning
+    (see `RelativeBinningFisherMatrix`); the waveforms are then not shared among the detectors,
+    since the ones at the perturbed parameters are only computed at the bin edges of each detector.
+    With `signal_dtype`, the projected signals and derivatives are kept with this complex data type
+    (see `compute_detector_fisher`).
+    """
+
+    n_params = len(fisher_parameters)
+    n_signals = len(parameter_values)
+
+    if sweep_parameters is None:
+        sweep_parameters = []
+    n_sweep = len(sweep_parameters)
+
+    bias_kwargs = {
+        key: value for key, value in [
+            ('true_parameters', true_parameters),
+            ('true_waveform_model', true_waveform_model),
+            ('true_waveform_class', true_waveform_class),
+        ] if value is not None
+    }
+    fisher_kwargs = {
+        key: value for key, value in [
+            ('relative_binning_width', relative_binning_width),
+            ('signal_dtype', signal_dtype),
+        ] if value is not None
+    }
+
+    early_warning = early_warning_times is not None
+    n_times = len(early_warning_times) if early_warning else 0
+
+    signals_havesky = False
+    if ("ra" in fisher_parameters) and ("dec" in fisher_parameters):
+        signals_havesky = True
+        i_ra = fisher_parameters.index("ra")
+        i_dec = fisher_parameters.index("dec")
+
+    detector_snr_thr, network_snr_thr = network.detection_SNR
+
+    grid_groups = _frequency_grid_groups(network.detectors, multiband)
+
+    # columns of duty_cycle_draws belonging to each detector
+    component_offsets = np.cumsum([0] + [len(detector.components) for detector in network.detectors])
+
+    parameter_errors = np.zeros((n_signals, n_params))
+    sky_localization = np.zeros((n_signals,)) if signals_havesky else None
+    network_snr = np.zeros((n_signals,))
+    condition_numbers = np.zeros((n_signals,))
+    n_kept_singular_values = np.zeros((n_signals,), dtype=int)
+    sweep_errors = np.zeros((n_signals, n_sweep))
+    parameter_biases = np.zeros((n_signals, n_params))
+    early_warning_snr = np.zeros((n_signals, n_times))
+    early_warning_errors = np.zeros((n_signals, n_times, n_params))
+    early_warning_sky_localization = np.zeros((n_signals, n_times)) if signals_havesky else None
+    fisher_matrices = []
+    inv_fisher_matrices = []
+    shared_fisher_matrices = []
+    early_warning_fisher_matrices = []
+    derivative_data = []
+    derivative_records = []
+
+    if shared_parameters is not None:
+        shared_indices = [fisher_parameters.index(parameter) for parameter in shared_parameters]
+
+    # the network Fisher matrices are inverted together, in batches of bounded size
+    batch_fisher_matrices = np.zeros((min(n_signals, INVERSION_BATCH_SIZE), n_params + n_sweep, n_params + n_sweep))
+    batch_bias_products = np.zeros((min(n_signals, INVERSION_BATCH_SIZE), n_params + n_sweep))
+    batch_early_warning_fisher = np.zeros((min(n_signals, INVERSION_BATCH_SIZE) if early_warning else 0, n_times, n_params + n_sweep, n_params + n_sweep))
+
+    for k in tqdm(range(n_signals), disable=not progress_bar):
+        network_fisher_matrix = batch_fisher_matrices[k % INVERSION_BATCH_SIZE]
+        network_fisher_matrix[:] = 0.
+        network_bias_products = batch_bias_products[k % INVERSION_BATCH_SIZE]
+        network_bias_products[:] = 0.
+        if early_warning:
+            network_early_warning_fisher = batch_early_warning_fisher[k % INVERSION_BATCH_SIZE]
+            network_early_warning_fisher[:] = 0.
+            early_warning_snr_square = np.zeros(n_times)
+
+        network_snr_square = 0.
+        
+        signal_parameter_values = parameter_values.iloc[k]
+
+        if adaptive_grid_tolerance is None:
+            signal_detectors, signal_grid_groups = network.detectors, grid_groups
+        else:
+            signal_detectors = [
+                _detector_on_grid(detector, adaptive_frequency_grid(
+                    detector, signal_parameter_values, waveform_model, waveform_class, adaptive_grid_tolerance, long_wavelength
+                ))
+                for detector in network.detectors
+            ]
+            signal_grid_groups = _frequency_grid_groups(signal_detectors, multiband)
+
+        if interpolation_tolerance is None:
+            signal_waveform_class = waveform_class
+        else:
+            signal_waveform_class = wf.InterpolatedWaveforms(waveform_class, interpolation_tolerance)
+
+        # the waveforms of this signal, shared by the detectors of each group
+        detector_waveform_classes = [signal_waveform_class] * len(network.detectors)
+        for group in signal_grid_groups:
+            if (multiband or len(group) > 1) and relative_binning_width is None:
+                shared_waveforms = wf.MergedGridWaveforms(
+                    signal_waveform_class, np.concatenate([signal_detectors[i_det].frequencyvector[:, 0] for i_det in group])
+                )
+                for i_det in group:
+                    detector_waveform_classes[i_det] = shared_waveforms
+
+        for i_det, detector in enumerate(signal_detectors):
+            signal_waveform_class = detector_waveform_classes[i_det]
+            
+            if duty_cycle_draws is None:
+                detector_draws = None
+            else:
+                detector_draws = duty_cycle_draws[k, component_offsets[i_det]:component_offsets[i_det+1]]
+
+            if early_warning:
+                detector_results = compute_detector_early_warning(detector, signal_parameter_values, early_warning_times, fisher_parameters + sweep_parameters, waveform_model, signal_waveform_class, use_duty_cycle, long_wavelength = long_wavelength, duty_cycle_draws = detector_draws)
+                early_warning_snr_square += detector_results[3]
+                observed = np.sqrt(detector_results[3]) > detector_snr_thr
+                network_early_warning_fisher[observed] += detector_results[2][observed]
+            else:
+                detector_results = compute_detector_fisher(detector, signal_parameter_values, fisher_parameters + sweep_parameters, waveform_model, signal_waveform_class, use_duty_cycle, long_wavelength = long_wavelength, duty_cycle_draws = detector_draws, return_derivatives = derivatives_dtype is not None, **bias_kwargs, **fisher_kwargs)
+            detector_fisher, detector_snr_square = detector_results[:2]
+
+            if derivatives_dtype is not None:
+                # only the range of frequency bins where the signal or a derivative is nonzero is kept
+                in_band, = np.nonzero(np.any(detector_results[-1] != 0, axis=(0, 2)))
+                if len(in_band) > 0:
+                    first_bin, n_bins = in_band[0], in_band[-1] + 1 - in_band[0]
+                    derivative_data.append(np.ravel(detector_results[-1][:, first_bin:first_bin + n_bins].astype(derivatives_dtype)))
+                    derivative_records.append([k, i_det, first_bin, n_bins])
+            
+            network_snr_square += detector_snr_square
+        
+            if np.sqrt(detector_snr_square) > detector_snr_thr:
+                network_fisher_matrix += detector_fisher
+                if bias_kwargs:
+                    network_bias_products += detector_results[2]
+
+        network_snr[k] = np.sqrt(network_snr_square)
+        if early_warning:
+            early_warning_snr[k] = np.sqrt(early_warning_snr_square)
+
+        if (k + 1) % INVERSION_BATCH_SIZE != 0 and k + 1 != n_signals:
+            continue
+
+        batch = slice(k - k % INVERSION_BATCH_SIZE, k + 1)
+        batch_fisher = batch_fisher_matrices[:batch.stop - batch.start, :n_params, :n_params]
+
+        batch_inverse, condition_numbers[batch], n_kept_singular_values[batch] = invert_fisher_matrices(batch_fisher)
+        
+        parameter_errors[batch, :] = np.sqrt(np.einsum('...ii->...i', batch_inverse))
+
+        if bias_kwargs:
+            parameter_biases[batch] = np.einsum('nij,nj->ni', batch_inverse, batch_bias_products[:batch.stop - batch.start, :n_params])
+
+        if n_sweep > 0:
+            sweep_errors[batch] = bordered_fisher_errors(batch_fisher_matrices[:batch.stop - batch.start], n_params)
+
+        if signals_havesky:
+            sky_localization[batch] = sky_localization_area(
+                batch_inverse, parameter_values["dec"].iloc[batch].to_numpy(), i_ra, i_dec
+            )
+
+        batch_detected = network_snr[batch] > network_snr_thr
+
+        if save_matrices:
+            fisher_matrices.extend(batch_fisher[batch_detected])
+            inv_fisher_matrices.extend(batch_inverse[batch_detected])
+
+        if shared_parameters is not None:
+            shared_fisher_matrices.extend(marginalize_fisher_matrices(batch_fisher[batch_detected], shared_indices))
+
+        if early_warning:
+            # the matrices of all the times are inverted together; 
+            # the ones of times when no detector is above threshold yet give nan
+            batch_early_warning = batch_early_warning_fisher[:batch.stop - batch.start, :, :n_params, :n_params]
+            early_warning_inverse, _, _ = invert_fisher_matrices(np.reshape(batch_early_warning, (-1, n_params, n_params)))
+            early_warning_inverse = np.reshape(early_warning_inverse, batch_early_warning.shape)
+            early_warning_errors[batch] = np.sqrt(np.einsum('...ii->...i', early_warning_inverse))
+            if signals_havesky:
+                early_warning_sky_localization[batch] = sky_localization_area(
+                    early_warning_inverse, parameter_values["dec"].iloc[batch].to_numpy()[:, np.newaxis], i_ra, i_dec
+                )
+            if save_matrices:
+                early_warning_fisher_matrices.extend(batch_early_warning[batch_detected])
+
+    return {
+        'network_snr': network_snr,
+        'parameter_errors': parameter_errors,
+        'sky_localization': sky_localization,
+        'condition_numbers': condition_numbers,
+        'n_kept_singular_values': n_kept_singular_values,
+        'fisher_matrices': np.reshape(fisher_matrices, (-1, n_params, n_params)) if save_matrices else None,
+        'inv_fisher_matrices': np.reshape(inv_fisher_matrices, (-1, n_params, n_params)) if save_matrices else None,
+        'shared_fisher_matrices': (
+            np.reshape(shared_fisher_matrices, (-1, len(shared_parameters), len(shared_parameters)))
+            if shared_parameters is not None else None
+        ),
+        'sweep_errors': sweep_errors if n_sweep > 0 else None,
+        'parameter_biases': parameter_biases if bias_kwargs else None,
+        'early_warning_snr': early_warning_snr if early_warning else None,
+        'early_warning_errors': early_warning_errors if early_warning else None,
+        'early_warning_sky_localization': early_warning_sky_localization if early_warning else None,
+        'early_warning_fisher_matrices': (
+            np.reshape(early_warning_fisher_matrices, (-1, n_times, n_params, n_params))
+            if early_warning and save_matrices else None
+        ),
+        'derivative_data': (
+            np.concatenate(derivative_data) if derivative_data else np.zeros(0, dtype=derivatives_dtype)
+        ) if derivatives_dtype is not None else None,
+        'derivative_records': (
+            np.reshape(np.asarray(derivative_records, dtype=np.int64), (-1, 4))
+            if derivatives_dtype is not None else None
+        ),
+    }
+
+def _frequency_grid_groups(detectors: list[det.Detector], multiband: bool = False) -> list[list[int]]:
+    """
+    Groups of detectors (as positions in the list) whose waveforms are computed together:
+    all the detectors with `multiband`, and otherwise the ones with the same frequency grid
+    (e.g. `CE1`, `CE2`, `LLO`, `LHO` and `VIR`), for which sharing the waveforms does not change the results.
+    """
+
+    if multiband:
+        return [list(range(len(detectors)))]
+
+    groups = []
+    for i_det, detector in enumerate(detectors):
+        for group in groups:
+            if np.array_equal(detectors[group[0]].frequencyvector, detector.frequencyvector):
+                group.append(i_det)
+                break
+        else:
+            groups.append([i_det])
+
+    return groups
+
+# state of a process-pool worker, set once by _init_population_worker
+_worker_state = {}
+
+def _init_population_worker(network, compute_kwargs):
+    _worker_state['network'] = network
+    _worker_state['compute_kwargs'] = compute_kwargs
+
+def _population_worker(chunk):
+    parameter_values, duty_cycle_draws = chunk
+    return _compute_signals_errors(
+        _worker_state['network'],
+        parameter_values,
+        duty_cycle_draws=duty_cycle_draws,
+        **_worker_state['compute_kwargs'],
+    )
+
+def _population_chunks(n_signals: int, chunk_size: int) -> list[slice]:
+    return [slice(start, min(start + chunk_size, n_signals)) for start in range(0, n_signals, chunk_size)]
+
+def _fisher_parameters(
+    parameter_values: pd.DataFrame,
+    fisher_parameters: Optional[list[str]],
+) -> list[str]:
+    """
+    Parameters of the Fisher analysis: all the parameters of the signals if `fisher_parameters` is `None`,
+    excluding the ones the waveforms cannot be differentiated with respect to.
+    """
+
+    if fisher_parameters is None:
+        fisher_parameters = list(parameter_values.keys())
+        
+    if 'max_frequency_cutoff' in fisher_parameters:
+        fisher_parameters.remove('max_frequency_cutoff')
+    
+    if 'redshift' in fisher_parameters:
+        fisher_parameters.remove('redshift')
+
+    # the index of the ppE term is fixed, only its amplitude is measured
+    if 'ppe_b' in fisher_parameters:
+        fisher_parameters.remove('ppe_b')
+
+    return fisher_parameters
+
+def _network_errors(
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    fisher_parameters: Optional[list[str]] = None,
+    waveform_model: str = wf.DEFAULT_WAVEFORM_MODEL,
+    waveform_class = wf.LALFD_Waveform,
+    use_duty_cycle: bool = False,
+    redefine_tf_vectors: bool = False,
+    save_matrices: bool = False,
+    long_wavelength: bool = True,
+    n_workers: int = 1,
+    chunk_size: Optional[int] = None,
+    checkpoint_path: Optional[Union[Path, str]] = None,
+    matrix_stores: Optional[tuple[storage.MatrixStore, storage.MatrixStore]] = None,
+    shared_fisher: Optional[SharedParameterFisher] = None,
+    sweep_parameters: Optional[list[str]] = None,
+    true_parameters: Optional[dict[str, float]] = None,
+    true_waveform_model: Optional[str] = None,
+    true_waveform_class = None,
+    early_warning_times: Optional[list[float]] = None,
+    derivative_store: Optional[storage.DerivativeStore] = None,
+    multiband: bool = False,
+    adaptive_grid_tolerance: Optional[float] = None,
+    interpolation_tolerance: Optional[float] = None,
+    relative_binning_width: Optional[float] = None,
+    signal_dtype: Union[str, np.dtype] = np.complex128,
+) -> dict[str, Optional[np.ndarray]]:
+    """
+    Body of `compute_network_errors`: its results are returned in a dictionary,
+    together with the Fisher matrices and their inverses for the detected
+    signals if `save_matrices` is `True` (`None` otherwise).
+    If `matrix_stores` are given, the matrices are instead appended to them
+    chunk by chunk, in the order of the signals, and not returned.
+    Likewise, the marginalized Fisher matrices of the detected signals 
+    are added chunk by chunk to `shared_fisher`, if given.
+    With `sweep_parameters`, the errors on each of them added alone
+    to the Fisher parameters are returned as `sweep_errors`,
+    and with a true signal the systematic biases as `parameter_biases`.
+    With `early_warning_times`, the results accumulated until each of them
+    are returned with the `early_warning_` prefix.
+    If a `derivative_store` is given, the projected signals and derivatives
+    of all the signals are appended to it chunk by chunk, in the order of the signals.
+    With `adaptive_grid_tolerance`, the signals are computed on their own frequency grids
+    (see `adaptive_frequency_grid`), and with `interpolation_tolerance` the waveforms
+    are interpolated from coarse sets of frequencies (see `wf.InterpolatedWaveforms`).
+    With `relative_binning_width`, the Fisher matrices are computed with relative binning
+    (see `RelativeBinningFisherMatrix`), and with a `signal_dtype` other than `complex128`
+    the projected signals and derivatives are kept in single precision.
+    """
+
+    fisher_parameters = _fisher_parameters(parameter_values, fisher_parameters)
+
+    n_params = len(fisher_parameters)
+    n_signals = len(parameter_values)
+
+    assert n_params > 0
+    assert n_signals > 0
+    
+    _, network_snr_thr = network.detection_SNR
+
+    # The duty-cycle random numbers are drawn here, in the same order
+    # in which the serial loop used to draw them (signal, detector, component),
+    # so that results do not depend on how the population is split among workers.
+    if use_duty_cycle:
+        n_components = sum(len(detector.components) for detector in network.detectors)
+        duty_cycle_draws = np.random.rand(n_signals, n_components)
+    else:
+        duty_cycle_draws = None
+
+    compute_kwargs = dict(
+        fisher_parameters=fisher_parameters,
+        waveform_model=waveform_model,
+        waveform_class=waveform_class,
+        use_duty_cycle=use_duty_cycle,
+        long_wavelength=long_wavelength,
+        save_matrices=save_matrices,
+    )
+
+    if shared_fisher is not None:
+        unknown = [parameter for parameter in shared_fisher.shared_parameters if parameter not in fisher_parameters]
+        if unknown:
+            raise ValueError(f'The shared parameters {unknown} are not among the Fisher parameters {fisher_parameters}')
+        compute_kwargs['shared_parameters'] = shared_fisher.shared_parameters
+
+    if sweep_parameters:
+        overlap = [parameter for parameter in sweep_parameters if parameter in fisher_parameters]
+        if overlap:
+            raise ValueError(f'The sweep parameters {overlap} are already among the Fisher parameters')
+        compute_kwargs['sweep_parameters'] = list(sweep_parameters)
+
+    for key, value in [
+        ('true_parameters', true_parameters),
+        ('true_waveform_model', true_waveform_model),
+        ('true_waveform_class', true_waveform_class),
+    ]:
+        if value is not None:
+            compute_kwargs[key] = value
+
+    if early_warning_times is not None:
+        if redefine_tf_vectors:
+            raise ValueError('The early-warning mode cannot be used with redefine_tf_vectors')
+        if any(key in compute_kwargs for key in ['true_parameters', 'true_waveform_model', 'true_waveform_class']):
+            raise ValueError('The early-warning mode cannot be combined with the systematic biases')
+        compute_kwargs['early_warning_times'] = [float(time) for time in early_warning_times]
+
+    if derivative_store is not None:
+        if redefine_tf_vectors or early_warning_times is not None:
+            raise ValueError('The derivatives cannot be saved with redefine_tf_vectors or in the early-warning mode')
+        if derivative_store.parameter_names != fisher_parameters + list(sweep_parameters or []):
+            raise ValueError(f'The parameters of the derivative store, {derivative_store.parameter_names}, are not the Fisher parameters')
+        compute_kwargs['derivatives_dtype'] = derivative_store.dtype.name
+
+    if multiband:
+        if not wf._evaluated_point_by_point(waveform_class, waveform_model):
+            # the waveforms on the merged grid would take its resolution and range
+            raise ValueError(
+                f'The multiband mode needs waveforms evaluated point by point in frequency, '
+                f'which {waveform_model} with {getattr(waveform_class, "__name__", waveform_class)} is not'
+            )
+        compute_kwargs['multiband'] = True
+
+    if adaptive_grid_tolerance is not None:
+        if redefine_tf_vectors or early_warning_times is not None or derivative_store is not None:
+            raise ValueError(
+                'The adaptive frequency grids cannot be used with redefine_tf_vectors, '
+                'in the early-warning mode or when saving the derivatives'
+            )
+        compute_kwargs['adaptive_grid_tolerance'] = float(adaptive_grid_tolerance)
+
+    if interpolation_tolerance is not None:
+        if any(key in compute_kwargs for key in ['true_parameters', 'true_waveform_model', 'true_waveform_class']):
+            # the interpolation errors would enter the difference between the true and template signals
+            raise ValueError('The interpolated waveforms cannot be used for the systematic biases')
+        compute_kwargs['interpolation_tolerance'] = float(interpolation_tolerance)
+
+    if relative_binning_width is not None:
+        if redefine_tf_vectors or early_warning_times is not None or multiband:
+            raise ValueError('Relative binning cannot be used with redefine_tf_vectors, in the early-warning mode or in the multiband mode')
+        compute_kwargs['relative_binning_width'] = float(relative_binning_width)
+
+    signal_dtype = np.dtype(signal_dtype)
+    if signal_dtype not in [np.complex64, np.complex128]:
+        raise ValueError(f'Unknown signal data type {signal_dtype}, use complex64 or complex128')
+    if signal_dtype != np.complex128:
+        if early_warning_times is not None:
+            raise ValueError('The single-precision signals cannot be used in the early-warning mode')
+        compute_kwargs['signal_dtype'] = signal_dtype.name
+
+    if checkpoint_path is not None:
+        checkpoint = storage.PopulationCheckpoint(checkpoint_path, storage.population_fingerprint(
+            parameter_values,
+            [detector.name for detector in network.detectors],
+            network.detection_SNR,
+            redefine_tf_vectors=redefine_tf_vectors,
+            **compute_kwargs,
+        ))
+        if duty_cycle_draws is not None:
+            duty_cycle_draws = checkpoint.duty_cycle_draws(duty_cycle_draws)
+        if chunk_size is None:
+            chunk_size = storage.CHECKPOINT_CHUNK_SIZE
+    else:
+        checkpoint = None
+
+    if chunk_size is None:
+        chunk_size = n_signals if n_workers <= 1 else int(np.ceil(n_signals / (4 * n_workers)))
+
+    chunks = _population_chunks(n_signals, chunk_size)
+    results = [None] * len(chunks)
+    
+    if checkpoint is not None:
+        for i_chunk, chunk in enumerate(chunks):
+            results[i_chunk] = checkpoint.load(chunk, require_matrices=save_matrices)
+        n_done = sum(result is not None for result in results)
+        if n_done > 0:
+            logging.info(f'Resuming from checkpoint: {n_done} of {len(chunks)} chunks already computed')
+
+    def chunk_inputs(chunk):
+        return parameter_values.iloc[chunk], None if duty_cycle_draws is None else duty_cycle_draws[chunk]
+
+    n_written = 0
+
+    def write_matrices():
+        # pass on the matrices of the chunks completed so far, keeping the order of the signals:
+        # they are appended to the stores, and the marginalized ones added to the population sum
+        nonlocal n_written
+        while n_written < len(chunks) and results[n_written] is not None:
+            result = results[n_written]
+            if matrix_stores is not None:
+                chunk_detected, = np.where(result['network_snr'] > network_snr_thr)
+                chunk_index = parameter_values.index[chunks[n_written]][chunk_detected]
+                matrix_stores[0].append(result['fisher_matrices'], chunk_index)
+                matrix_stores[1].append(result['inv_fisher_matrices'], chunk_index)
+                result['fisher_matrices'] = result['inv_fisher_matrices'] = None
+            if shared_fisher is not None:
+                shared_fisher.add(result['shared_fisher_matrices'])
+                result['shared_fisher_matrices'] = None
+            if derivative_store is not None:
+                records = np.array(result['derivative_records'])
+                records[:, 0] = parameter_values.index[chunks[n_written]][records[:, 0]]
+                derivative_store.append(result['derivative_data'], records)
+                result['derivative_data'] = result['derivative_records'] = None
+            n_written += 1
+
+    def store(i_chunk, result):
+        results[i_chunk] = result
+        if checkpoint is not None:
+            checkpoint.save(chunks[i_chunk], result)
+        write_matrices()
+
+    write_matrices()
+
+    pending = [i_chunk for i_chunk, result in enumerate(results) if result is None]
+
+    if n_workers <= 1:
+        for i_chunk in pending:
+            chunk_values, chunk_draws = chunk_inputs(chunks[i_chunk])
+            store(i_chunk, _compute_signals_errors(
+                network, chunk_values, duty_cycle_draws=chunk_draws, progress_bar=True, **compute_kwargs
+            ))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_population_worker,
+            initargs=(network, compute_kwargs),
+        ) as executor:
+            futures = {
+                executor.submit(_population_worker, chunk_inputs(chunks[i_chunk])): i_chunk
+                for i_chunk in pending
+            }
+            # chunks are stored as soon as they complete, and put back in order below
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                store(futures[future], future.result())
+
+    network_snr = np.concatenate([result['network_snr'] for result in results])
+    parameter_errors = np.concatenate([result['parameter_errors'] for result in results])
+    condition_numbers = np.concatenate([result['condition_numbers'] for result in results])
+    n_kept_singular_values = np.concatenate([result['n_kept_singular_values'] for result in results])
+    if results[0]['sky_localization'] is not None:
+        sky_localization = np.concatenate([result['sky_localization'] for result in results])
+    else:
+        sky_localization = None
+    if results[0]['sweep_errors'] is not None:
+        sweep_errors = np.concatenate([result['sweep_errors'] for result in results])
+    else:
+        sweep_errors = None
+    if results[0]['parameter_biases'] is not None:
+        parameter_biases = np.concatenate([result['parameter_biases'] for result in results])
+    else:
+        parameter_biases = None
+    early_warning = {}
+    for key in ['early_warning_snr', 'early_warning_errors', 'early_warning_sky_localization', 'early_warning_fisher_matrices']:
+        if results[0][key] is not None:
+            early_warning[key] = np.concatenate([result[key] for result in results])
+        else:
+            early_warning[key] = None
+
+    detected, = np.where(network_snr > network_snr_thr)
+
+    n_singular = np.sum(n_kept_singular_values[detected] < n_params)
+    if n_singular > 0:
+        logging.info(f'The Fisher matrices of {n_singular}/{len(detected)} detected signals were inverted with the pseudo-inverse')
+
+    if save_matrices and matrix_stores is None:
+        fisher_matrices = np.concatenate([result['fisher_matrices'] for result in results])
+        inv_fisher_matrices = np.concatenate([result['inv_fisher_matrices'] for result in results])
+    else:
+        fisher_matrices = inv_fisher_matrices = None
+
+    return {
+        'detected': detected,
+        'network_snr': network_snr,
+        'parameter_errors': parameter_errors,
+        'sky_localization': sky_localization,
+        'condition_numbers': condition_numbers,
+        'n_kept_singular_values': n_kept_singular_values,
+        'fisher_matrices': fisher_matrices,
+        'inv_fisher_matrices': inv_fisher_matrices,
+        'sweep_errors': sweep_errors,
+        'parameter_biases': parameter_biases,
+        **early_warning,
+    }
+
+def _matrix_paths(
+    save_matrices_path: Union[Path, str],
+    matrix_naming_postfix: str,
+) -> tuple[Path, Path]:
+    """
+    Paths, without extension, where the Fisher matrices and their inverses are saved.
+    """
+
+    if isinstance(save_matrices_path, str):
+        save_matrices_path = Path(save_matrices_path)
+
+    save_matrices_path.mkdir(parents=True, exist_ok=True)
+
+    if matrix_naming_postfix != '':
+        if not matrix_naming_postfix.startswith('_'):
+            matrix_naming_postfix = f'_{matrix_naming_postfix}'
+
+    return (
+        save_matrices_path / f"fisher_matrices{matrix_naming_postfix}",
+        save_matrices_path / f"inv_fisher_matrices{matrix_naming_postfix}",
+    )
+
+def _create_matrix_stores(
+    save_matrices_path: Union[Path, str],
+    matrix_naming_postfix: str,
+    fisher_parameters: list[str],
+    matrix_dtype: Union[str, np.dtype],
+) -> tuple[storage.MatrixStore, storage.MatrixStore]:
+    return tuple(
+        storage.MatrixStore.create(path, fisher_parameters, packed=True, dtype=matrix_dtype)
+        for path in _matrix_paths(save_matrices_path, matrix_naming_postfix)
+    )
+
+def _create_derivative_store(
+    derivatives_path: Union[Path, str],
+    network: det.Network,
+    parameter_names: list[str],
+    derivatives_dtype: Union[str, np.dtype],
+) -> storage.DerivativeStore:
+    return storage.DerivativeStore.create(
+        derivatives_path,
+        parameter_names,
+        [detector.name for detector in network.detectors],
+        [detector.frequencyvector for detector in network.detectors],
+        [len(detector.components) for detector in network.detectors],
+        dtype=derivatives_dtype,
+    )
+
+def _save_matrices(
+    save_matrices_path: Union[Path, str],
+    matrix_naming_postfix: str,
+    fisher_matrices: np.ndarray,
+    inv_fisher_matrices: np.ndarray,
+    matrix_dtype: Union[str, np.dtype] = np.float64,
+) -> None:
+
+    fisher_path, inv_fisher_path = _matrix_paths(save_matrices_path, matrix_naming_postfix)
+
+    np.save(Path(f"{fisher_path}.npy"), fisher_matrices.astype(matrix_dtype, copy=False))
+    np.save(Path(f"{inv_fisher_path}.npy"), inv_fisher_matrices.astype(matrix_dtype, copy=False))
+
+def compute_network_errors(
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    fisher_parameters: Optional[list[str]] = None,
+    waveform_model: str = wf.DEFAULT_WAVEFORM_MODEL,
+    waveform_class = wf.LALFD_Waveform,
+    use_duty_cycle: bool = False,
+    redefine_tf_vectors: bool = False,
+    save_matrices: bool = False,
+    save_matrices_path: Union[Path, str] = Path('.'),
+    matrix_naming_postfix: str = '',
+    long_wavelength: bool = True,
+    n_workers: int = 1,
+    chunk_size: Optional[int] = None,
+    checkpoint_path: Optional[Union[Path, str]] = None,
+    matrix_format: str = 'npy',
+    matrix_dtype: Union[str, np.dtype] = np.float64,
+    derivatives_path: Optional[Union[Path, str]] = None,
+    derivatives_dtype: Union[str, np.dtype] = np.complex128,
+    multiband: bool = False,
+    adaptive_grid_tolerance: Optional[float] = None,
+    interpolation_tolerance: Optional[float] = None,
+    relative_binning_width: Optional[float] = None,
+    signal_dtype: Union[str, np.dtype] = np.complex128,
+) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    Compute Fisher matrix errors for a network whose
+    SNR and Fisher matrices have already been calculated.
+
+    Will only return output for the `n_above_thr` signals 
+    for which the network SNR is above `network.detection_SNR[1]`.
+    
+    :param network: detector network to use
+    :param parameter_values: dataframe with parameters for one or more signals
+    :param fisher_parameters: list of parameters to use for the Fisher matrix analysis - if `None` (default), all waveform parameters are used
+    :param waveform_model: waveform model to use - refer to [choosing an approximant](../how-to/choosing_an_approximant.md)
+    :param waveform_model: waveform class to use - refer to [choosing an approximant](../how-to/choosing_an_approximant.md)
+    :param redefine_tf_vectors: Whether to redefine the time-frequency vectors in order to correctly model signals with small frequency evolution. Defaults to `False`.
+    :param use_duty_cycle: Whether to use the detector duty cycle (i.e. stochastically set the SNR to zero some of the time); defaults to `False`
+    :param save_matrices: Whether to save the Fisher matrices and their inverses to disk; defaults to `False`
+    :param save_matrices_path: Path (expressed with Pathlib or through a string) where  to save the Fisher matrices and their inverses to disk; defaults to `Path('.')` (the current folder)
+    :param matrix_naming_postfix: string to be appended to the names of the Fisher matrices and their inverses: they will look like `fisher_matrices_postfix.npy` and `inv_fisher_matrices_postfix.npy`
+    :param n_workers: number of worker processes among which the population is split; defaults to 1, which runs serially in the current process. The results do not depend on the number of workers, also when using the duty cycle.
+    :param chunk_size: number of signals sent to a worker at a time; if `None` (default), the population is split in about four chunks per worker, or in chunks of `storage.CHECKPOINT_CHUNK_SIZE` signals when checkpointing
+    :param checkpoint_path: folder where the results are saved chunk by chunk as they are computed; if the run is interrupted, calling this function again with the same inputs and `checkpoint_path` only computes the missing chunks. Defaults to `None` (no checkpointing)
+    :param matrix_format: how to save the matrices of the detected signals: `'npy'` (default) for two `.npy` files, or `'store'` for two `storage.MatrixStore` folders (`fisher_matrices_postfix` and `inv_fisher_matrices_postfix`), to which the matrices are written chunk by chunk as packed upper triangles, so that they are never all in memory
+    :param matrix_dtype: data type of the saved matrices; `float32` halves the space on disk
+    :param derivatives_path: if given, folder of a `storage.DerivativeStore` where the projected signals and their derivatives are saved for all signals and detectors, in their in-band frequency bins only; Fisher matrices and errors can then be recomputed for other detector PSDs or frequency cuts with `reweighting.reweighted_network_errors`, without computing any waveform. Defaults to `None` (not saved)
+    :param derivatives_dtype: complex data type of the saved derivatives; `complex64` halves the space on disk
+    :param multiband: Whether to compute the waveforms and their numerical derivatives once per signal, on the union of the frequency grids of the detectors, instead of once per frequency grid (detectors with the same grid always share them, see `wf.MergedGridWaveforms`); for networks of detectors in different bands, such as `LISA` with `ET` and `CE1`, the joint Fisher matrix then needs a single family of waveform evaluations. Each detector still uses its own grid, time-frequency relation and in-band window, so the results are the same. The waveforms must be evaluated point by point in frequency, as the GWFish waveforms and the LAL frequency-domain approximants are: `LALTD_Waveform`, and the approximants which `LALFD_Waveform` calls through `SimInspiralFD`, raise a `ValueError`. Defaults to `False`
+    :param adaptive_grid_tolerance: if given, each signal is computed in each detector on its own frequency grid, chosen by `adaptive_frequency_grid` with this relative tolerance on the SNR and Fisher matrix elements, instead of the fixed grid of the detector: the bins where the signal vanishes or contributes negligibly (e.g. above the ringdown of heavy binaries) are dropped before computing the waveforms, projections and inner products, and the remaining band gets as many bins as needed for the tolerance. It cannot be combined with `redefine_tf_vectors` or `derivatives_path`. Defaults to `None` (fixed grids)
+    :param interpolation_tolerance: if given, the waveforms are evaluated on coarse sets of frequencies, spaced according to the duration of the signal, and reconstructed on the detector grids by interpolating their amplitude and unwrapped phase, with this relative tolerance (see `wf.InterpolatedWaveforms`); this saves waveform evaluations for long signals on dense grids, such as binary neutron stars in `CE1`, with expensive waveform models. The numerical derivatives use the same frequencies as the waveform they are taken around, but parameters with tiny effects on the waveform (such as the tidal deformabilities at low frequencies) can still get relative errors on their Fisher matrix elements somewhat above the tolerance. It cannot be combined with the systematic biases. Defaults to `None` (waveforms evaluated on the grids)
+    :param relative_binning_width: if given, the Fisher matrices are computed with relative binning, with bins of this relative width (see `RelativeBinningFisherMatrix`): the signal is computed on the full grid of each detector, but the waveforms at the perturbed parameters of the numerical derivatives only at the bin edges, and the Fisher matrix elements are sums over the edges. The SNRs are not affected, and the relative error of the Fisher matrix elements is about $0.6 \\, \\mathrm{width}^2$. It cannot be combined with `redefine_tf_vectors` or `multiband`. Defaults to `None` (Fisher matrices on the full grids)
+    :param signal_dtype: complex data type in which the polarizations, projected signals and derivatives are computed and kept; `complex64` halves their memory, e.g. for screening large populations or together with `derivatives_dtype=complex64`, while the inner products, the Fisher matrices and their inversion stay in double precision. For the binary black holes of `test_data/test_data.hdf5` in `ET` and `CE1`, with `IMRPhenomD`, the SNRs agree with the double-precision ones to $10^{-8}$, and the errors to $10^{-6}$. It cannot be combined with the early-warning mode. Defaults to `complex128`
+    
+    :return:
+    - `detected`: array with shape `(n_above_thr,)` - array of indices for the detected signals.
+    - `network_snr`: array with shape `(n_signals,)` - Network SNR for all signals.
+    - `parameter_errors`: array with shape `(n_signals, n_parameters)` - One-sigma     Fisher errors for the parameters.
+    - `sky_localization`: array with shape `(n_signals,)` or `None` - One-sigma sky localization area in steradians, returned if the signals have both right ascension and declination, or `None` otherwise.
+    """
+
+    if matrix_format not in ['npy', 'store']:
+        raise ValueError(f"Unknown matrix format {matrix_format}, use 'npy' or 'store'")
+
+    fisher_parameters = _fisher_parameters(parameter_values, fisher_parameters)
+
+    if save_matrices and matrix_format == 'store':
+        matrix_stores = _create_matrix_stores(save_matrices_path, matrix_naming_postfix, fisher_parameters, matrix_dtype)
+    else:
+        matrix_stores = None
+
+    if derivatives_path is not None:
+        derivative_store = _create_derivative_store(derivatives_path, network, fisher_parameters, derivatives_dtype)
+    else:
+        derivative_store = None
+
+    results = _network_errors(
+        network,
+        parameter_values,
+        fisher_parameters=fisher_parameters,
+        waveform_model=waveform_model,
+        waveform_class=waveform_class,
+        use_duty_cycle=use_duty_cycle,
+        redefine_tf_vectors=redefine_tf_vectors,
+        save_matrices=save_matrices,
+        long_wavelength=long_wavelength,
+        n_workers=n_workers,
+        chunk_size=chunk_size,
+        checkpoint_path=checkpoint_path,
+        matrix_stores=matrix_stores,
+        derivative_store=derivative_store,
+        multiband=multiband,
+        adaptive_grid_tolerance=adaptive_grid_tolerance,
+        interpolation_tolerance=interpolation_tolerance,
+        relative_binning_width=relative_binning_width,
+        signal_dtype=signal_dtype,
+    )
+
+    if save_matrices and matrix_stores is None:
+        _save_matrices(save_matrices_path, matrix_naming_postfix, results['fisher_matrices'], results['inv_fisher_matrices'], matrix_dtype)
+
+    return results['detected'], results['network_snr'], results['parameter_errors'], results['sky_localization']
+
+def compute_network_biases(
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    fisher_parameters: Optional[list[str]] = None,
+    true_parameters: Optional[dict[str, float]] = None,
+    true_waveform_model: Optional[str] = None,
+    true_waveform_class = None,
+    **kwargs,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """
+    Compute Fisher errors together with the systematic biases of the parameters,
+    when the true signal differs from the template used to analyze it
+    (e.g. because of a deviation from GR, or of a different waveform model).
+
+    The biases are computed at linear order (Cutler & Vallisneri 2007) as
+    $\\Delta\\theta^i = (F^{-1})^{ij} (\\partial_j h | h_{\\rm true} - h)$,
+    summed over the detectors of the network: the derivatives of the template 
+    are the ones computed for the Fisher matrix, so the biases only cost
+    two more waveforms (the true one, and the template with `geocent_time = 0` 
+    to difference it with the true one accurately) per detector.
+
+    :param network: detector network to use
+    :param parameter_values: dataframe with the parameters of the template, for one or more signals
+    :param fisher_parameters: list of parameters to use for the Fisher matrix analysis - if `None` (default), all waveform parameters are used
+    :param true_parameters: parameters of the true signals which differ from the ones of the template, the same for all signals, e.g. `{'delta_phi_2': 0.1}`
+    :param true_waveform_model: waveform model of the true signals, if different from `waveform_model`
+    :param true_waveform_class: waveform class of the true signals, if different from `waveform_class`
+    :param kwargs: further arguments of `compute_network_errors`, such as `waveform_model`, `waveform_class`, `use_duty_cycle`, `n_workers`, `chunk_size` and `checkpoint_path`
+
+    :return:
+    - `detected`: array with shape `(n_above_thr,)` - array of indices for the detected signals.
+    - `network_snr`: array with shape `(n_signals,)` - Network SNR for all signals.
+    - `parameter_errors`: array with shape `(n_signals, n_parameters)` - One-sigma Fisher errors for the parameters.
+    - `sky_localization`: array with shape `(n_signals,)` or `None` - One-sigma sky localization area in steradians.
+    - `parameter_biases`: array with shape `(n_signals, n_parameters)` - Systematic biases of the parameters, i.e. the recovered minus the true values.
+    """
+
+    if true_parameters is None and true_waveform_model is None and true_waveform_class is None:
+        raise ValueError('The true signal must differ from the template, through true_parameters, true_waveform_model or true_waveform_class')
+
+    results = _network_errors(
+        network,
+        parameter_values,
+        fisher_parameters=_fisher_parameters(parameter_values, fisher_parameters),
+        true_parameters=true_parameters,
+        true_waveform_model=true_waveform_model,
+        true_waveform_class=true_waveform_class,
+        **kwargs,
+    )
+
+    return results['detected'], results['network_snr'], results['parameter_errors'], results['sky_localization'], results['parameter_biases']
+
+def compute_early_warning_errors(
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    times_before_merger: Union[list[float], np.ndarray],
+    fisher_parameters: Optional[list[str]] = None,
+    save_matrices: bool = False,
+    save_matrices_path: Union[Path, str] = Path('.'),
+    matrix_naming_postfix: str = '',
+    **kwargs,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    Network SNRs, Fisher errors and sky localizations of the signals
+    observed until some times before merger, for pre-merger alerts.
+
+    The waveform derivatives are computed once per signal and detector, 
+    and their noise-weighted products are accumulated bin by bin
+    up to each of the `times_before_merger` (see `compute_detector_early_warning`),
+    so that the cost is close to the one of `compute_network_errors`
+    instead of growing with the number of times.
+
+    :param network: detector network to use
+    :param parameter_values: dataframe with parameters for one or more signals
+    :param times_before_merger: times before merger (`geocent_time`), in seconds
+    :param fisher_parameters: list of parameters to use for the Fisher matrix analysis - if `None` (default), all waveform parameters are used
+    :param save_matrices: Whether to save the Fisher matrices of the detected signals accumulated until each time, as `early_warning_fisher_matrices_postfix.npy` with shape `(n_above_thr, n_times, n_parameters, n_parameters)`; defaults to `False`
+    :param save_matrices_path: Path where to save the Fisher matrices; defaults to `Path('.')` (the current folder)
+    :param matrix_naming_postfix: string to be appended to the name of the Fisher matrices
+    :param kwargs: further arguments of `compute_network_errors`, such as `waveform_model`, `waveform_class`, `use_duty_cycle`, `n_workers`, `chunk_size` and `checkpoint_path`
+
+    :return:
+    - `detected`: array with shape `(n_above_thr,)` - array of indices for the signals detected with the whole observation.
+    - `network_snr`: array with shape `(n_signals,)` - Network SNR for all signals, with the whole observation.
+    - `early_warning_snr`: array with shape `(n_signals, n_times)` - Network SNR accumulated until each time before merger.
+    - `early_warning_errors`: array with shape `(n_signals, n_times, n_parameters)` - One-sigma Fisher errors at each time, `nan` when no detector is above threshold yet.
+    - `early_warning_sky_localization`: array with shape `(n_signals, n_times)` or `None` - One-sigma sky localization area in steradians at each time, returned if the signals have both right ascension and declination.
+    """
+
+    fisher_parameters = _fisher_parameters(parameter_values, fisher_parameters)
+
+    results = _network_errors(
+        network,
+        parameter_values,
+        fisher_parameters=fisher_parameters,
+        save_matrices=save_matrices,
+        early_warning_times=times_before_merger,
+        **kwargs,
+    )
+
+    if save_matrices:
+        fisher_path, _ = _matrix_paths(save_matrices_path, matrix_naming_postfix)
+        np.save(fisher_path.with_name(f'early_warning_{fisher_path.name}.npy'), results['early_warning_fisher_matrices'])
+
+    return (
+        results['detected'], 
+        results['network_snr'], 
+        results['early_warning_snr'], 
+        results['early_warning_errors'], 
+        results['early_warning_sky_localization'],
+    )
+
+def compute_sweep_errors(
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    sweep_parameters: list[str],
+    fisher_parameters: Optional[list[str]] = None,
+    **kwargs,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Errors on each of the `sweep_parameters` when it is added alone to the Fisher parameters,
+    as in a test of GR with one deviation coefficient at a time (e.g. `delta_phi_0` ... `delta_phi_7`),
+    for the whole sweep in a single pass over the population.
+
+    The Fisher matrix of each signal is computed once, for the Fisher parameters
+    and all the sweep parameters together; the block of the Fisher parameters is factored once, 
+    and each sweep parameter is then added as a bordered row and column 
+    with a rank-one update of its inverse (see `bordered_fisher_errors`).
+
+    Example usage:
+
+    ```
+    >>> from GWFish.modules.detection import Network
+    >>> import GWFish.modules.waveforms as waveforms
+    >>> network = Network(['ET'])
+    >>> parameters = pd.DataFrame({
+    ...    'mass_1': [10.], 'mass_2': [10.], 'luminosity_distance': [1000.], 'theta_jn': [0.],
+    ...    'ra': [0.], 'dec': [0.], 'phase': [0.], 'psi': [0.], 'geocent_time': [1e9],
+    ... })
+    >>> detected, snr, sweep_errors = compute_sweep_errors(
+    ...    network, parameters, ['delta_phi_0', 'delta_phi_2'],
+    ...    ['mass_1', 'mass_2', 'phase', 'geocent_time'],
+    ...    waveform_model='TaylorF2', waveform_class=waveforms.TaylorF2,
+    ... )
+    >>> print(sweep_errors.shape)
+    (1, 2)
+
+    ```
+
+    :param network: detector network to use
+    :param parameter_values: dataframe with parameters for one or more signals
+    :param sweep_parameters: parameters added one at a time; they must not be among the `fisher_parameters`
+    :param fisher_parameters: list of parameters to use for the Fisher matrix analysis - if `None` (default), all waveform parameters are used
+    :param kwargs: further arguments of `compute_network_errors`, such as `waveform_model`, `waveform_class`, `use_duty_cycle`, `n_workers`, `chunk_size` and `checkpoint_path`
+
+    :return:
+    - `detected`: array with shape `(n_above_thr,)` - array of indices for the detected signals.
+    - `network_snr`: array with shape `(n_signals,)` - Network SNR for all signals.
+    - `sweep_errors`: array with shape `(n_signals, len(sweep_parameters))` - One-sigma error on each sweep parameter, marginalized over the Fisher parameters.
+    """
+
+    results = _network_errors(
+        network,
+        parameter_values,
+        fisher_parameters=_fisher_parameters(parameter_values, fisher_parameters),
+        sweep_parameters=sweep_parameters,
+        **kwargs,
+    )
+
+    return results['detected'], results['network_snr'], results['sweep_errors']
+
+def compute_shared_parameter_errors(
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    shared_parameters: list[str],
+    fisher_parameters: Optional[list[str]] = None,
+    shared_fisher: Optional[SharedParameterFisher] = None,
+    **kwargs,
+) -> SharedParameterFisher:
+    """
+    Combine the detected signals of a population into constraints
+    on parameters they all share, such as deviations from general relativity.
+
+    The Fisher matrix of each detected signal is marginalized over its
+    own parameters, and the result is summed over the population
+    as the signals are analyzed, also when they are split among several workers;
+    see `SharedParameterFisher`. The Fisher matrices of the single signals are not kept.
+
+    :param network: detector network to use
+    :param parameter_values: dataframe with parameters for one or more signals
+    :param shared_parameters: parameters shared by all the signals; they must be among the `fisher_parameters`
+    :param fisher_parameters: list of parameters to use for the Fisher matrix analysis - if `None` (default), all waveform parameters are used
+    :param shared_fisher: population Fisher matrix to which the signals are added, e.g. the result of a previous call on another part of the population; if `None` (default), a new one is created
+    :param kwargs: further arguments of `compute_network_errors`, such as `waveform_model`, `waveform_class`, `use_duty_cycle`, `n_workers`, `chunk_size` and `checkpoint_path`
+
+    :return: the population Fisher matrix of the shared parameters, with the errors after each detected signal in its `cumulative_errors`
+    """
+
+    if shared_fisher is None:
+        shared_fisher = SharedParameterFisher(shared_parameters)
+
+    _network_errors(
+        network,
+        parameter_values,
+        fisher_parameters=_fisher_parameters(parameter_values, fisher_parameters),
+        shared_fisher=shared_fisher,
+        **kwargs,
+    )
+
+    return shared_fisher
+
+def output_shared_parameter_errors(
+    shared_fisher: SharedParameterFisher,
+    filename: Union[str, Path],
+    decimal_output_format: str = '%.3E',
+) -> None:
+    """
+    Save the errors on the shared parameters as a function of the number
+    of detected signals to a text file, one row per signal.
+    """
+
+    if isinstance(filename, str):
+        filename = Path(filename)
+
+    header = "n_signals " + " ".join(["err_" + x for x in shared_fisher.shared_parameters])
+    save_data = np.c_[np.arange(1, shared_fisher.n_signals + 1), shared_fisher.cumulative_errors]
+
+    np.savetxt(
+        filename.with_suffix(".txt"),
+        save_data,
+        delimiter=" ",
+        header=header,
+        comments="",
+        fmt="%d " + " ".join([decimal_output_format for _ in shared_fisher.shared_parameters]),
+    )
+
+def errors_file_name(
+    network: det.Network, sub_network_ids: list[int], population_name: str
+) -> str:
+
+    sub_network = "_".join([network.detectors[k].name for k in sub_network_ids])
+
+    return (
+        f"Errors_{sub_network}_{population_name}_SNR{network.detection_SNR[1]:.0f}")
+
+
+def output_to_txt_file(
+    parameter_values: pd.DataFrame,
+    network_snr: np.ndarray,
     parameter_errors: np.ndarray,
     sky_localization: Optional[np.ndarray],
     fisher_parameters: list[str],
     filename: Union[str, Path],
-    decimal_output_format: str = '%.3E'
+    decimal_output_format: str = '%.3E',
+    append: bool = False,
 ) -> None:
 
     if isinstance(filename, str):
@@ -467,6 +2163,12 @@ def output_to_txt_file(
 
     row_format = "%s " + " ".join([decimal_output_format for _ in range(save_data.shape[1] - 1)])
 
+    if append:
+        # the header was written with the first block of rows
+        with open(filename.with_suffix(".txt"), "a") as file:
+            np.savetxt(file, save_data, delimiter=" ", fmt=row_format)
+        return
+
     np.savetxt(
         filename.with_suffix(".txt"),
         save_data,
@@ -476,52 +2178,220 @@ def output_to_txt_file(
         fmt=row_format,
     )
 
+def output_to_hdf5_file(
+    parameter_values: pd.DataFrame,
+    network_snr: np.ndarray,
+    parameter_errors: np.ndarray,
+    sky_localization: Optional[np.ndarray],
+    fisher_parameters: list[str],
+    filename: Union[str, Path],
+    append: bool = False,
+) -> None:
+    """
+    Save the Fisher errors to an HDF5 table, with the same columns as
+    the text output of `output_to_txt_file` but in full precision.
+    The rows keep the index of `parameter_values`.
+
+    :param append: whether to add the rows to the table written by a previous call, instead of overwriting the file
+    """
+
+    if isinstance(filename, str):
+        filename = Path(filename)
+
+    data = pd.DataFrame({'network_SNR': network_snr}, index=parameter_values.index)
+    data = pd.concat([
+        data,
+        parameter_values,
+        pd.DataFrame(parameter_errors, columns=["err_" + x for x in fisher_parameters], index=parameter_values.index),
+    ], axis=1)
+    if sky_localization is not None:
+        data['err_sky_location'] = sky_localization
+
+    storage.append_table(filename.with_suffix(".hdf5"), data, key='errors', append=append)
+
 def analyze_and_save_to_txt(
     network: det.Network,
-    parameter_values: pd.DataFrame,
+    parameter_values: Union[pd.DataFrame, Path, str],
     fisher_parameters: list[str],
     sub_network_ids_list: list[list[int]],
     population_name: str,
     save_path: Optional[Union[Path, str]] = None,
     save_matrices: bool = False,
     decimal_output_format: str = '%.3E',
-    **kwargs
+    checkpoint: bool = False,
+    population_chunk_size: int = storage.POPULATION_CHUNK_SIZE,
+    population_columns: Optional[list[str]] = None,
+    output_format: str = 'txt',
+    matrix_format: str = 'npy',
+    matrix_dtype: Union[str, np.dtype] = np.float64,
+    shared_parameters: Optional[list[str]] = None,
+    sweep_parameters: Optional[list[str]] = None,
+    derivatives_path: Optional[Union[Path, str]] = None,
+    derivatives_dtype: Union[str, np.dtype] = np.complex128,
+    waveform_model: str = wf.DEFAULT_WAVEFORM_MODEL,
+    waveform_class = wf.LALFD_Waveform,
+    use_duty_cycle: bool = False,
+    redefine_tf_vectors: bool = False,
+    long_wavelength: bool = True,
+    n_workers: int = 1,
+    chunk_size: Optional[int] = None,
+    multiband: bool = False,
+    adaptive_grid_tolerance: Optional[float] = None,
+    interpolation_tolerance: Optional[float] = None,
+    relative_binning_width: Optional[float] = None,
+    signal_dtype: Union[str, np.dtype] = np.complex128,
 ) -> None:
+    """
+    Compute the Fisher errors of a population for each of the given sub-networks,
+    and save those of the detected signals to text files (or HDF5 tables).
+    The arguments `waveform_model`, `waveform_class`, `use_duty_cycle`, `redefine_tf_vectors`,
+    `long_wavelength`, `n_workers`, `chunk_size`, `multiband`, `adaptive_grid_tolerance`,
+    `interpolation_tolerance`, `relative_binning_width` and `signal_dtype` are those of `compute_network_errors`.
+
+    :param parameter_values: dataframe with the parameters of the signals, or path to an HDF5 population file; a file is read and analyzed `population_chunk_size` signals at a time (see `storage.read_population_chunks`), appending the results of each block to the output, so that the memory needed does not grow with the size of the population
+    :param checkpoint: whether to save the results chunk by chunk in `save_path / 'checkpoints'` as they are computed, so that an interrupted run can be resumed by calling this function again with the same arguments; defaults to `False`
+    :param population_chunk_size: number of signals read at a time from a population file
+    :param population_columns: columns loaded from a population file, which must include the `fisher_parameters`; if `None` (default), all columns are loaded, since the waveforms read whichever of them they support (spins, tidal deformabilities, ...) and all of them are written to the output. Passing the parameters of the waveform skips the other columns of a catalog (e.g. event names, or host-galaxy properties) on disk, for `table` files
+    :param output_format: `'txt'` (default) for text files with `decimal_output_format` precision, or `'hdf5'` for HDF5 tables in full precision (see `output_to_hdf5_file`), which are faster to write and to read back for large populations
+    :param matrix_format: format of the saved matrices, `'npy'` (default) or `'store'`, see `compute_network_errors`; with `'store'`, the matrices of a population file are written block by block, instead of being gathered in memory
+    :param matrix_dtype: data type of the saved matrices
+    :param shared_parameters: parameters shared by all the signals, such as deviations from general relativity; if given, the population constraints on them as a function of the number of detected signals are saved to `Constraints_*.txt` files, see `compute_shared_parameter_errors`
+    :param sweep_parameters: parameters added one at a time to the `fisher_parameters`, such as the deviations from GR at each PN order; the error on each of them is saved in an additional `err_` column, see `compute_sweep_errors`
+    :param derivatives_path: if given, folder where the projected signals and their derivatives are saved, in one `storage.DerivativeStore` per sub-network (`derivatives_postfix`, named like the matrices), see `compute_network_errors`; the derivatives with respect to the `sweep_parameters` follow those with respect to the `fisher_parameters`. Defaults to `None` (not saved)
+    :param derivatives_dtype: complex data type of the saved derivatives
+    """
     
     if save_path is None:
         save_path = Path().resolve()
     if isinstance(save_path, str):
         save_path = Path(save_path)
+    save_path.mkdir(parents=True, exist_ok=True)
 
-    for sub_network_ids in sub_network_ids_list:
+    if output_format not in ['txt', 'hdf5']:
+        raise ValueError(f"Unknown output format {output_format}, use 'txt' or 'hdf5'")
+    if matrix_format not in ['npy', 'store']:
+        raise ValueError(f"Unknown matrix format {matrix_format}, use 'npy' or 'store'")
 
-        partial_network = network.partial(sub_network_ids)
+    if isinstance(parameter_values, pd.DataFrame):
+        population_chunks = [parameter_values]
+        fisher_parameters = _fisher_parameters(parameter_values, fisher_parameters)
+    else:
+        if population_columns is not None and fisher_parameters is not None:
+            missing = [parameter for parameter in fisher_parameters if parameter not in population_columns]
+            if missing:
+                raise ValueError(f'The Fisher parameters {missing} are not among the population columns')
+        population_chunks = storage.read_population_chunks(parameter_values, population_chunk_size, columns=population_columns)
+        # the Fisher parameters are needed before the first block is analyzed (e.g. for the matrix stores),
+        # so they are taken from the columns of the first block
+        first_chunk = next(population_chunks, None)
+        if first_chunk is not None:
+            fisher_parameters = _fisher_parameters(first_chunk, fisher_parameters)
+            population_chunks = itertools.chain([first_chunk], population_chunks)
+
+    filenames = [
+        errors_file_name(network=network, sub_network_ids=sub_network_ids, population_name=population_name)
+        for sub_network_ids in sub_network_ids_list
+    ]
+    matrices = {filename: ([], []) for filename in filenames}
+
+    if save_matrices and matrix_format == 'store':
+        matrix_stores = {
+            filename: _create_matrix_stores(save_path, '_'.join(filename.split('_')[1:]), fisher_parameters, matrix_dtype)
+            for filename in filenames
+        }
+    else:
+        matrix_stores = {filename: None for filename in filenames}
+
+    if derivatives_path is not None:
+        derivative_stores = {
+            filename: _create_derivative_store(
+                Path(derivatives_path) / f"derivatives_{'_'.join(filename.split('_')[1:])}",
+                network.partial(sub_network_ids),
+                list(fisher_parameters) + list(sweep_parameters or []),
+                derivatives_dtype,
+            )
+            for sub_network_ids, filename in zip(sub_network_ids_list, filenames)
+        }
+    else:
+        derivative_stores = {filename: None for filename in filenames}
 
-        filename = errors_file_name(
-            network=network,
-            sub_network_ids=sub_network_ids,
-            population_name=population_name,
-        )
-        
-        detected, network_snr, errors, sky_localization = compute_network_errors(
-            network=partial_network,
-            parameter_values=parameter_values,
-            fisher_parameters=fisher_parameters,
-            save_matrices=save_matrices,
-            save_matrices_path=save_path,
-            matrix_naming_postfix='_'.join(filename.split('_')[1:]),
-            **kwargs,
-        )
+    shared_fishers = {
+        filename: SharedParameterFisher(shared_parameters) if shared_parameters is not None else None
+        for filename in filenames
+    }
 
-        output_to_txt_file(
-            parameter_values=parameter_values.iloc[detected],
-            network_snr=network_snr[detected],
-            parameter_errors=errors[detected, :],
-            sky_localization=(
-                sky_localization[detected] if sky_localization is not None else None
-            ),
-            fisher_parameters=fisher_parameters,
-            filename=save_path/filename,
-            decimal_output_format=decimal_output_format,
-        )
+    for i_chunk, chunk_values in enumerate(population_chunks):
+
+        for sub_network_ids, filename in zip(sub_network_ids_list, filenames):
+
+            partial_network = network.partial(sub_network_ids)
+
+            results = _network_errors(
+                network=partial_network,
+                parameter_values=chunk_values,
+                fisher_parameters=fisher_parameters,
+                save_matrices=save_matrices,
+                checkpoint_path=save_path / 'checkpoints' if checkpoint else None,
+                matrix_stores=matrix_stores[filename],
+                derivative_store=derivative_stores[filename],
+                shared_fisher=shared_fishers[filename],
+                sweep_parameters=sweep_parameters,
+                waveform_model=waveform_model,
+                waveform_class=waveform_class,
+                use_duty_cycle=use_duty_cycle,
+                redefine_tf_vectors=redefine_tf_vectors,
+                long_wavelength=long_wavelength,
+                n_workers=n_workers,
+                chunk_size=chunk_size,
+                multiband=multiband,
+                adaptive_grid_tolerance=adaptive_grid_tolerance,
+                interpolation_tolerance=interpolation_tolerance,
+                relative_binning_width=relative_binning_width,
+                signal_dtype=signal_dtype,
+            )
+            detected = results['detected']
+
+            parameter_errors = results['parameter_errors']
+            output_parameters = fisher_parameters
+            if sweep_parameters:
+                parameter_errors = np.c_[parameter_errors, results['sweep_errors']]
+                output_parameters = list(fisher_parameters) + list(sweep_parameters)
+
+            if save_matrices and matrix_stores[filename] is None:
+                matrices[filename][0].append(results['fisher_matrices'])
+                matrices[filename][1].append(results['inv_fisher_matrices'])
+
+            output = dict(
+                parameter_values=chunk_values.iloc[detected],
+                network_snr=results['network_snr'][detected],
+                parameter_errors=parameter_errors[detected, :],
+                sky_localization=(
+                    results['sky_localization'][detected] if results['sky_localization'] is not None else None
+                ),
+                fisher_parameters=output_parameters,
+                filename=save_path/filename,
+                append=i_chunk > 0,
+            )
 
+            if output_format == 'hdf5':
+                output_to_hdf5_file(**output)
+            else:
+                output_to_txt_file(**output, decimal_output_format=decimal_output_format)
+
+    if save_matrices and matrix_format == 'npy':
+        for filename, (fisher_matrices, inv_fisher_matrices) in matrices.items():
+            _save_matrices(
+                save_path,
+                '_'.join(filename.split('_')[1:]),
+                np.concatenate(fisher_matrices),
+                np.concatenate(inv_fisher_matrices),
+                matrix_dtype,
+            )
+
+    if shared_parameters is not None:
+        for filename, shared_fisher in shared_fishers.items():
+            output_shared_parameter_errors(
+                shared_fisher,
+                save_path / f"Constraints{filename[len('Errors'):]}",
+                decimal_output_format,
+            )
@@ -0,0 +1,270 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, Union
+
+from astropy.cosmology import Planck18
+import astropy.cosmology as cosmology
+
+import GWFish.modules.auxiliary as aux
+
+def redshift_from_luminosity_distance(
+    luminosity_distance: np.ndarray,
+    cosmology_model: cosmology.Cosmology = Planck18,
+) -> np.ndarray:
+    """
+    Invert the luminosity distance-redshift relation for an array of distances at once,
+    by interpolation on a grid refined with a Newton step.
+
+    Example usage:
+
+    ```
+    >>> z = redshift_from_luminosity_distance(np.array([40., 1e4]))
+    >>> print(f'{z[0]:.5f}, {z[1]:.3f}')
+    0.00897, 1.369
+
+    ```
+
+    :param luminosity_distance: luminosity distances in Mpc
+    :param cosmology_model: (astropy) cosmology model relating the redshift to the luminosity distance
+
+    :return: redshifts
+    """
+
+    luminosity_distance = np.asarray(luminosity_distance, dtype=float)
+
+    redshift_grid = np.logspace(-8, 4, 10_000)
+    distance_grid = cosmology_model.luminosity_distance(redshift_grid).value
+    redshift = np.exp(np.interp(np.log(luminosity_distance), np.log(distance_grid), np.log(redshift_grid)))
+
+    redshift -= (
+        cosmology_model.luminosity_distance(redshift).value - luminosity_distance
+    ) / luminosity_distance_derivative(redshift, cosmology_model)
+
+    return redshift
+
+def luminosity_distance_derivative(
+    redshift: np.ndarray,
+    cosmology_model: cosmology.Cosmology = Planck18,
+) -> np.ndarray:
+    """
+    Derivative of the luminosity distance with respect to the redshift, in Mpc,
+    $d d_L / dz = d_L / (1+z) + (1+z) d_H / E(z)$ for a flat universe.
+    """
+
+    if not cosmology_model.is_flat:
+        raise ValueError('Only flat cosmologies are supported')
+
+    redshift = np.asarray(redshift, dtype=float)
+    return (
+        cosmology_model.luminosity_distance(redshift).value / (1 + redshift)
+        + (1 + redshift) * cosmology_model.hubble_distance.value / cosmology_model.efunc(redshift)
+    )
+
+# Each transformation takes the values of the parameters and returns
+# - the parameters it replaces,
+# - the new parameters, in the same order,
+# - their values,
+# - the partial derivatives of the new parameters with respect to the old ones
+#   (including ones which are not replaced, such as the masses for the effective spin).
+
+def _chirp_mass_mass_ratio(values, cosmology_model, suffix=''):
+    m1, m2 = values[f'mass_1{suffix}'], values[f'mass_2{suffix}']
+    total_mass = m1 + m2
+    chirp_mass = (m1 * m2)**(3/5) / total_mass**(1/5)
+    mass_ratio = m2 / m1
+
+    derivatives = {
+        (f'chirp_mass{suffix}', f'mass_1{suffix}'): chirp_mass * (3 / (5 * m1) - 1 / (5 * total_mass)),
+        (f'chirp_mass{suffix}', f'mass_2{suffix}'): chirp_mass * (3 / (5 * m2) - 1 / (5 * total_mass)),
+        ('mass_ratio', f'mass_1{suffix}'): - m2 / m1**2,
+        ('mass_ratio', f'mass_2{suffix}'): 1 / m1,
+    }
+    return (
+        [f'mass_1{suffix}', f'mass_2{suffix}'],
+        [f'chirp_mass{suffix}', 'mass_ratio'],
+        [chirp_mass, mass_ratio],
+        derivatives,
+    )
+
+def _source_chirp_mass_mass_ratio(values, cosmology_model):
+    return _chirp_mass_mass_ratio(values, cosmology_model, suffix='_source')
+
+def _source_frame(values, cosmology_model):
+    m1, m2, distance = values['mass_1'], values['mass_2'], values['luminosity_distance']
+    redshift = redshift_from_luminosity_distance(distance, cosmology_model)
+    redshift_derivative = 1 / luminosity_distance_derivative(redshift, cosmology_model)
+
+    derivatives = {
+        ('mass_1_source', 'mass_1'): 1 / (1 + redshift),
+        ('mass_1_source', 'luminosity_distance'): - m1 / (1 + redshift)**2 * redshift_derivative,
+        ('mass_2_source', 'mass_2'): 1 / (1 + redshift),
+        ('mass_2_source', 'luminosity_distance'): - m2 / (1 + redshift)**2 * redshift_derivative,
+        ('redshift', 'luminosity_distance'): redshift_derivative,
+    }
+    return (
+        ['mass_1', 'mass_2', 'luminosity_distance'],
+        ['mass_1_source', 'mass_2_source', 'redshift'],
+        [m1 / (1 + redshift), m2 / (1 + redshift), redshift],
+        derivatives,
+    )
+
+def _aligned_spins(values, cosmology_model):
+    m1, m2, a1, a2 = values['mass_1'], values['mass_2'], values['a_1'], values['a_2']
+    total_mass = m1 + m2
+    chi_eff = (m1 * a1 + m2 * a2) / total_mass
+
+    derivatives = {
+        ('chi_eff', 'a_1'): m1 / total_mass,
+        ('chi_eff', 'a_2'): m2 / total_mass,
+        ('chi_eff', 'mass_1'): (a1 - chi_eff) / total_mass,
+        ('chi_eff', 'mass_2'): (a2 - chi_eff) / total_mass,
+        ('chi_a', 'a_1'): np.full_like(a1, 0.5),
+        ('chi_a', 'a_2'): np.full_like(a2, -0.5),
+    }
+    return (
+        ['a_1', 'a_2'],
+        ['chi_eff', 'chi_a'],
+        [chi_eff, (a1 - a2) / 2],
+        derivatives,
+    )
+
+TRANSFORMATIONS: dict[str, Callable] = {
+    'chirp_mass_mass_ratio': _chirp_mass_mass_ratio,
+    'source_chirp_mass_mass_ratio': _source_chirp_mass_mass_ratio,
+    'source_frame': _source_frame,
+    'aligned_spins': _aligned_spins,
+}
+
+def reparameterization_jacobian(
+    parameter_names: list[str],
+    parameter_values: Union[pd.DataFrame, dict[str, np.ndarray]],
+    transformations: list[str],
+    cosmology_model: cosmology.Cosmology = Planck18,
+) -> tuple[np.ndarray, list[str]]:
+    """
+    Jacobian $K_{ij} = \\partial \\phi_i / \\partial \\theta_j$ of a change of parameters
+    from the basis $\\theta$ of the Fisher matrices to a new basis $\\phi$,
+    for each signal, composing the given transformations in order:
+
+    - `'chirp_mass_mass_ratio'`: (`mass_1`, `mass_2`) to (`chirp_mass`, `mass_ratio`);
+    - `'source_frame'`: (`mass_1`, `mass_2`, `luminosity_distance`) to (`mass_1_source`, `mass_2_source`, `redshift`), through the given cosmology;
+    - `'source_chirp_mass_mass_ratio'`: (`mass_1_source`, `mass_2_source`) to (`chirp_mass_source`, `mass_ratio`), to be applied after `'source_frame'`;
+    - `'aligned_spins'`: (`a_1`, `a_2`) to (`chi_eff`, `chi_a`) for aligned spins, with $\\chi_{\\rm eff} = (m_1 a_1 + m_2 a_2) / (m_1 + m_2)$ and $\\chi_a = (a_1 - a_2) / 2$; since $\\chi_{\\rm eff}$ depends on the masses, it must be applied before the mass transformations.
+
+    The other parameters are left unchanged.
+
+    :param parameter_names: parameters of the Fisher matrices, in order
+    :param parameter_values: values of the parameters of each signal, in any of the mass parameterizations accepted by GWFish
+    :param transformations: names of the transformations to apply, among the keys of `TRANSFORMATIONS`
+    :param cosmology_model: (astropy) cosmology model relating the redshift to the luminosity distance
+
+    :return:
+    - `jacobian`: array with shape `(n_signals, n_params, n_params)`
+    - `new_parameter_names`: names of the parameters in the new basis
+    """
+
+    values = {}
+    for key, value in dict(parameter_values).items():
+        try:
+            values[key] = np.atleast_1d(np.asarray(value, dtype=float))
+        except (TypeError, ValueError):
+            # non-numerical columns, such as event names
+            continue
+    aux.check_and_convert_to_mass_1_mass_2(values)
+
+    names = list(parameter_names)
+    n_signals = len(next(iter(values.values())))
+    jacobian = np.broadcast_to(np.eye(len(names)), (n_signals, len(names), len(names))).copy()
+
+    for transformation in transformations:
+        if transformation not in TRANSFORMATIONS:
+            raise ValueError(f'Unknown transformation {transformation}, choose among {list(TRANSFORMATIONS)}')
+
+        if transformation == 'aligned_spins':
+            converted_masses = {'chirp_mass', 'mass_ratio', 'mass_1_source', 'mass_2_source'} & set(names)
+            if converted_masses:
+                raise ValueError('The aligned_spins transformation must be applied before the mass transformations')
+
+        old_names, new_names, new_values, derivatives = TRANSFORMATIONS[transformation](values, cosmology_model)
+
+        missing = [name for name in old_names if name not in names]
+        if missing:
+            raise ValueError(f'The {transformation} transformation requires the parameters {missing}')
+
+        step = np.broadcast_to(np.eye(len(names)), (n_signals, len(names), len(names))).copy()
+        for old_name, new_name in zip(old_names, new_names):
+            i_new = names.index(old_name)
+            step[:, i_new, i_new] = 0.
+            for (derived_name, name), derivative in derivatives.items():
+                if derived_name == new_name and name in names:
+                    step[:, i_new, names.index(name)] = derivative
+
+        jacobian = step @ jacobian
+
+        for old_name, new_name, new_value in zip(old_names, new_names, new_values):
+            names[names.index(old_name)] = new_name
+            values[new_name] = new_value
+
+    return jacobian, names
+
+def reparameterize_fisher(
+    fisher_matrices: np.ndarray,
+    parameter_names: list[str],
+    parameter_values: Union[pd.DataFrame, dict[str, np.ndarray]],
+    transformations: list[str],
+    cosmology_model: cosmology.Cosmology = Planck18,
+) -> tuple[np.ndarray, list[str]]:
+    """
+    Express a stack of Fisher matrices in a new basis of parameters,
+    $F_\\phi = K^{-T} F_\\theta K^{-1}$, without recomputing any waveform;
+    see `reparameterization_jacobian` for the available transformations.
+
+    Example usage:
+
+    ```
+    >>> values = {'mass_1': np.array([30.]), 'mass_2': np.array([20.])}
+    >>> fisher = np.array([np.diag([1., 4.])])
+    >>> new_fisher, new_names = reparameterize_fisher(fisher, ['mass_1', 'mass_2'], values, ['chirp_mass_mass_ratio'])
+    >>> print(new_names)
+    ['chirp_mass', 'mass_ratio']
+
+    ```
+
+    :param fisher_matrices: array with shape `(n_signals, n_params, n_params)`
+    :param parameter_names: parameters of the Fisher matrices, in order
+    :param parameter_values: values of the parameters for each signal (the rows of the population corresponding to the matrices)
+    :param transformations: names of the transformations to apply, in order
+    :param cosmology_model: (astropy) cosmology model relating the redshift to the luminosity distance
+
+    :return: the Fisher matrices in the new basis, and the names of the new parameters
+    """
+
+    jacobian, new_names = reparameterization_jacobian(parameter_names, parameter_values, transformations, cosmology_model)
+    inverse_jacobian = np.linalg.inv(jacobian)
+
+    return np.swapaxes(inverse_jacobian, 1, 2) @ fisher_matrices @ inverse_jacobian, new_names
+
+def reparameterize_covariance(
+    covariances: np.ndarray,
+    parameter_names: list[str],
+    parameter_values: Union[pd.DataFrame, dict[str, np.ndarray]],
+    transformations: list[str],
+    cosmology_model: cosmology.Cosmology = Planck18,
+) -> tuple[np.ndarray, list[str]]:
+    """
+    Express a stack of covariance matrices (inverse Fisher matrices) in a new basis of parameters,
+    $\\Sigma_\\phi = K \\Sigma_\\theta K^T$;
+    see `reparameterization_jacobian` for the available transformations.
+
+    :param covariances: array with shape `(n_signals, n_params, n_params)`
+    :param parameter_names: parameters of the covariance matrices, in order
+    :param parameter_values: values of the parameters for each signal (the rows of the population corresponding to the matrices)
+    :param transformations: names of the transformations to apply, in order
+    :param cosmology_model: (astropy) cosmology model relating the redshift to the luminosity distance
+
+    :return: the covariance matrices in the new basis, and the names of the new parameters
+    """
+
+    jacobian, new_names = reparameterization_jacobian(parameter_names, parameter_values, transformations, cosmology_model)
+
+    return jacobian @ covariances @ np.swapaxes(jacobian, 1, 2), new_names
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Union
+
+import GWFish.modules.detection as det
+import GWFish.modules.fishermatrix as fishermatrix
+import GWFish.modules.storage as storage
+
+def noise_weights(
+    detector: det.Detector,
+    frequencyvector: np.ndarray,
+    min_frequency: Optional[float] = None,
+    max_frequency: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Weights $w_{mk}$ of the noise-weighted inner products on a frequency grid,
+    $(a | b) = \\sum_{m, k} w_{mk} \\, \\mathrm{Re}(a_{mk} b^*_{mk})$, for the components $k$ of a detector:
+    the trapezoid weights of the grid times $4 / S_n(f_m)$, with the PSD of the `detector`.
+
+    Bins outside of `[min_frequency, max_frequency)` get a vanishing weight,
+    which is the same as cutting the signal there: bins at or above `max_frequency`
+    are the ones removed by the `max_frequency_cutoff` parameter of the signals.
+
+    :param detector: detector whose components give the PSDs
+    :param frequencyvector: frequency grid, in Hz
+    :param min_frequency: lowest frequency of the bins kept, if any
+    :param max_frequency: frequency from which bins are removed, if any
+
+    :return: array with shape `(n_frequencies, n_components)`
+    """
+
+    frequencyvector = np.ravel(frequencyvector)
+
+    weights = 4 * fishermatrix._trapezoid_weights(frequencyvector)[:, np.newaxis] / np.stack(
+        [component.Sn(frequencyvector) for component in detector.components], axis=1
+    )
+
+    if min_frequency is not None:
+        weights[frequencyvector < min_frequency] = 0.
+    if max_frequency is not None:
+        weights[frequencyvector >= max_frequency] = 0.
+
+    return weights
+
+def reweighted_network_errors(
+    derivatives: Union[storage.DerivativeStore, Path, str],
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    fisher_parameters: Optional[list[str]] = None,
+    min_frequency: Optional[float] = None,
+    max_frequency: Optional[float] = None,
+    block_size: int = 10_000,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    Recompute network SNRs, Fisher errors and sky localizations from the projected
+    signals and derivatives saved by `compute_network_errors` (with `derivatives_path`),
+    for other detector PSDs or frequency cuts, without computing any waveform.
+
+    The `network` gives the PSDs and the detection thresholds: its detectors take
+    the place of the ones of the saved run, in the same order and with the same
+    number of components, so that they can be, for instance, other variants of
+    the same detectors defined with different `psd_data` files in a configuration file,
+    or detectors whose components have a modified `Sn` function.
+    The frequency grids are the ones of the saved run. The duty cycle is not applied.
+
+    Example usage:
+
+    ```
+    >>> import tempfile
+    >>> from GWFish.modules.detection import Network
+    >>> import GWFish.modules.waveforms as waveforms
+    >>> path = Path(tempfile.mkdtemp()) / 'derivatives'
+    >>> network = Network(['ET'])
+    >>> parameters = pd.DataFrame({
+    ...    'mass_1': [10.], 'mass_2': [10.], 'luminosity_distance': [1000.], 'theta_jn': [0.],
+    ...    'ra': [0.], 'dec': [0.], 'phase': [0.], 'psi': [0.], 'geocent_time': [1e9],
+    ... })
+    >>> _, snr, errors, _ = fishermatrix.compute_network_errors(
+    ...    network, parameters, ['luminosity_distance', 'phase', 'geocent_time'], derivatives_path=path,
+    ...    waveform_model='TaylorF2', waveform_class=waveforms.TaylorF2,
+    ... )
+    >>> _, reweighted_snr, reweighted_errors, _ = reweighted_network_errors(path, network, parameters)
+    >>> print(np.allclose(reweighted_snr, snr), np.allclose(reweighted_errors, errors))
+    True True
+
+    ```
+
+    :param derivatives: a `storage.DerivativeStore`, or its folder
+    :param network: detector network giving the PSDs and the detection thresholds
+    :param parameter_values: parameters of the signals, whose index is the one saved in the store; the results follow its rows, and signals without saved derivatives get a vanishing SNR
+    :param fisher_parameters: parameters of the Fisher matrices, among the saved ones; defaults to all of them
+    :param min_frequency: lowest frequency kept in the inner products, if any
+    :param max_frequency: frequency from which the inner products are cut, if any, as with `max_frequency_cutoff`
+    :param block_size: number of signals processed at a time
+
+    :return:
+    - `detected`: array with shape `(n_above_thr,)` - array of indices for the detected signals.
+    - `network_snr`: array with shape `(n_signals,)` - Network SNR for all signals.
+    - `parameter_errors`: array with shape `(n_signals, n_parameters)` - One-sigma Fisher errors for the parameters.
+    - `sky_localization`: array with shape `(n_signals,)` or `None` - One-sigma sky localization area in steradians, returned if `ra` and `dec` are among the Fisher parameters.
+    """
+
+    if not isinstance(derivatives, storage.DerivativeStore):
+        derivatives = storage.DerivativeStore(derivatives)
+
+    n_components = [len(detector.components) for detector in network.detectors]
+    if n_components != derivatives.n_components:
+        raise ValueError(
+            f'The detectors of the network, {[detector.name for detector in network.detectors]}, '
+            f'do not match the saved ones, {derivatives.detector_names}'
+        )
+
+    if fisher_parameters is None:
+        fisher_parameters = list(derivatives.parameter_names)
+    unknown = [parameter for parameter in fisher_parameters if parameter not in derivatives.parameter_names]
+    if unknown:
+        raise ValueError(f'Parameters {unknown} are not among the saved ones, {derivatives.parameter_names}')
+
+    # rows of the saved arrays: the signal first, then the derivatives
+    rows = [0] + [1 + derivatives.parameter_names.index(parameter) for parameter in fisher_parameters]
+    n_params = len(fisher_parameters)
+
+    weights = [
+        noise_weights(detector, frequencyvector, min_frequency, max_frequency)
+        for detector, frequencyvector in zip(network.detectors, derivatives.frequencyvectors)
+    ]
+
+    records = np.asarray(derivatives.records)
+    offsets = derivatives.offsets
+    data = derivatives.data
+    positions = parameter_values.index.get_indexer(records[:, 0])
+
+    detector_snr_thr, network_snr_thr = network.detection_SNR
+
+    n_signals = len(parameter_values)
+    network_snr = np.zeros(n_signals)
+    parameter_errors = np.zeros((n_signals, n_params))
+
+    signals_havesky = ('ra' in fisher_parameters) and ('dec' in fisher_parameters)
+    sky_localization = np.zeros(n_signals) if signals_havesky else None
+
+    for start in range(0, n_signals, block_size):
+        block = slice(start, min(start + block_size, n_signals))
+        block_fisher = np.zeros((block.stop - block.start, n_params, n_params))
+        block_snr_square = np.zeros(block.stop - block.start)
+
+        for i_record in np.nonzero((positions >= block.start) & (positions < block.stop))[0]:
+            _, i_detector, first_bin, n_bins = records[i_record]
+            saved = np.asarray(data[offsets[i_record]:offsets[i_record + 1]]).reshape(
+                len(derivatives.parameter_names) + 1, n_bins, n_components[i_detector]
+            )[rows].astype(np.complex128)
+            record_weights = weights[i_detector][first_bin:first_bin + n_bins]
+
+            detector_snr_square = np.sum(np.abs(saved[0]) ** 2 * record_weights)
+            block_snr_square[positions[i_record] - block.start] += detector_snr_square
+
+            if np.sqrt(detector_snr_square) > detector_snr_thr:
+                for k in range(n_components[i_detector]):
+                    weighted = saved[1:, :, k] * record_weights[:, k]
+                    block_fisher[positions[i_record] - block.start] += np.real(weighted @ np.conjugate(saved[1:, :, k]).T)
+
+        network_snr[block] = np.sqrt(block_snr_square)
+
+        block_inverse, _, _ = fishermatrix.invert_fisher_matrices(block_fisher)
+        parameter_errors[block] = np.sqrt(np.einsum('...ii->...i', block_inverse))
+
+        if signals_havesky:
+            sky_localization[block] = fishermatrix.sky_localization_area(
+                block_inverse, parameter_values['dec'].iloc[block].to_numpy(),
+                fisher_parameters.index('ra'), fisher_parameters.index('dec'),
+            )
+
+    detected, = np.where(network_snr > network_snr_thr)
+
+    return detected, network_snr, parameter_errors, sky_localization
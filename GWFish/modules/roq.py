@@ -0,0 +1,375 @@
+import json
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Union
+
+import GWFish.modules.detection as det
+import GWFish.modules.fishermatrix as fishermatrix
+import GWFish.modules.waveforms as wf
+
+# parameters which only enter the projection, or scale the waveform:
+# the reduced basis is not trained on the derivatives with respect to them
+PROJECTION_PARAMETERS = ['ra', 'dec', 'psi', 'geocent_time', 'luminosity_distance']
+
+class ReducedOrderQuadrature:
+    """
+    Reduced-order quadrature of the noise-weighted inner products of a detector,
+    for the signals of a waveform model within a range of parameters.
+
+    The projected signals and their derivatives, up to the factor $e^{i \\Phi_k(f)}$
+    of the arrival time at each component (see `reference_phases`), are interpolated
+    from their values at a few frequencies of the grid (the nodes of the empirical interpolation
+    of a reduced basis), so that their inner products are
+    $(a | b) = \\mathrm{Re} \\sum_k a_k^T G_k b_k^*$, with the Gram matrices $G_k$
+    of the interpolants of each component.
+    They are built by `build_reduced_order_quadrature`, and used by `roq_detector_fisher`.
+    """
+
+    def __init__(
+        self,
+        detector_name: str,
+        waveform_model: str,
+        frequencyvector: np.ndarray,
+        nodes: np.ndarray,
+        gram_matrices: np.ndarray,
+    ):
+        """
+        :param detector_name: name of the detector
+        :param waveform_model: waveform model of the training signals
+        :param frequencyvector: frequency grid of the detector
+        :param nodes: indices of the nodes in the frequency grid
+        :param gram_matrices: array with shape `(n_components, n_nodes, n_nodes)`
+        """
+        self.detector_name = detector_name
+        self.waveform_model = waveform_model
+        self.frequencyvector = np.ravel(frequencyvector)
+        self.nodes = np.asarray(nodes)
+        self.gram_matrices = np.asarray(gram_matrices)
+
+    @property
+    def node_frequencies(self) -> np.ndarray:
+        return self.frequencyvector[self.nodes]
+
+    def inner_products(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Inner products of vectors given at the nodes, summed over the detector components.
+
+        :param vectors: array with shape `(n_vectors, n_nodes, n_components)`, without the factors of `reference_phases`
+
+        :return: array with shape `(n_vectors, n_vectors)`
+        """
+        return sum(
+            np.real(vectors[:, :, k] @ gram @ np.conjugate(vectors[:, :, k]).T)
+            for k, gram in enumerate(self.gram_matrices)
+        )
+
+    def save(self, filename: Union[Path, str]) -> None:
+        """Save to an `.npz` file, e.g. next to the PSD files of the detector."""
+        np.savez(
+            filename,
+            metadata=json.dumps({'detector_name': self.detector_name, 'waveform_model': self.waveform_model}),
+            frequencyvector=self.frequencyvector,
+            nodes=self.nodes,
+            gram_matrices=self.gram_matrices,
+        )
+
+    @classmethod
+    def load(cls, filename: Union[Path, str]) -> 'ReducedOrderQuadrature':
+        with np.load(filename) as data:
+            metadata = json.loads(str(data['metadata']))
+            return cls(
+                metadata['detector_name'], metadata['waveform_model'],
+                data['frequencyvector'], data['nodes'], data['gram_matrices'],
+            )
+
+class _FrozenTimeWaveforms:
+    """
+    Stand-in for a waveform class whose time-frequency relation is the constant `time`,
+    so that the projection uses the antenna patterns and delays at that time.
+    """
+
+    def __init__(self, waveform_class, time: float):
+        self.waveform_class = waveform_class
+        self.time = time
+
+    def __call__(self, name, gw_params, data_params):
+        return _FrozenTimeWaveform(self.waveform_class(name, gw_params, data_params), self.time)
+
+class _FrozenTimeWaveform:
+
+    def __init__(self, waveform, time):
+        self.waveform = waveform
+        self.time = time
+
+    def update_gw_params(self, new_gw_params):
+        self.waveform.update_gw_params(new_gw_params)
+
+    def __call__(self):
+        return self.waveform()
+
+    @property
+    def t_of_f(self):
+        return np.full(np.shape(self.waveform.frequencyvector), self.time)
+
+    @property
+    def phase_derivatives(self):
+        return self.waveform.phase_derivatives
+
+def reference_phases(detector: det.Detector, ra: float, dec: float, time: float, frequencyvector: np.ndarray) -> np.ndarray:
+    """
+    Factors $e^{-i \\Phi_k(f)}$ of the delays of the detector components at `time`,
+    with shape `(n_frequencies, n_components)`, as applied by the projection.
+    """
+    frequencyvector = np.ravel(frequencyvector)
+    return np.stack([
+        np.exp(-1j * component.ephem.phase_term(ra, dec, np.full_like(frequencyvector, time), frequencyvector))
+        for component in detector.components
+    ], axis=1)
+
+def _check_location(detector: det.Detector) -> None:
+    if detector.location not in ['earth', 'moon']:
+        raise ValueError(f'The reduced-order quadrature is only available for detectors on the Earth or the Moon, not for {detector.name}')
+
+def _empirical_interpolation_nodes(basis: np.ndarray) -> np.ndarray:
+    """Nodes of the empirical interpolation of an orthonormal basis, chosen greedily (DEIM)."""
+    nodes = [np.argmax(np.abs(basis[:, 0]))]
+    for j in range(1, basis.shape[1]):
+        coefficients = np.linalg.solve(basis[nodes, :j], basis[nodes, j])
+        residual = basis[:, j] - basis[:, :j] @ coefficients
+        nodes.append(np.argmax(np.abs(residual)))
+    return np.sort(nodes)
+
+def build_reduced_order_quadrature(
+    detector: det.Detector,
+    training_parameters: pd.DataFrame,
+    waveform_model: str = wf.DEFAULT_WAVEFORM_MODEL,
+    waveform_class = wf.LALFD_Waveform,
+    tolerance: float = 1e-3,
+    eps: float = 1e-5,
+) -> ReducedOrderQuadrature:
+    """
+    Build the reduced-order quadrature of a detector for the signals of a waveform model,
+    from training signals spanning the range of parameters of the signals to be analyzed.
+    This is done once per detector, frequency grid, waveform model and range of parameters:
+    the result can be saved (see `ReducedOrderQuadrature.save`) and used for any number of signals.
+
+    The reduced basis is built from the polarizations of the training signals at `geocent_time` zero,
+    the polarizations times the frequency (which span the derivatives with respect to the arrival time
+    and the sky position) and the numerical derivatives of the polarizations with respect to the parameters
+    which enter the waveform (all columns of `training_parameters` except `PROJECTION_PARAMETERS`),
+    all whitened by the mean PSD of the components: each of them is added to the basis, in turn,
+    if the relative norm of its residual on the basis is above `tolerance`.
+    The nodes are then chosen by the discrete empirical interpolation method.
+    The training waveforms only need to span the waveform parameters, so they can be drawn
+    uniformly within their range, with any extrinsic parameters. The more waveform
+    parameters and the wider their range, the more nodes; for instance, binary black holes
+    of a few tens of solar masses need about fifty nodes in `CE1`, and about two hundred in `ET`,
+    whose grid starts at lower frequency. Their interpolation errors should be checked
+    on other signals, e.g. against `fishermatrix.compute_detector_fisher`.
+
+    :param detector: detector, whose frequency grid and PSDs are used
+    :param training_parameters: parameters of the training signals
+    :param waveform_model: waveform model to use
+    :param waveform_class: waveform class to use
+    :param tolerance: relative norm of the residuals of the training waveforms on the reduced basis
+    :param eps: relative step of the numerical derivatives, as in `fishermatrix.Derivative`
+
+    :return: the reduced-order quadrature
+    """
+
+    _check_location(detector)
+
+    frequencyvector = detector.frequencyvector[:, 0]
+    data_params = {'frequencyvector': detector.frequencyvector, 'f_ref': 50.}
+    trapezoid_weights = fishermatrix._trapezoid_weights(frequencyvector)
+    component_weights = 4 * trapezoid_weights[:, np.newaxis] / np.stack(
+        [component.Sn(frequencyvector) for component in detector.components], axis=1
+    )
+    whitening = np.sqrt(np.mean(component_weights, axis=1))
+
+    waveform_parameters = [parameter for parameter in training_parameters.columns if parameter not in PROJECTION_PARAMETERS]
+
+    def polarizations(parameters):
+        return waveform_class(waveform_model, {**parameters, 'geocent_time': 0.}, data_params)()
+
+    basis = np.zeros((len(frequencyvector), 0), dtype=complex)
+
+    def add_to_basis(vector):
+        nonlocal basis
+        vector = vector * whitening
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        residual = vector / norm
+        # Gram-Schmidt, repeated once to keep the basis orthonormal
+        for _ in range(2):
+            residual = residual - basis @ (np.conjugate(basis).T @ residual)
+        residual_norm = np.linalg.norm(residual)
+        if residual_norm > tolerance:
+            basis = np.hstack([basis, residual[:, np.newaxis] / residual_norm])
+
+    for i in range(len(training_parameters)):
+        parameters = dict(training_parameters.iloc[i])
+        wave = polarizations(parameters)
+        vectors = [wave, frequencyvector[:, np.newaxis] * wave]
+
+        for parameter in waveform_parameters:
+            step = np.maximum(eps, eps * parameters[parameter])
+            wave_1 = polarizations({**parameters, parameter: parameters[parameter] - step / 2})
+            wave_2 = polarizations({**parameters, parameter: parameters[parameter] + step / 2})
+            vectors.append(wave_2 - wave_1)
+
+        for vector in vectors:
+            for polarization in vector.T:
+                add_to_basis(polarization)
+
+    logging.info(f'Reduced basis of {basis.shape[1]} elements for {detector.name} from {len(training_parameters)} training signals')
+
+    nodes = _empirical_interpolation_nodes(basis)
+
+    # interpolant of the unwhitened vectors from their values at the nodes
+    interpolant = (basis @ np.linalg.inv(basis[nodes])) * whitening[nodes] / whitening[:, np.newaxis]
+    gram_matrices = np.stack([
+        interpolant.T @ (component_weights[:, [k]] * np.conjugate(interpolant))
+        for k in range(len(detector.components))
+    ])
+
+    return ReducedOrderQuadrature(detector.name, waveform_model, frequencyvector, nodes, gram_matrices)
+
+def roq_detector_fisher(
+    roq: ReducedOrderQuadrature,
+    detector: det.Detector,
+    signal_parameter_values: Union[pd.Series, dict[str, float]],
+    fisher_parameters: list[str],
+    waveform_class = wf.LALFD_Waveform,
+) -> tuple[np.ndarray, float]:
+    """
+    Fisher matrix and square of the SNR of a signal in a detector, from the waveforms
+    at the nodes of a reduced-order quadrature only (see `build_reduced_order_quadrature`).
+
+    As in the reduced-order-quadrature likelihoods used in parameter estimation,
+    the antenna patterns and the delays of the detector are the ones at `geocent_time`,
+    i.e. the rotation of the Earth while the signal is in band is neglected:
+    this is accurate for signals lasting up to a few minutes, such as binary black holes
+    in ground-based detectors, but not for binary neutron stars observed from a few Hz
+    (binary black holes of a few tens of solar masses get relative differences of the Fisher matrix
+    elements of about $10^{-3}$ in `CE1`, and up to $10^{-2}$ in `ET`, from 2 Hz).
+    The derivatives are computed as in `fishermatrix.Derivative`.
+
+    Example usage:
+
+    ```
+    >>> from GWFish.modules.detection import Detector
+    >>> detector = Detector('CE1')
+    >>> rng = np.random.default_rng(1)
+    >>> training = pd.DataFrame({
+    ...    'mass_1': rng.uniform(29., 31., 20), 'mass_2': rng.uniform(24., 26., 20), 'luminosity_distance': 1000.,
+    ...    'theta_jn': 0., 'ra': 0., 'dec': 0., 'psi': 0., 'phase': 0., 'geocent_time': 0.,
+    ... })
+    >>> roq = build_reduced_order_quadrature(detector, training, 'IMRPhenomD')
+    >>> print(len(roq.nodes) < 100)
+    True
+    >>> params = dict(training.iloc[0], ra=1., dec=0.5, geocent_time=1e9)
+    >>> fisher, snr_square = roq_detector_fisher(roq, detector, params, ['mass_1', 'luminosity_distance'])
+    >>> exact_fisher, exact_snr_square = fishermatrix.compute_detector_fisher(detector, params, ['mass_1', 'luminosity_distance'], 'IMRPhenomD')
+    >>> print(np.allclose(snr_square, exact_snr_square, rtol=1e-3), np.allclose(fisher, exact_fisher, rtol=1e-3))
+    True True
+
+    ```
+
+    :param roq: reduced-order quadrature of the detector
+    :param detector: detector, with the same frequency grid as the one of `roq`
+    :param signal_parameter_values: parameters of the signal
+    :param fisher_parameters: parameters of the Fisher matrix
+    :param waveform_class: waveform class to use, with the waveform model of `roq`
+
+    :return: the Fisher matrix, and the square of the SNR
+    """
+
+    _check_location(detector)
+    if not np.array_equal(detector.frequencyvector[:, 0], roq.frequencyvector):
+        raise ValueError(f'The frequency grid of {detector.name} is not the one of the reduced-order quadrature')
+
+    parameters = dict(signal_parameter_values)
+    time = parameters['geocent_time']
+    node_frequencies = roq.node_frequencies
+    node_detector = fishermatrix._detector_on_grid(detector, node_frequencies)
+
+    # the waveforms are computed at geocent_time zero, so that the phase 2 pi f tc does not need
+    # to be removed from them, and the projection is done at the arrival time
+    fisher_matrix = fishermatrix.FisherMatrix(
+        roq.waveform_model, {**parameters, 'geocent_time': 0.}, fisher_parameters, node_detector,
+        waveform_class=_FrozenTimeWaveforms(waveform_class, time),
+    )
+    vectors = np.stack(
+        [fisher_matrix.derivative.projection_at_parameters]
+        + [fisher_matrix.derivative_of(parameter) for parameter in fisher_parameters]
+    ) / reference_phases(detector, parameters['ra'], parameters['dec'], time, node_frequencies)
+
+    products = roq.inner_products(vectors)
+    return products[1:, 1:], products[0, 0]
+
+def roq_network_errors(
+    roqs: list[ReducedOrderQuadrature],
+    network: det.Network,
+    parameter_values: pd.DataFrame,
+    fisher_parameters: Optional[list[str]] = None,
+    waveform_class = wf.LALFD_Waveform,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    Network SNRs, Fisher errors and sky localizations computed with the
+    reduced-order quadratures of the detectors of a network (see `roq_detector_fisher`).
+
+    :param roqs: reduced-order quadratures of the detectors of the network, in the same order
+    :param network: detector network
+    :param parameter_values: parameters of the signals
+    :param fisher_parameters: parameters of the Fisher matrices; if `None`, all the columns of `parameter_values`
+    :param waveform_class: waveform class to use, with the waveform model of the quadratures
+
+    :return:
+    - `detected`: array with shape `(n_above_thr,)` - array of indices for the detected signals.
+    - `network_snr`: array with shape `(n_signals,)` - Network SNR for all signals.
+    - `parameter_errors`: array with shape `(n_signals, n_parameters)` - One-sigma Fisher errors for the parameters.
+    - `sky_localization`: array with shape `(n_signals,)` or `None` - One-sigma sky localization area in steradians, returned if `ra` and `dec` are among the Fisher parameters.
+    """
+
+    if len(roqs) != len(network.detectors):
+        raise ValueError(f'{len(roqs)} reduced-order quadratures were given for {len(network.detectors)} detectors')
+
+    if fisher_parameters is None:
+        fisher_parameters = list(parameter_values.columns)
+    n_params = len(fisher_parameters)
+    n_signals = len(parameter_values)
+
+    detector_snr_thr, network_snr_thr = network.detection_SNR
+
+    network_snr = np.zeros(n_signals)
+    fisher_matrices = np.zeros((n_signals, n_params, n_params))
+
+    for i in range(n_signals):
+        signal_parameter_values = parameter_values.iloc[i]
+        for roq, detector in zip(roqs, network.detectors):
+            detector_fisher, detector_snr_square = roq_detector_fisher(
+                roq, detector, signal_parameter_values, fisher_parameters, waveform_class
+            )
+            network_snr[i] += detector_snr_square
+            if np.sqrt(detector_snr_square) > detector_snr_thr:
+                fisher_matrices[i] += detector_fisher
+
+    network_snr = np.sqrt(network_snr)
+
+    inverses, _, _ = fishermatrix.invert_fisher_matrices(fisher_matrices)
+    parameter_errors = np.sqrt(np.einsum('...ii->...i', inverses))
+
+    if ('ra' in fisher_parameters) and ('dec' in fisher_parameters):
+        sky_localization = fishermatrix.sky_localization_area(
+            inverses, parameter_values['dec'].to_numpy(), fisher_parameters.index('ra'), fisher_parameters.index('dec'),
+        )
+    else:
+        sky_localization = None
+
+    detected, = np.where(network_snr > network_snr_thr)
+
+    return detected, network_snr, parameter_errors, sky_localization
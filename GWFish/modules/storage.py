@@ -0,0 +1,532 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# default number of signals per checkpointed chunk: it does not depend on the
+# number of workers, so that a run can be resumed with a different one
+CHECKPOINT_CHUNK_SIZE = 100
+
+# default number of signals read at a time from a population file
+POPULATION_CHUNK_SIZE = 10_000
+
+def population_fingerprint(
+    parameter_values: pd.DataFrame,
+    detector_names: list[str],
+    detection_SNR: tuple[float, float],
+    **settings,
+) -> str:
+    """
+    Hash identifying a population run: the signal parameters, the network
+    and the analysis settings (fisher parameters, waveform, ...).
+    Runs with the same fingerprint give the same results, so their
+    checkpointed chunks can be reused.
+
+    :param parameter_values: dataframe with the parameters of the signals, and possibly other columns of any type
+    :param detector_names: names of the detectors in the network
+    :param detection_SNR: detection thresholds of the network
+    :param settings: any further setting affecting the results; values are hashed through their `repr`
+
+    :return: hexadecimal digest
+    """
+
+    digest = hashlib.sha1()
+    digest.update(repr(list(parameter_values.columns)).encode())
+    # row hashes of any column type, since catalogs can have non-numeric columns such as event names
+    digest.update(pd.util.hash_pandas_object(parameter_values, index=True).to_numpy().tobytes())
+    digest.update(repr(list(detector_names)).encode())
+    digest.update(repr(tuple(float(thr) for thr in detection_SNR)).encode())
+    for key in sorted(settings):
+        digest.update(f'{key}={settings[key]!r}'.encode())
+
+    return digest.hexdigest()
+
+class PopulationCheckpoint:
+    """
+    On-disk store of the per-chunk results of a population run.
+
+    Each completed chunk of signals is written to its own `.npz` file
+    in `path / fingerprint`, so that an interrupted run can be restarted
+    and only the chunks which are missing get computed again.
+    Runs with different inputs have different fingerprints, and therefore
+    never share chunks.
+    """
+
+    def __init__(self, path: Union[Path, str], fingerprint: str):
+        self.path = Path(path) / fingerprint
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def chunk_file(self, chunk: slice) -> Path:
+        return self.path / f'chunk_{chunk.start:010d}_{chunk.stop:010d}.npz'
+
+    def load(self, chunk: slice, require_matrices: bool = False) -> Optional[dict[str, Optional[np.ndarray]]]:
+        """
+        Load the results for a chunk of signals.
+
+        :param chunk: slice of the population
+        :param require_matrices: whether the Fisher matrices are needed; if they were not saved for this chunk, it is considered missing
+
+        :return: dictionary of results, or `None` if the chunk has not been computed yet
+        """
+
+        filename = self.chunk_file(chunk)
+        if not filename.exists():
+            return None
+
+        with np.load(filename) as data:
+            result = {key: data[key] for key in data.files}
+
+        if require_matrices and 'fisher_matrices' not in result:
+            return None
+
+        for key in ['sky_localization', 'fisher_matrices', 'inv_fisher_matrices', 'shared_fisher_matrices', 'sweep_errors', 'parameter_biases',
+                    'early_warning_snr', 'early_warning_errors', 'early_warning_sky_localization', 'early_warning_fisher_matrices',
+                    'derivative_data', 'derivative_records']:
+            result.setdefault(key, None)
+
+        return result
+
+    def save(self, chunk: slice, result: dict[str, Optional[np.ndarray]]) -> None:
+        """
+        Save the results for a chunk of signals; entries which are `None` are skipped.
+        The file is written under a temporary name and then renamed,
+        so that a run killed while writing does not leave a corrupted chunk.
+        """
+
+        filename = self.chunk_file(chunk)
+        temporary = filename.with_suffix('.tmp.npz')
+        np.savez(temporary, **{key: value for key, value in result.items() if value is not None})
+        os.replace(temporary, filename)
+
+    def duty_cycle_draws(self, draws: np.ndarray) -> np.ndarray:
+        """
+        Return the duty-cycle random numbers of the first run, if any,
+        otherwise store `draws` for the following ones: this way
+        resumed chunks use the same draws as the ones already computed.
+        """
+
+        filename = self.path / 'duty_cycle_draws.npy'
+        if filename.exists():
+            logging.info('Using the duty-cycle draws stored in %s', filename)
+            return np.load(filename)
+
+        np.save(filename, draws)
+        return draws
+
+def _population_key(store: pd.HDFStore, key: Optional[str]) -> str:
+    if key is not None:
+        return key
+    keys = store.keys()
+    if len(keys) != 1:
+        raise ValueError(f'The population file contains {len(keys)} datasets ({keys}), please specify the key')
+    return keys[0]
+
+def _population_rows(storer) -> int:
+    if storer.is_table:
+        return storer.nrows
+    # fixed frames store the index as `axis1`
+    return storer.group.axis1.shape[0]
+
+def population_length(filename: Union[Path, str], key: Optional[str] = None) -> int:
+    """
+    Number of signals in a population file, read without loading the data.
+
+    :param filename: HDF5 file written by pandas, in either the `fixed` or `table` format
+    :param key: dataset in the file; can be omitted if the file contains only one
+
+    :return: number of rows
+    """
+
+    with pd.HDFStore(filename, mode='r') as store:
+        return _population_rows(store.get_storer(_population_key(store, key)))
+
+def read_population_chunks(
+    filename: Union[Path, str],
+    chunk_size: int = POPULATION_CHUNK_SIZE,
+    columns: Optional[list[str]] = None,
+    key: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Iterate over a population file in blocks of rows, so that the memory
+    needed is set by the chunk size and not by the size of the population.
+
+    Both of the HDF5 formats written by pandas are supported:
+    `table` files are read one block at a time, selecting the columns on disk;
+    `fixed` files (like the ones in `injections/`) are sliced by row on disk,
+    and the columns are selected after reading each block.
+
+    Example usage:
+
+    ```
+    >>> for chunk in read_population_chunks('injections/BBH_pop_test.hdf5', chunk_size=40, columns=['mass_1', 'mass_2']):
+    ...     print(chunk.shape)
+    (40, 2)
+    (40, 2)
+    (20, 2)
+
+    ```
+
+    :param filename: HDF5 file written by pandas
+    :param chunk_size: number of rows per block
+    :param columns: columns to load; if `None` (default), all columns are loaded
+    :param key: dataset in the file; can be omitted if the file contains only one
+
+    :return: iterator over dataframes with up to `chunk_size` rows, keeping the index of the file
+    """
+
+    with pd.HDFStore(filename, mode='r') as store:
+        key = _population_key(store, key)
+        storer = store.get_storer(key)
+        n_rows = _population_rows(storer)
+
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+            if storer.is_table:
+                yield store.select(key, start=start, stop=stop, columns=columns)
+            else:
+                chunk = store.select(key, start=start, stop=stop)
+                yield chunk if columns is None else chunk[columns]
+
+# width reserved for string columns (e.g. event names) in HDF5 tables,
+# which cannot grow after the first block of rows has been written
+STRING_COLUMN_SIZE = 64
+
+def append_table(
+    filename: Union[Path, str],
+    data: pd.DataFrame,
+    key: str = 'results',
+    append: bool = True,
+) -> None:
+    """
+    Write a block of rows to a table in an HDF5 file, in full precision.
+    The table is stored by pandas in the `table` format, so that it can be 
+    extended block by block, and read back lazily with `read_population_chunks`
+    (or `pd.read_hdf` with the `start`, `stop` and `columns` arguments).
+
+    :param filename: HDF5 file
+    :param data: rows to write
+    :param key: name of the table in the file
+    :param append: whether to add the rows to an existing table; if `False`, the file is overwritten
+    """
+
+    min_itemsize = {
+        column: STRING_COLUMN_SIZE for column in data.columns if data[column].dtype == object
+    }
+
+    with pd.HDFStore(filename, mode='a' if append else 'w') as store:
+        store.append(key, data, format='table', index=False, min_itemsize=min_itemsize or None)
+
+class MatrixStore:
+    """
+    Append-only on-disk store of symmetric matrices, one per event,
+    such as the Fisher matrices of the detected signals and their inverses.
+
+    A store is a folder containing
+    
+    - `metadata.json`: parameter names, data type and layout;
+    - `matrices.bin`: the matrices, one after the other, either in full or
+    as their packed upper triangle (row by row);
+    - `index.bin`: the index (in the population) of the event each matrix belongs to, as 64-bit integers.
+
+    Matrices are added block by block with `append`, so that they never need
+    to be all in memory; they are read back through memory maps,
+    which are only opened when accessed.
+
+    Example usage:
+
+    ```
+    >>> import tempfile
+    >>> path = Path(tempfile.mkdtemp()) / 'fisher_matrices'
+    >>> store = MatrixStore.create(path, ['mass_1', 'mass_2'], dtype='float32')
+    >>> store.append(np.array([[[1., 2.], [2., 5.]]]), index=[12])
+    >>> store = MatrixStore(path)
+    >>> print(len(store), store.index[0], store.data.shape)
+    1 12 (1, 3)
+    >>> print(store[0])
+    [[1. 2.]
+     [2. 5.]]
+
+    ```
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        """
+        Open an existing store.
+
+        :param path: folder of the store
+        """
+
+        self.path = Path(path)
+        with open(self.path / 'metadata.json') as file:
+            metadata = json.load(file)
+        self.parameter_names = metadata['parameter_names']
+        self.packed = metadata['packed']
+        self.dtype = np.dtype(metadata['dtype'])
+
+        n_params = len(self.parameter_names)
+        self._upper = np.triu_indices(n_params)
+        self.entries_per_matrix = len(self._upper[0]) if self.packed else n_params**2
+
+    @classmethod
+    def create(
+        cls,
+        path: Union[Path, str],
+        parameter_names: list[str],
+        packed: bool = True,
+        dtype: Union[str, np.dtype] = np.float64,
+    ) -> 'MatrixStore':
+        """
+        Create an empty store, overwriting any store in the same folder.
+
+        :param path: folder of the store
+        :param parameter_names: names of the parameters along the axes of the matrices
+        :param packed: whether to only save the upper triangle of the matrices, almost halving the size of the store; defaults to `True`
+        :param dtype: data type of the saved matrices: `float32` halves the size of the store, at the cost of precision; defaults to `float64`
+
+        :return: the new store
+        """
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / 'metadata.json', 'w') as file:
+            json.dump({
+                'parameter_names': list(parameter_names),
+                'packed': packed,
+                'dtype': np.dtype(dtype).name,
+            }, file)
+        for filename in ['matrices.bin', 'index.bin']:
+            open(path / filename, 'wb').close()
+
+        return cls(path)
+
+    def append(self, matrices: np.ndarray, index: np.ndarray) -> None:
+        """
+        Add matrices at the end of the store.
+
+        :param matrices: array with shape `(n_matrices, n_params, n_params)`
+        :param index: array with shape `(n_matrices,)` - index of the event each matrix belongs to
+        """
+
+        matrices = np.asarray(matrices)
+        if self.packed:
+            data = matrices[:, self._upper[0], self._upper[1]]
+        else:
+            data = matrices.reshape(len(matrices), -1)
+
+        with open(self.path / 'matrices.bin', 'ab') as file:
+            data.astype(self.dtype).tofile(file)
+        with open(self.path / 'index.bin', 'ab') as file:
+            np.asarray(index, dtype=np.int64).tofile(file)
+
+    def __len__(self) -> int:
+        # a block whose writing was interrupted is ignored
+        n_matrices = (self.path / 'matrices.bin').stat().st_size // (self.entries_per_matrix * self.dtype.itemsize)
+        n_indices = (self.path / 'index.bin').stat().st_size // np.dtype(np.int64).itemsize
+        return min(n_matrices, n_indices)
+
+    def _memmap(self, filename: str, dtype: np.dtype, shape: tuple[int, ...]) -> np.ndarray:
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path / filename, dtype=dtype, mode='r', shape=shape)
+
+    @property
+    def data(self) -> np.ndarray:
+        """Read-only memory map of the stored entries, with shape `(n_matrices, entries_per_matrix)`."""
+        return self._memmap('matrices.bin', self.dtype, (len(self), self.entries_per_matrix))
+
+    @property
+    def index(self) -> np.ndarray:
+        """Read-only memory map of the event indices, with shape `(n_matrices,)`."""
+        return self._memmap('index.bin', np.dtype(np.int64), (len(self),))
+
+    def __getitem__(self, item) -> np.ndarray:
+        """
+        Full matrices for the given position(s) in the store;
+        only the requested ones are read from disk.
+        """
+
+        data = np.asarray(self.data[item])
+        n_params = len(self.parameter_names)
+
+        if not self.packed:
+            return data.reshape(data.shape[:-1] + (n_params, n_params))
+
+        matrices = np.empty(data.shape[:-1] + (n_params, n_params), dtype=self.dtype)
+        matrices[..., self._upper[0], self._upper[1]] = data
+        matrices[..., self._upper[1], self._upper[0]] = data
+        return matrices
+
+class DerivativeStore:
+    """
+    Append-only on-disk store of the projected signals and of their derivatives
+    with respect to the Fisher parameters, one record per event and detector.
+    They do not depend on the noise of the detectors, so that Fisher matrices
+    and SNRs can be recomputed from them for other PSDs or frequency cuts
+    (see `reweighting.reweighted_network_errors`) without computing any waveform.
+
+    A store is a folder containing
+
+    - `metadata.json`: parameter names, detector names, numbers of detector components and data type;
+    - `frequencies_{i}.npy`: the frequency grid of the `i`-th detector;
+    - `derivatives.bin`: for each record, an array with shape `(n_params + 1, n_bins, n_components)`
+    holding the signal followed by its derivatives, only in the contiguous range of frequency bins
+    where any of them is nonzero;
+    - `records.bin`: for each record, the index (in the population) of the event, the position of the detector,
+    the first frequency bin and the number of bins, as 64-bit integers.
+
+    The records and their offsets are read when the store is opened and after each of its appends:
+    records appended through another `DerivativeStore` object are seen once the store is opened again.
+
+    Example usage:
+
+    ```
+    >>> import tempfile
+    >>> path = Path(tempfile.mkdtemp()) / 'derivatives'
+    >>> store = DerivativeStore.create(path, ['mass_1'], ['ET'], [np.linspace(2., 10., 5)], [3], dtype='complex64')
+    >>> store.append(np.ones((2, 2, 3)).ravel(), np.array([[12, 0, 1, 2]]))
+    >>> store = DerivativeStore(path)
+    >>> print(len(store), store.records[0], store[0].shape, store[0].dtype)
+    1 [12  0  1  2] (2, 2, 3) complex64
+
+    ```
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        """
+        Open an existing store.
+
+        :param path: folder of the store
+        """
+
+        self.path = Path(path)
+        with open(self.path / 'metadata.json') as file:
+            metadata = json.load(file)
+        self.parameter_names = metadata['parameter_names']
+        self.detector_names = metadata['detector_names']
+        self.n_components = metadata['n_components']
+        self.dtype = np.dtype(metadata['dtype'])
+        self.frequencyvectors = [
+            np.load(self.path / f'frequencies_{i_detector}.npy') for i_detector in range(len(self.detector_names))
+        ]
+        self._load_index()
+
+    @classmethod
+    def create(
+        cls,
+        path: Union[Path, str],
+        parameter_names: list[str],
+        detector_names: list[str],
+        frequencyvectors: list[np.ndarray],
+        n_components: list[int],
+        dtype: Union[str, np.dtype] = np.complex128,
+    ) -> 'DerivativeStore':
+        """
+        Create an empty store, overwriting any store in the same folder.
+
+        :param path: folder of the store
+        :param parameter_names: names of the parameters of the derivatives
+        :param detector_names: names of the detectors of the network
+        :param frequencyvectors: frequency grid of each detector
+        :param n_components: number of components of each detector
+        :param dtype: complex data type of the saved arrays: `complex64` halves the size of the store, at the cost of precision; defaults to `complex128`
+
+        :return: the new store
+        """
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / 'metadata.json', 'w') as file:
+            json.dump({
+                'parameter_names': list(parameter_names),
+                'detector_names': list(detector_names),
+                'n_components': [int(n) for n in n_components],
+                'dtype': np.dtype(dtype).name,
+            }, file)
+        for i_detector, frequencyvector in enumerate(frequencyvectors):
+            np.save(path / f'frequencies_{i_detector}.npy', np.ravel(frequencyvector))
+        for filename in ['derivatives.bin', 'records.bin']:
+            open(path / filename, 'wb').close()
+
+        return cls(path)
+
+    def append(self, data: np.ndarray, records: np.ndarray) -> None:
+        """
+        Add records at the end of the store.
+
+        :param data: the arrays of the records, flattened and concatenated in the order of the records
+        :param records: array with shape `(n_records, 4)` - event index, detector position, first bin and number of bins of each record
+        """
+
+        with open(self.path / 'derivatives.bin', 'ab') as file:
+            np.asarray(data).astype(self.dtype).tofile(file)
+        with open(self.path / 'records.bin', 'ab') as file:
+            np.asarray(records, dtype=np.int64).tofile(file)
+
+        self._load_index()
+
+    def _sizes(self, records: np.ndarray) -> np.ndarray:
+        return (len(self.parameter_names) + 1) * records[:, 3] * np.asarray(self.n_components)[records[:, 1]]
+
+    def _load_index(self) -> None:
+        """
+        Map the records and the entries, and compute the offsets of the records once,
+        when the store is opened and after each append, rather than at each access.
+        """
+
+        n_records = (self.path / 'records.bin').stat().st_size // (4 * np.dtype(np.int64).itemsize)
+        n_entries = (self.path / 'derivatives.bin').stat().st_size // self.dtype.itemsize
+        if n_records == 0:
+            sizes = np.zeros((0,), dtype=np.int64)
+        else:
+            records = np.memmap(self.path / 'records.bin', dtype=np.int64, mode='r', shape=(n_records, 4))
+            sizes = self._sizes(records)
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+        # a block whose writing was interrupted is ignored
+        n_records = int(np.searchsorted(offsets[1:], n_entries, side='right'))
+        self._offsets = offsets[:n_records + 1]
+        self._offsets.flags.writeable = False
+
+        if n_records == 0:
+            self._records = np.zeros((0, 4), dtype=np.int64)
+        else:
+            self._records = np.memmap(self.path / 'records.bin', dtype=np.int64, mode='r', shape=(n_records, 4))
+        if self._offsets[-1] == 0:
+            self._data = np.zeros((0,), dtype=self.dtype)
+        else:
+            self._data = np.memmap(self.path / 'derivatives.bin', dtype=self.dtype, mode='r', shape=(int(self._offsets[-1]),))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def records(self) -> np.ndarray:
+        """Read-only memory map of the records, with shape `(n_records, 4)`."""
+        return self._records
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Position of the first entry of each record in `derivatives.bin`, and of the end of the last one."""
+        return self._offsets
+
+    @property
+    def data(self) -> np.ndarray:
+        """Read-only memory map of the entries of all the records, one after the other."""
+        return self._data
+
+    def __getitem__(self, item: int) -> np.ndarray:
+        """
+        Signal and derivatives of a record, with shape `(n_params + 1, n_bins, n_components)`;
+        only this record is read from disk.
+        """
+
+        _, i_detector, _, n_bins = self._records[item]
+        offsets = self._offsets
+        return np.array(self._data[offsets[item]:offsets[item + 1]]).reshape(
+            len(self.parameter_names) + 1, n_bins, self.n_components[i_detector]
+        )
@@ -1,5 +1,7 @@
 import os
 import logging
+import functools
+from typing import Union
 import matplotlib.pyplot as plt
 import numpy as np
 import sympy as sp
@@ -21,6 +23,15 @@ import GWFish.modules.fft as fft
 
 DEFAULT_WAVEFORM_MODEL = 'IMRPhenomD'
 
+# Parameters of the deviations from general relativity in the inspiral phase of
+# the GWFish waveforms (TaylorF2, IMRPhenomD): fractional deviations of the
+# coefficients of the PN expansion, phi_k -> phi_k * (1 + delta_phi_k),
+# and a parametrized post-Einsteinian term ppe_beta * (pi * Mc * f)**(ppe_b / 3).
+# The phase depends linearly on all of them, so the waveform derivatives
+# with respect to them are computed analytically (see `Waveform.phase_derivatives`).
+PN_PHASE_DEVIATIONS = {f'delta_phi_{k}': k for k in [0, 2, 3, 4, 5, 6, 7]}
+DEVIATION_PARAMETERS = list(PN_PHASE_DEVIATIONS) + ['ppe_beta']
+
 def convert_args_list_to_float(*args_list):
     """
     Converts inputs to floats, returns a list in the same order as the 
@@ -116,6 +127,7 @@ class Waveform:
         self.data_params = data_params
         self._frequency_domain_strain = None
         self._time_domain_strain = None
+        self._phase_derivatives = {}
         self._f_ref = None
 
         if 'frequencyvector' in data_params:
@@ -144,6 +156,18 @@ class Waveform:
             
         return self._frequency_domain_strain
 
+    @property
+    def phase_derivatives(self):
+        """
+        Derivatives of the phase of the polarizations with respect to the parameters
+        it depends on linearly (the `DEVIATION_PARAMETERS` supported by the model),
+        as a dictionary of arrays with shape `(n_frequencies, 1)`.
+        The derivative of the strain with respect to one of them is `1j * derivative * h`.
+        """
+        if self._frequency_domain_strain is None:
+            self.calculate_frequency_domain_strain()
+        return self._phase_derivatives
+
     def calculate_time_domain_strain(self):
         raise NotImplementedError('Time-domain strain is not implemeted'+\
                                   'in this class')
@@ -166,6 +190,7 @@ class Waveform:
         self.gw_params.update(new_gw_params)
         self._frequency_domain_strain = None
         self._time_domain_strain = None
+        self._phase_derivatives = {}
 
     @property
     def frequencyvector(self):
@@ -219,6 +244,516 @@ class Waveform:
     def t_of_f(self):
         return t_of_f_PN(self.gw_params, self.frequencyvector)
 
+def _evaluated_point_by_point(waveform_class, waveform_model: str) -> bool:
+    """
+    Whether the waveforms of a class and model are evaluated point by point in frequency,
+    so that their values do not depend on the rest of the frequency grid: the GWFish waveforms
+    and the LAL frequency-domain approximants called through `SimInspiralChooseFDWaveformSequence`
+    are, while `LALTD_Waveform` and the other approximants of `LALFD_Waveform`, which go through
+    `SimInspiralFD`, take the resolution and range of the grid from its first and last points.
+    The stand-ins of waveform classes (`MergedGridWaveforms`, `InterpolatedWaveforms`) are judged by the class they wrap.
+    """
+    while isinstance(waveform_class, (MergedGridWaveforms, InterpolatedWaveforms)):
+        waveform_class = waveform_class.waveform_class
+    if issubclass(waveform_class, LALTD_Waveform):
+        return False
+    if issubclass(waveform_class, LALFD_Waveform):
+        return bool(lalsim.SimInspiralImplementedFDApproximants(lalsim.GetApproximantFromString(waveform_model)))
+    return True
+
+class MergedGridWaveforms:
+    """
+    Stand-in for a waveform class, which evaluates each waveform once
+    on a merged frequency grid (e.g. the union of the grids of a space-borne and 
+    of ground-based detectors) and returns its restriction to the frequency grid
+    requested by each detector. 
+    
+    It is called like a waveform class, and the waveforms computed for a 
+    set of parameters are cached, so that the waveform and its numerical derivatives
+    are computed once for all the detectors of a network. The detector grids must
+    be made of points of the merged grid, and the waveform model must be evaluated
+    point by point in frequency (as the GWFish waveforms and the LAL frequency-domain
+    approximants called on arbitrary frequency sequences are), unless all the grids are the same.
+    The grids which are a contiguous part of the merged grid, such as the merged
+    grid itself, get views of the cached arrays instead of copies; the cached arrays
+    are read-only.
+
+    Example usage:
+
+    ```
+    >>> grid_1, grid_2 = np.linspace(1e-3, 0.1, 100), np.geomspace(2., 1024., 200)
+    >>> waveforms = MergedGridWaveforms(TaylorF2, np.concatenate([grid_1, grid_2]))
+    >>> params = {'mass_1': 30., 'mass_2': 30., 'luminosity_distance': 1000., 'geocent_time': 1e9}
+    >>> h_1 = waveforms('TaylorF2', params, {'frequencyvector': grid_1[:, np.newaxis], 'f_ref': 50.})()
+    >>> h_2 = waveforms('TaylorF2', params, {'frequencyvector': grid_2[:, np.newaxis], 'f_ref': 50.})()
+    >>> print(h_1.shape, h_2.shape, waveforms.n_evaluations)
+    (100, 2) (200, 2) 1
+    >>> print(waveforms.indices(grid_2[:, np.newaxis]))
+    slice(100, 300, None)
+
+    ```
+    """
+
+    def __init__(self, waveform_class, frequencyvector: np.ndarray):
+        """
+        :param waveform_class: waveform class used to compute the waveforms
+        :param frequencyvector: frequencies of the merged grid; they are sorted and duplicates are removed
+        """
+        self.waveform_class = waveform_class
+        self.frequencyvector = np.unique(np.ravel(frequencyvector))
+        self.n_evaluations = 0
+        self._waveforms = {}
+
+    def indices(self, frequencyvector: np.ndarray) -> Union[slice, np.ndarray]:
+        """
+        Positions of the points of `frequencyvector` in the merged grid:
+        a slice if they are contiguous, so that indexing gives a view.
+        """
+        frequencyvector = np.ravel(frequencyvector)
+        indices = np.minimum(np.searchsorted(self.frequencyvector, frequencyvector), len(self.frequencyvector) - 1)
+        if not np.array_equal(self.frequencyvector[indices], frequencyvector):
+            raise ValueError('The frequency grid is not part of the merged grid')
+        if len(indices) > 0 and np.all(np.diff(indices) == 1):
+            return slice(indices[0], indices[-1] + 1)
+        return indices
+
+    def evaluate(self, name: str, gw_params: dict, f_ref: float) -> tuple[np.ndarray, np.ndarray, dict]:
+        """
+        Polarizations, time-frequency relation and phase derivatives
+        of a waveform on the merged grid, computed at the first request.
+        """
+        key = (name, f_ref, tuple(sorted(gw_params.items())))
+        if key not in self._waveforms:
+            waveform = self.waveform_class(
+                name, dict(gw_params), {'frequencyvector': self.frequencyvector[:, np.newaxis], 'f_ref': f_ref}
+            )
+            polarizations, t_of_f, phase_derivatives = waveform(), waveform.t_of_f, dict(waveform.phase_derivatives)
+            # they are shared by the detectors, possibly as views
+            for array in [polarizations, t_of_f, *phase_derivatives.values()]:
+                array.setflags(write=False)
+            self._waveforms[key] = (polarizations, t_of_f, phase_derivatives)
+            self.n_evaluations += 1
+        return self._waveforms[key]
+
+    def __call__(self, name, gw_params, data_params):
+        return _MergedGridWaveform(self, name, gw_params, data_params)
+
+class _MergedGridWaveform:
+    """Waveform on the grid of one detector, taken from the ones cached by a `MergedGridWaveforms`."""
+
+    def __init__(self, merged, name, gw_params, data_params):
+        self.merged = merged
+        self.name = name
+        self.gw_params = dict(gw_params)
+        self.f_ref = data_params.get('f_ref', None)
+        self._indices = merged.indices(data_params['frequencyvector'])
+
+    def update_gw_params(self, new_gw_params):
+        self.gw_params.update(new_gw_params)
+
+    def __call__(self):
+        return self.merged.evaluate(self.name, self.gw_params, self.f_ref)[0][self._indices]
+
+    @property
+    def t_of_f(self):
+        return self.merged.evaluate(self.name, self.gw_params, self.f_ref)[1][self._indices]
+
+    @property
+    def phase_derivatives(self):
+        phase_derivatives = self.merged.evaluate(self.name, self.gw_params, self.f_ref)[2]
+        return {parameter: derivative[self._indices] for parameter, derivative in phase_derivatives.items()}
+
+class InterpolatedWaveforms:
+    """
+    Stand-in for a waveform class, which evaluates each waveform on a coarse set
+    of frequencies (nodes) and reconstructs it on the requested frequency grid
+    by interpolating the amplitude and the unwrapped phase of its polarizations.
+
+    The waveform is evaluated at `geocent_time` zero, its dependence on `geocent_time`
+    being the factor $e^{2 \\pi i f t_c}$, at two close frequencies around each node,
+    which give the values and the slopes of the amplitude and phase used by a cubic Hermite
+    interpolation; the slopes also unwrap the phase, which changes by many cycles between 
+    two nodes of long signals. The nodes are spaced according to the duration of the
+    signal at each frequency (see `t_of_f_PN`), so that the interpolation error of the 
+    leading-order phase is about `tolerance`, with a largest spacing for the merger
+    and ringdown. The first time a waveform is requested on a grid, this is checked
+    in the middle of each interval between nodes, and the intervals whose relative error 
+    is above `tolerance` are split, or evaluated exactly if they contain few frequencies of the grid.
+    The same nodes are then used for the waveforms requested on that grid at nearby parameters
+    (within $10^{-3}$), such as the ones of the numerical derivatives, whose differences are then
+    not affected by a change of nodes. The intervals where the waveform vanishes at both nodes
+    (e.g. above the cutoff of `TaylorF2`) are set to zero, and the ones where it vanishes
+    at one of them are evaluated exactly. If the nodes are not much fewer than the frequencies
+    of the grid, the waveform is evaluated on the grid.
+    
+    The waveform model must be evaluated point by point in frequency, as the GWFish
+    waveforms and the LAL frequency-domain approximants called through
+    `SimInspiralChooseFDWaveformSequence` (see `LALFD_Waveform`) are.
+    The time-frequency relation is the one of the waveform class on the requested grid.
+
+    Example usage:
+
+    ```
+    >>> waveforms = InterpolatedWaveforms(TaylorF2, tolerance=1e-4)
+    >>> frequencyvector = np.geomspace(8., 1024., 5000)[:, np.newaxis]
+    >>> params = {'mass_1': 1.4, 'mass_2': 1.4, 'luminosity_distance': 100., 'geocent_time': 1e9}
+    >>> data_params = {'frequencyvector': frequencyvector, 'f_ref': 50.}
+    >>> h = waveforms('TaylorF2', params, data_params)()
+    >>> h_exact = TaylorF2('TaylorF2', params, data_params)()
+    >>> print(np.max(np.abs(h - h_exact)) < 1e-4 * np.max(np.abs(h_exact)), waveforms.n_frequencies < len(frequencyvector) / 5)
+    True True
+
+    ```
+    """
+
+    # largest spacing of the nodes relative to their frequency, for the merger and ringdown,
+    # where the duration of the signal no longer sets it
+    max_relative_spacing = 0.05
+    # phase change of the waveform between the two evaluations around each node
+    pair_phase_step = 0.5
+    # intervals between nodes with at most this many frequencies of the grid are evaluated exactly instead of being split
+    n_exact_frequencies = 4
+
+    def __init__(self, waveform_class, tolerance: float = 1e-3, max_refinements: int = 10):
+        """
+        :param waveform_class: waveform class used to compute the waveforms
+        :param tolerance: target relative error of the interpolated polarizations
+        :param max_refinements: largest number of times the intervals between nodes are split; the ones which still exceed `tolerance` are evaluated exactly
+        """
+        self.waveform_class = waveform_class
+        self.tolerance = tolerance
+        self.max_refinements = max_refinements
+        # number of calls to the waveform class, and of frequencies at which it was evaluated
+        self.n_evaluations = 0
+        self.n_frequencies = 0
+        self._nodes = {}
+
+    def __call__(self, name, gw_params, data_params):
+        return _InterpolatedWaveform(self, name, gw_params, data_params)
+
+    def _call_waveform(self, name: str, gw_params: dict, f_ref: float, frequencies: np.ndarray) -> tuple[np.ndarray, dict]:
+        """Polarizations and phase derivatives of the waveform at `geocent_time` zero on some frequencies."""
+        n_frequencies = len(frequencies)
+        # the waveform classes need at least two frequencies
+        padded = np.concatenate([frequencies, frequencies]) if n_frequencies == 1 else frequencies
+        waveform = self.waveform_class(
+            name, dict(gw_params, geocent_time=0.), {'frequencyvector': padded[:, np.newaxis], 'f_ref': f_ref}
+        )
+        polarizations = np.reshape(waveform(), (len(padded), -1))[:n_frequencies]
+        phase_derivatives = {
+            parameter: np.ravel(derivative)[:n_frequencies] for parameter, derivative in waveform.phase_derivatives.items()
+        }
+        self.n_evaluations += 1
+        self.n_frequencies += len(padded)
+        return polarizations, phase_derivatives
+
+    def _duration(self, gw_params: dict, frequencies: np.ndarray) -> np.ndarray:
+        return -t_of_f_PN(dict(gw_params, geocent_time=0.), frequencies)
+
+    def _seed_nodes(self, gw_params: dict, frequencyvector: np.ndarray) -> np.ndarray:
+        """Nodes spaced according to the duration of the signal, from the first to the last frequency of the grid."""
+        duration = self._duration(gw_params, frequencyvector)
+        # the error of the cubic Hermite interpolation of the leading-order phase psi is
+        # spacing^4 |psi''''| / 384, with |psi''''| = 2 pi (8 * 11 * 14 / 27) duration / f^3, and
+        # the error of the prediction of the phase change which unwraps it is spacing^3 |psi'''| / 12, 
+        # with |psi'''| = 2 pi (8 * 11 / 9) duration / f^2, which is kept below one radian
+        spacing = np.minimum.reduce([
+            (384 * self.tolerance * frequencyvector ** 3 / (2 * np.pi * 8 * 11 * 14 / 27 * duration)) ** (1 / 4),
+            (12 * frequencyvector ** 2 / (2 * np.pi * 8 * 11 / 9 * duration)) ** (1 / 3),
+            self.max_relative_spacing * frequencyvector,
+        ])
+        # number of nodes below each frequency of the grid
+        density = 1 / spacing
+        cumulative = np.concatenate([[0.], np.cumsum(np.diff(frequencyvector) * (density[1:] + density[:-1]) / 2)])
+        n_intervals = max(int(np.ceil(cumulative[-1])), 1)
+        return np.interp(np.linspace(0., cumulative[-1], n_intervals + 1), cumulative, frequencyvector)
+
+    def _offsets(self, gw_params: dict, nodes: np.ndarray) -> np.ndarray:
+        """Distance between the two evaluations around each node."""
+        return np.minimum(self.pair_phase_step / (2 * np.pi * self._duration(gw_params, nodes)), 1e-3 * nodes)
+
+    def _call_pairs(self, name, gw_params, f_ref, nodes, offsets, extra_frequencies):
+        """Waveform at the pairs of frequencies around the nodes, and at some other frequencies, in one call."""
+        frequencies = np.concatenate([nodes - offsets / 2, nodes + offsets / 2, extra_frequencies])
+        polarizations, phase_derivatives = self._call_waveform(name, gw_params, f_ref, frequencies)
+        n_nodes = len(nodes)
+        pairs = (
+            polarizations[:n_nodes], polarizations[n_nodes:2 * n_nodes],
+            {parameter: derivative[:n_nodes] for parameter, derivative in phase_derivatives.items()},
+            {parameter: derivative[n_nodes:2 * n_nodes] for parameter, derivative in phase_derivatives.items()},
+        )
+        extra = (
+            polarizations[2 * n_nodes:],
+            {parameter: derivative[2 * n_nodes:] for parameter, derivative in phase_derivatives.items()},
+        )
+        return pairs, extra
+
+    @staticmethod
+    def _hermite_basis(nodes: np.ndarray, frequencies: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Interval of each frequency, and weights of the values and slopes at the nodes
+        of its interval in the cubic Hermite interpolation, with shape `(4, n_frequencies)`.
+        """
+        i_interval = np.clip(np.searchsorted(nodes, frequencies, side='right') - 1, 0, len(nodes) - 2)
+        steps = nodes[i_interval + 1] - nodes[i_interval]
+        x = (frequencies - nodes[i_interval]) / steps
+        return i_interval, np.stack([
+            (1 + 2 * x) * (1 - x) ** 2,
+            x * (1 - x) ** 2 * steps,
+            x ** 2 * (3 - 2 * x),
+            x ** 2 * (x - 1) * steps,
+        ])
+
+    @staticmethod
+    def _interpolate(nodes, offsets, pairs, frequencies, basis=None) -> tuple[np.ndarray, dict]:
+        """
+        Cubic Hermite interpolation of the amplitude and unwrapped phase of the polarizations, 
+        and of the phase derivatives; the `basis` of the frequencies is computed if not given.
+        """
+        h_minus, h_plus, derivatives_minus, derivatives_plus = pairs
+        offsets = offsets[:, np.newaxis]
+        i_interval, weights = InterpolatedWaveforms._hermite_basis(nodes, frequencies) if basis is None else basis
+
+        ratio = h_plus * np.conjugate(h_minus)
+        phase_slopes = np.angle(ratio) / offsets
+        phases = np.angle(h_minus) + np.angle(ratio) / 2
+        amplitudes = (np.abs(h_plus) + np.abs(h_minus)) / 2
+        amplitude_slopes = (np.abs(h_plus) - np.abs(h_minus)) / offsets
+
+        # phase changes between the nodes: the multiple of 2 pi closest to the one predicted by the slopes
+        predicted = (phase_slopes[1:] + phase_slopes[:-1]) / 2 * np.diff(nodes)[:, np.newaxis]
+        increments = predicted + np.angle(np.exp(1j * (np.diff(phases, axis=0) - predicted)))
+        phases = phases[0] + np.concatenate([np.zeros((1, phases.shape[1])), np.cumsum(increments, axis=0)])
+
+        # all the interpolated quantities are stacked, to be interpolated at once
+        parameters = list(derivatives_minus)
+        n_polarizations = amplitudes.shape[1]
+        values = np.hstack([amplitudes, phases] + [
+            (derivatives_plus[parameter] + derivatives_minus[parameter])[:, np.newaxis] / 2 for parameter in parameters
+        ])
+        slopes = np.hstack([amplitude_slopes, phase_slopes] + [
+            (derivatives_plus[parameter] - derivatives_minus[parameter])[:, np.newaxis] / offsets for parameter in parameters
+        ])
+        interpolated = (
+            weights[0, :, np.newaxis] * values[i_interval] + weights[1, :, np.newaxis] * slopes[i_interval]
+            + weights[2, :, np.newaxis] * values[i_interval + 1] + weights[3, :, np.newaxis] * slopes[i_interval + 1]
+        )
+
+        polarizations = interpolated[:, :n_polarizations] * np.exp(1j * interpolated[:, n_polarizations:2 * n_polarizations])
+        phase_derivatives = {
+            parameter: interpolated[:, 2 * n_polarizations + k] for k, parameter in enumerate(parameters)
+        }
+        return polarizations, phase_derivatives
+
+    def _choose_nodes(self, name, gw_params, f_ref, frequencyvector):
+        """
+        Nodes, offsets, intervals evaluated exactly and waveforms at the pairs of frequencies,
+        for a waveform requested on a new grid; `None` if the waveform is better evaluated on the grid.
+        """
+        nodes = self._seed_nodes(gw_params, frequencyvector)
+        if 2 * len(nodes) >= len(frequencyvector):
+            return None
+        offsets = self._offsets(gw_params, nodes)
+
+        exact_left_nodes = np.zeros(0)
+        midpoints = (nodes[1:] + nodes[:-1]) / 2
+        pairs, (midpoint_values, _) = self._call_pairs(name, gw_params, f_ref, nodes, offsets, midpoints)
+
+        for refinement in range(self.max_refinements + 1):
+            predicted, _ = self._interpolate(nodes, offsets, pairs, midpoints)
+            norms = np.linalg.norm(midpoint_values, axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                errors = np.linalg.norm(predicted - midpoint_values, axis=1) / norms
+            # intervals with vanishing waveforms at the nodes are not interpolated (see `_reconstruct`)
+            failed = midpoints[(norms > 0) & ~(errors <= self.tolerance)]
+            if len(failed) == 0:
+                break
+
+            i_interval = np.searchsorted(nodes, failed) - 1
+            n_bins = (
+                np.searchsorted(frequencyvector, nodes[i_interval + 1], side='right') 
+                - np.searchsorted(frequencyvector, nodes[i_interval], side='left')
+            )
+            split = (n_bins > self.n_exact_frequencies) & (refinement < self.max_refinements)
+            if refinement == self.max_refinements and np.any(n_bins > self.n_exact_frequencies):
+                logging.warning(f'{np.sum(n_bins > self.n_exact_frequencies)} intervals of the interpolated waveform '
+                                f'did not reach a relative error of {self.tolerance}, and are evaluated exactly')
+            exact_left_nodes = np.concatenate([exact_left_nodes, nodes[i_interval[~split]]])
+            if not np.any(split):
+                break
+
+            # the failed intervals are split at their midpoints, and the new ones checked in the next refinement
+            new_nodes = failed[split]
+            new_offsets = self._offsets(gw_params, new_nodes)
+            midpoints = np.sort(np.concatenate([
+                (nodes[i_interval[split]] + new_nodes) / 2, (new_nodes + nodes[i_interval[split] + 1]) / 2
+            ]))
+            new_pairs, (midpoint_values, _) = self._call_pairs(name, gw_params, f_ref, new_nodes, new_offsets, midpoints)
+
+            order = np.argsort(np.concatenate([nodes, new_nodes]))
+            nodes = np.concatenate([nodes, new_nodes])[order]
+            offsets = np.concatenate([offsets, new_offsets])[order]
+            pairs = (
+                np.concatenate([pairs[0], new_pairs[0]])[order],
+                np.concatenate([pairs[1], new_pairs[1]])[order],
+                {parameter: np.concatenate([pairs[2][parameter], new_pairs[2][parameter]])[order] for parameter in pairs[2]},
+                {parameter: np.concatenate([pairs[3][parameter], new_pairs[3][parameter]])[order] for parameter in pairs[3]},
+            )
+
+        exact_intervals = np.isin(nodes[:-1], exact_left_nodes)
+        basis = self._hermite_basis(nodes, frequencyvector)
+        if 2 * len(nodes) + np.sum(exact_intervals[basis[0]]) >= len(frequencyvector):
+            return None
+        return nodes, offsets, exact_intervals, basis, pairs
+
+    def _reconstruct(self, name, gw_params, f_ref, frequencyvector, nodes, offsets, exact_intervals, basis, pairs):
+        """Waveform at `geocent_time` zero on the grid, from its values at the pairs of frequencies around the nodes."""
+        polarizations, phase_derivatives = self._interpolate(nodes, offsets, pairs, frequencyvector, basis)
+
+        norms = np.minimum(np.linalg.norm(pairs[0], axis=1), np.linalg.norm(pairs[1], axis=1))
+        vanishing = np.maximum(np.linalg.norm(pairs[0], axis=1), np.linalg.norm(pairs[1], axis=1)) == 0
+        zero_intervals = vanishing[:-1] & vanishing[1:]
+        exact_intervals = exact_intervals | ~zero_intervals & ((norms[:-1] == 0) | (norms[1:] == 0))
+
+        i_interval = basis[0]
+        polarizations[zero_intervals[i_interval]] = 0.
+
+        exact = exact_intervals[i_interval]
+        if np.any(exact):
+            polarizations[exact], exact_derivatives = self._call_waveform(name, gw_params, f_ref, frequencyvector[exact])
+            for parameter, derivative in exact_derivatives.items():
+                phase_derivatives[parameter][exact] = derivative
+
+        return polarizations, phase_derivatives
+
+    def evaluate(self, name: str, gw_params: dict, f_ref: float, frequencyvector: np.ndarray) -> tuple[np.ndarray, dict]:
+        """
+        Polarizations, with shape `(n_frequencies, n_polarizations)`, and phase derivatives,
+        with shape `(n_frequencies, 1)`, of a waveform on a frequency grid.
+        """
+        frequencyvector = np.ravel(frequencyvector)
+        if f_ref is None:
+            f_ref = frequencyvector[0]
+        gw_params = dict(gw_params)
+
+        key = (name, f_ref, frequencyvector.tobytes())
+        if key not in self._nodes or not _nearby_parameters(self._nodes[key][0], gw_params):
+            chosen = self._choose_nodes(name, gw_params, f_ref, frequencyvector)
+            self._nodes[key] = (gw_params, None if chosen is None else chosen[:4])
+            if chosen is not None:
+                polarizations, phase_derivatives = self._reconstruct(name, gw_params, f_ref, frequencyvector, *chosen)
+        else:
+            chosen = self._nodes[key][1]
+            if chosen is not None:
+                nodes, offsets = chosen[:2]
+                pairs, _ = self._call_pairs(name, gw_params, f_ref, nodes, offsets, np.zeros(0))
+                polarizations, phase_derivatives = self._reconstruct(name, gw_params, f_ref, frequencyvector, *chosen, pairs)
+
+        if chosen is None:
+            polarizations, phase_derivatives = self._call_waveform(name, gw_params, f_ref, frequencyvector)
+
+        polarizations = polarizations * np.exp(2j * np.pi * frequencyvector * gw_params['geocent_time'])[:, np.newaxis]
+        return polarizations, {parameter: derivative[:, np.newaxis] for parameter, derivative in phase_derivatives.items()}
+
+def _nearby_parameters(reference: dict, gw_params: dict, tolerance: float = 1e-3) -> bool:
+    """Whether the parameters are the same as the reference ones, up to `tolerance`, apart from `geocent_time`."""
+    if reference.keys() != gw_params.keys():
+        return False
+    for key, value in gw_params.items():
+        if key == 'geocent_time':
+            continue
+        try:
+            if abs(float(value) - float(reference[key])) > tolerance * max(1., abs(float(reference[key]))):
+                return False
+        except (TypeError, ValueError):
+            if value != reference[key]:
+                return False
+    return True
+
+class _InterpolatedWaveform:
+    """Waveform on the grid of one detector, interpolated by an `InterpolatedWaveforms`."""
+
+    def __init__(self, interpolated, name, gw_params, data_params):
+        self.interpolated = interpolated
+        self.name = name
+        self.gw_params = dict(gw_params)
+        self.data_params = data_params
+        self.f_ref = data_params.get('f_ref', None)
+        self._waveform = None
+
+    def update_gw_params(self, new_gw_params):
+        self.gw_params.update(new_gw_params)
+        self._waveform = None
+
+    def _evaluate(self):
+        if self._waveform is None:
+            self._waveform = self.interpolated.evaluate(self.name, self.gw_params, self.f_ref, self.data_params['frequencyvector'])
+        return self._waveform
+
+    def __call__(self):
+        return self._evaluate()[0]
+
+    @property
+    def t_of_f(self):
+        # computed without evaluating the waveform
+        return self.interpolated.waveform_class(self.name, dict(self.gw_params), self.data_params).t_of_f
+
+    @property
+    def phase_derivatives(self):
+        return self._evaluate()[1]
+
+class _LALGenerator:
+    """
+    LAL objects shared by the `LALFD_Waveform` and `LALTD_Waveform` instances of an approximant
+    on a frequency grid, so that they are created once instead of for every waveform
+    (e.g. twice per parameter of the numerical derivatives): the approximant, the dictionary
+    of the extra parameters and, for the approximants called on arbitrary frequency sequences,
+    the LAL vector with the frequencies of the grid, whose creation takes a good part
+    of the time of the fast approximants.
+    """
+
+    def __init__(self, name: str, frequencies: bytes):
+        self.approximant = lalsim.GetApproximantFromString(name)
+        self._params_lal = lal.CreateDict()
+        self._tidal_deformabilities = (0., 0.)
+
+        frequencyvector = np.frombuffer(frequencies)
+        if lalsim.SimInspiralImplementedFDApproximants(self.approximant):
+            self.frequency_array = CreateREAL8Vector(len(frequencyvector))
+            self.frequency_array.data = frequencyvector
+        else:
+            self.frequency_array = None
+
+    def params_lal(self, lambda_1: float, lambda_2: float):
+        """
+        Dictionary of the extra parameters for the given tidal deformabilities, which are inserted
+        only if nonzero. It is shared by the waveforms with the same ones, and replaced
+        when they change or when LAL has added derived parameters to it (as the NRTidal
+        approximants do with the spin-induced quadrupole moments), so that each call gets
+        the same parameters as with a new dictionary.
+        """
+        n_inserted = int(lambda_1 != 0) + int(lambda_2 != 0)
+        if (lambda_1, lambda_2) != self._tidal_deformabilities or lal.DictSize(self._params_lal) != n_inserted:
+            self._params_lal = lal.CreateDict()
+            if lambda_1 != 0:
+                lalsim.SimInspiralWaveformParamsInsertTidalLambda1(self._params_lal, lambda_1)
+            if lambda_2 != 0:
+                lalsim.SimInspiralWaveformParamsInsertTidalLambda2(self._params_lal, lambda_2)
+            self._tidal_deformabilities = (lambda_1, lambda_2)
+        return self._params_lal
+
+# number of (approximant, frequency grid) pairs whose LAL objects are kept alive;
+# the adaptive frequency grids give a different grid for each signal
+LAL_GENERATOR_CACHE_SIZE = 64
+
+@functools.lru_cache(maxsize=LAL_GENERATOR_CACHE_SIZE)
+def _cached_lal_generator(name: str, frequencies: bytes) -> _LALGenerator:
+    return _LALGenerator(name, frequencies)
+
+def _lal_generator(name: str, frequencyvector: np.ndarray) -> _LALGenerator:
+    """LAL objects for the approximant `name` on a frequency grid, created at the first request."""
+    return _cached_lal_generator(name, np.ascontiguousarray(np.ravel(frequencyvector), dtype=np.float64).tobytes())
+
 class LALFD_Waveform(Waveform):
     """
     Calls LAL to provide waveforms in frequency domain. Works with both
@@ -227,8 +762,8 @@ class LALFD_Waveform(Waveform):
     """
     def __init__(self, name, gw_params, data_params):
         super().__init__(name, gw_params, data_params)
-        self._params_lal = lal.CreateDict()
-        self._approx_lal = lalsim.GetApproximantFromString(self.name)
+        self._generator = _lal_generator(self.name, self.frequencyvector)
+        self._approx_lal = self._generator.approximant
         self._init_lambda()
         self._init_lal_gw_parameters()
         self._setup_lal_caller_args()
@@ -248,12 +783,15 @@ class LALFD_Waveform(Waveform):
         self._setup_lal_caller_args()
 
     def _init_lambda(self):
-        if self.gw_params['lambda_1'] != 0:
-            from lalsimulation import SimInspiralWaveformParamsInsertTidalLambda1
-            SimInspiralWaveformParamsInsertTidalLambda1(self._params_lal, float(self.gw_params['lambda_1']))
-        if self.gw_params['lambda_2'] != 0:
-            from lalsimulation import SimInspiralWaveformParamsInsertTidalLambda2
-            SimInspiralWaveformParamsInsertTidalLambda2(self._params_lal, float(self.gw_params['lambda_2']))
+        # the dictionary is shared with the other waveforms of the same approximant and grid
+        self._params_lal = self._generator.params_lal(float(self.gw_params['lambda_1']), float(self.gw_params['lambda_2']))
+
+    def _refresh_lal_caller_args(self):
+        """ Right before calling LAL, since other waveforms may have replaced the shared dictionary in the meantime """
+        params_lal = self._params_lal
+        self._init_lambda()
+        if self._params_lal is not params_lal:
+            self._setup_lal_caller_args()
 
     def _init_lal_gw_parameters(self):
         gwfish_input_params = {kk: self.gw_params[kk] for kk in self._gw_params_for_spin_conversion}
@@ -265,8 +803,7 @@ class LALFD_Waveform(Waveform):
 
     def _setup_lal_caller_args(self):
         if lalsim.SimInspiralImplementedFDApproximants(self._approx_lal):
-            self._lal_frequency_array = CreateREAL8Vector(len(self.frequencyvector))
-            self._lal_frequency_array.data = self.frequencyvector
+            self._lal_frequency_array = self._generator.frequency_array
             self._waveform_postprocessing = self._hf_postproccessing_SimInspiralCFDWS
             self._lalsim_caller = lalsim.SimInspiralChooseFDWaveformSequence
             self._lalsim_args = [
@@ -319,15 +856,15 @@ class LALFD_Waveform(Waveform):
         self.hf_cross_out = self._lal_hf_cross.data.data[self.idx_low:self.idx_high+1]
         self.hf_plus_out = self._lal_hf_plus.data.data[self.idx_low:self.idx_high+1]
 
-    def _lal_fd_phase_correction_by_epoch_and_df(self):
+    def _lal_fd_phase_correction_by_epoch_and_df(self, epoch=None):
         """ This correction is also done in Bilby after calling SimInspiralFD """
         # BORIS: weird Bilby correction
-        dt = 1. / self.delta_f + (self._lal_hf_plus.epoch.gpsSeconds +
-                                  self._lal_hf_plus.epoch.gpsNanoSeconds * 1e-9)
-        self.hf_plus_out *= np.exp(
-            -1j * 2 * np.pi * dt * self.frequencyvector)
-        self.hf_cross_out *= np.exp(
-            -1j * 2 * np.pi * dt * self.frequencyvector)
+        if epoch is None:
+            epoch = self._lal_hf_plus.epoch
+        dt = 1. / self.delta_f + (epoch.gpsSeconds + epoch.gpsNanoSeconds * 1e-9)
+        correction = np.exp(-1j * 2 * np.pi * dt * self.frequencyvector)
+        self.hf_plus_out *= correction
+        self.hf_cross_out *= correction
 
     def _hf_postproccessing_SimInspiralFD(self):
         self._lal_fd_strain_adjust_frequency_range()
@@ -336,43 +873,96 @@ class LALFD_Waveform(Waveform):
     def _hf_postproccessing_SimInspiralCFDWS(self):
         self.hf_plus_out, self.hf_cross_out = self._lal_hf_plus.data.data, self._lal_hf_cross.data.data
 
-    def _fd_phase_correction_geocent_time(self):
-        """ Add initial 2pi*f*tc - phic - pi/4 to phase """
-        phi_in = np.exp(1.j*(2*self.frequencyvector*np.pi*self.gw_params['geocent_time']))
-
-        hfp = phi_in * np.conjugate(self.hf_plus_out)  # it's already multiplied by the phase
-        hfc = phi_in * np.conjugate(self.hf_cross_out)
-
-        return hfp, hfc
-
-    def _fd_gwfish_output_format(self, hfp, hfc):
-
-        hfp = hfp[:, np.newaxis]
-        hfc = hfc[:, np.newaxis]
+    def _fd_gwfish_output_format(self):
+        """
+        Polarizations with shape `(n_frequencies, 2)`: the complex conjugates of the LAL ones,
+        with the initial phase 2pi*f*tc added, written into a single new array
+        without intermediate copies. The phase factor is skipped for `geocent_time` zero,
+        as in the waveforms of the numerical derivatives.
+        """
+        polarizations = np.empty((len(self.hf_plus_out), 2), dtype=complex)
+        np.conjugate(self.hf_plus_out, out=polarizations[:, 0])  # it's already multiplied by the phase
+        np.conjugate(self.hf_cross_out, out=polarizations[:, 1])
 
-        polarizations = np.hstack((hfp, hfc))
+        if self.gw_params['geocent_time'] != 0:
+            polarizations *= np.exp(1.j*(2*self.frequencyvector*np.pi*self.gw_params['geocent_time']))[:, np.newaxis]
 
         return polarizations
 
     def calculate_frequency_domain_strain(self):
+        self._refresh_lal_caller_args()
         self._lal_hf_plus, self._lal_hf_cross = self._lalsim_caller(*self._lalsim_args)
         self._waveform_postprocessing()
 
-        hfp, hfc = self._fd_phase_correction_geocent_time()
-        polarizations = self._fd_gwfish_output_format(hfp, hfc)
-        
-        self._frequency_domain_strain = polarizations
+        self._frequency_domain_strain = self._fd_gwfish_output_format()
+
+# frequency-domain approximants used by `LALTD_Waveform` in place of time-domain ones
+# for long signals: the reduced-order models and the frequency-domain members of the same family
+FREQUENCY_DOMAIN_EQUIVALENTS = {
+    'SEOBNRv4': 'SEOBNRv4_ROM',
+    'SEOBNRv4HM': 'SEOBNRv4HM_ROM',
+    'SEOBNRv4T': 'SEOBNRv4T_surrogate',
+    'IMRPhenomT': 'IMRPhenomXAS',
+    'IMRPhenomTHM': 'IMRPhenomXHM',
+    'IMRPhenomTPHM': 'IMRPhenomXPHM',
+}
 
 class LALTD_Waveform(LALFD_Waveform):
     """
     Calls LAL to provide waveforms in time domain, then converts them
     to frequency domain in GWFish.modules.fft. This wrapper class 
     works only with time-domain waveforms.
+
+    The time series are resized to the observation time of the frequency grid,
+    with `2 * f_max / delta_f` samples per polarization, which for long signals
+    (e.g. binary neutron stars from 2 Hz, on a grid fine enough for them) means
+    hundreds of MB per waveform. Above `max_time_domain_samples`, the frequency-domain 
+    polarizations are instead computed in frequency domain, as `LALFD_Waveform` does, 
+    with the approximant itself if LAL implements it in both domains, or with its 
+    frequency-domain equivalent in `FREQUENCY_DOMAIN_EQUIVALENTS`, with a warning; 
+    for the other approximants, the time series are computed anyway. The polarizations of the two 
+    domains agree up to the constant phase and time offsets of their conventions.
+    The approximant which computes the polarizations is kept in `approximant_used`.
+    An estimate of the memory taken by the time series and their transforms, counted from their
+    lengths and data types (it is not measured), is kept in `time_domain_memory_estimate` (in bytes)
+    and logged at the `INFO` level for each waveform; it is `None` if no time series were computed.
+    Unless `time_domain_strain` was requested first, the LAL time series are released once transformed.
     """
+
+    # largest number of samples per polarization of the time series computed for the frequency-domain polarizations;
+    # 2**24 samples take 128 MB per polarization
+    max_time_domain_samples = 2 ** 24
+
     def __init__(self, name, gw_params, data_params):
         super().__init__(name, gw_params, data_params)
         self.ht_plus_out = None
         self.ht_cross_out = None
+        self.time_domain_memory_estimate = None
+        self._frequency_domain_name = None
+
+        if self.n_time_domain_samples > self.max_time_domain_samples:
+            if lalsim.SimInspiralImplementedFDApproximants(self._approx_lal):
+                self._frequency_domain_name = self.name
+            else:
+                self._frequency_domain_name = FREQUENCY_DOMAIN_EQUIVALENTS.get(self.name, None)
+
+            if self._frequency_domain_name is None:
+                logging.warning(
+                    f'The time series of {self.name} have {self.n_time_domain_samples} samples per polarization, '
+                    f'above max_time_domain_samples, but it has no frequency-domain equivalent.'
+                )
+            elif self._frequency_domain_name != self.name:
+                logging.warning(
+                    f'The time series of {self.name} would have {self.n_time_domain_samples} samples per polarization, '
+                    f'the frequency-domain polarizations are computed with {self._frequency_domain_name} instead.'
+                )
+
+        self.approximant_used = self.name if self._frequency_domain_name is None else self._frequency_domain_name
+
+    @property
+    def n_time_domain_samples(self):
+        """ Number of samples of each polarization after resizing to the observation time, as in `_ht_postproccessing_SimInspiralTD` """
+        return int(2 * self.f_nyquist / self.delta_f)
 
     def _setup_lal_caller_args(self):
         if lalsim.SimInspiralImplementedTDApproximants(self._approx_lal):
@@ -416,11 +1006,15 @@ class LALTD_Waveform(LALFD_Waveform):
         nn = self._lal_ht_cross.data.length
         return np.arange(t0, t0+nn*dt, dt)
 
-    def calculate_time_domain_strain(self):
+    def _calculate_lal_time_series(self):
         # Note, waveform below is already conditioned (tapered)
+        self._refresh_lal_caller_args()
         self._lal_ht_plus, self._lal_ht_cross = self._lalsim_caller(*self._lalsim_args)
 
         self._waveform_postprocessing()
+
+    def calculate_time_domain_strain(self):
+        self._calculate_lal_time_series()
     
         htp = self.ht_plus_out[:, np.newaxis]
         htc = self.ht_cross_out[:, np.newaxis]
@@ -471,17 +1065,37 @@ class LALTD_Waveform(LALFD_Waveform):
         Note, time-domain data is previously conditioned (tapered) in lalsim.SimInspiralTD,
         and resized in waveform.td_lal_caller(), as in lalsim.SimInspiralFD.
         """
-        if self.time_domain_strain is None:
-            self.calculate_time_domain_strain()
-        self._lal_hf_plus = fft.fft_lal_timeseries(self._lal_ht_plus, self.delta_f)
-        self._lal_hf_cross = fft.fft_lal_timeseries(self._lal_ht_cross, self.delta_f)
+        if self._frequency_domain_name is not None:
+            frequency_domain_waveform = LALFD_Waveform(self._frequency_domain_name, dict(self.gw_params), self.data_params)
+            self._frequency_domain_strain = frequency_domain_waveform()
+            return
 
-        self._hf_postproccessing_SimInspiralFD()
+        # the time series are computed without the stacked copy of `time_domain_strain`, unless it was requested
+        if self._time_domain_strain is None:
+            self._calculate_lal_time_series()
 
-        hfp, hfc = self._fd_phase_correction_geocent_time()
-        polarizations = self._fd_gwfish_output_format(hfp, hfc)
+        # both polarizations are transformed with the same cached plan, keeping only the bins of the frequency grid
+        self._update_frequency_range_indices()
+        in_band = fft.fft_lal_timeseries_in_band([self._lal_ht_plus, self._lal_ht_cross], self.idx_low, self.idx_high + 1)
+        self.hf_plus_out, self.hf_cross_out = in_band[:, 0], in_band[:, 1]
+
+        # the transforms have the epoch of the time series
+        self._lal_fd_phase_correction_by_epoch_and_df(self._lal_ht_plus.epoch)
+
+        # the two time series, and the transform of one of them at a time
+        n_samples = self._lal_ht_plus.data.length
+        self.time_domain_memory_estimate = 2 * n_samples * self._lal_ht_plus.data.data.itemsize + (n_samples // 2 + 1) * in_band.itemsize + in_band.nbytes
+        logging.info(
+            f'{self.name}: time series of {n_samples * self._lal_ht_plus.deltaT:.0f} s with {n_samples} samples per polarization, '
+            f'about {self.time_domain_memory_estimate / 2 ** 20:.0f} MB with their transforms'
+        )
 
-        self._frequency_domain_strain = polarizations
+        if self._time_domain_strain is None:
+            # the time series are no longer needed, and would be kept as long as the waveform is (e.g. in `Derivative`)
+            self._lal_ht_plus, self._lal_ht_cross = None, None
+            self.ht_plus_out, self.ht_cross_out = None, None
+
+        self._frequency_domain_strain = self._fd_gwfish_output_format()
 
 class TaylorF2(Waveform):
     """ GWFish implementation of TaylorF2 """
@@ -558,6 +1172,18 @@ class TaylorF2(Waveform):
     
         self.psi *= 3. / (128. * eta * v ** 5)
         self.psi += 2. * np.pi * ff * tc - phic - np.pi / 4.
+
+        # deviations from GR, only for the PN orders included in the phase
+        self._phase_derivatives = {
+            name: 3. / (128. * eta) * pp[:, k:k+1] * v ** (k - 5)
+            for name, k in PN_PHASE_DEVIATIONS.items() if k < self.maxn
+        }
+        if 'ppe_b' in self.gw_params:
+            self._phase_derivatives['ppe_beta'] = (np.pi * Mc * ff) ** (self.gw_params['ppe_b'] / 3.)
+
+        for name, derivative in self._phase_derivatives.items():
+            if self.gw_params.get(name, 0.) != 0.:
+                self.psi += self.gw_params[name] * derivative
     
         phase = np.exp(1.j * self.psi)
         polarizations = np.hstack((hp * phase, hc * 1.j * phase))
@@ -840,7 +1466,46 @@ class IMRPhenomD(Waveform):
        
         psi_tot = psi_ins + psi_int + psi_MR
         psi_prime_tot = psi_ins_gradient(ff)*theta_minus1+theta_minus2*psi_int_prime*theta_plus1+theta_plus2*psi_MR_prime
-    
+
+        # Deviations from GR in the inspiral phase (PN coefficients and ppE term):
+        # above f1 they are continued linearly, as the intermediate and merger-ringdown
+        # phases are joined to the inspiral one with continuous phase and derivative.
+        # Each entry is (coefficient, coefficient at f1, derivative of the coefficient at f1)
+        pn_coefficients = {
+            0: (phi_0, phi_0, 0.),
+            2: (phi_2, phi_2, 0.),
+            3: (phi_3, phi_3, 0.),
+            4: (phi_4, phi_4, 0.),
+            5: (phi_5, phi_5_f1, phi_5_f1/(1 + np.log(np.pi*f1))/f1),
+            6: (phi_6, phi_6_f1, -6848./63./f1),
+            7: (phi_7, phi_7, 0.),
+        }
+        deviation_terms = {}
+        for name, k in PN_PHASE_DEVIATIONS.items():
+            coefficient, coefficient_f1, coefficient_prime_f1 = pn_coefficients[k]
+            p = (k - 5.)/3.
+            deviation_terms[name] = (
+                3./(128.*eta)*coefficient*(np.pi*ff)**p,
+                3./(128.*eta)*coefficient_f1*(np.pi*f1)**p,
+                3./(128.*eta)*(np.pi*f1)**p*(coefficient_prime_f1 + coefficient_f1*p/f1),
+            )
+        if 'ppe_b' in self.gw_params:
+            b = self.gw_params['ppe_b']
+            # pi*Mc*f with f in Hz, i.e. pi*eta**(3/5)*ff
+            ppe_ratio = np.pi*Mc*cst.c**3/(cst.G*M)
+            deviation_terms['ppe_beta'] = (
+                (ppe_ratio*ff)**(b/3.),
+                (ppe_ratio*f1)**(b/3.),
+                b/3.*(ppe_ratio*f1)**(b/3.)/f1,
+            )
+
+        self._phase_derivatives = {
+            name: term*theta_minus1 + (term_f1 + term_prime_f1*(ff - f1))*theta_plus1
+            for name, (term, term_f1, term_prime_f1) in deviation_terms.items()
+        }
+        for name, derivative in self._phase_derivatives.items():
+            if self.gw_params.get(name, 0.) != 0.:
+                psi_tot = psi_tot + self.gw_params[name]*derivative
     
         # Construct the phase
         phase = np.exp(1.j * psi_tot)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from GWFish.modules.covariance import conditional_covariance, conditional_errors
+from GWFish.modules.storage import MatrixStore
+
+PARAMETER_NAMES = ['mass_1', 'mass_2', 'luminosity_distance', 'theta_jn', 'ra', 'dec']
+
+@pytest.fixture
+def fisher_matrices():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(20, len(PARAMETER_NAMES), 2 * len(PARAMETER_NAMES)))
+    scales = np.logspace(-2, 4, len(PARAMETER_NAMES))
+    return (vectors @ np.swapaxes(vectors, 1, 2)) * np.outer(scales, scales)
+
+def test_conditional_errors_match_reduced_fisher(fisher_matrices):
+
+    covariances = np.linalg.inv(fisher_matrices)
+
+    known = ['ra', 'dec']
+    remaining = [name for name in PARAMETER_NAMES if name not in known]
+    indices = [PARAMETER_NAMES.index(name) for name in remaining]
+
+    # knowing a parameter is equivalent to removing it from the Fisher matrix
+    reduced_covariances = np.linalg.inv(fisher_matrices[:, indices][:, :, indices])
+
+    conditional = conditional_covariance(covariances, PARAMETER_NAMES, remaining, known_parameters=known)
+    assert np.allclose(conditional, reduced_covariances, rtol=1e-8)
+
+    errors = conditional_errors(covariances, ['luminosity_distance', 'theta_jn'], known, parameter_names=PARAMETER_NAMES)
+    assert np.allclose(errors, np.sqrt(reduced_covariances[:, [2, 3], [2, 3]]), rtol=1e-8)
+
+    marginal = conditional_errors(covariances, ['ra'], parameter_names=PARAMETER_NAMES)
+    assert np.allclose(marginal[:, 0], np.sqrt(covariances[:, 4, 4]))
+
+def test_conditional_errors_from_store(fisher_matrices, tmp_path):
+
+    covariances = np.linalg.inv(fisher_matrices)
+    store = MatrixStore.create(tmp_path / 'inv_fisher_matrices', PARAMETER_NAMES)
+    store.append(covariances, index=np.arange(len(covariances)))
+
+    kwargs = dict(parameters=['mass_1', 'mass_2'], known_parameters=['luminosity_distance'])
+
+    assert np.allclose(
+        conditional_errors(store, block_size=7, **kwargs),
+        conditional_errors(covariances, parameter_names=PARAMETER_NAMES, **kwargs),
+    )
+
+def test_conditional_errors_invalid_parameters(fisher_matrices):
+
+    covariances = np.linalg.inv(fisher_matrices)
+
+    with pytest.raises(ValueError):
+        conditional_errors(covariances, ['chirp_mass'], parameter_names=PARAMETER_NAMES)
+    with pytest.raises(ValueError):
+        conditional_errors(covariances, ['ra'], ['ra'], parameter_names=PARAMETER_NAMES)
+    with pytest.raises(ValueError):
+        conditional_errors(covariances, ['ra'])
+
+def test_samples_match_covariance(fisher_matrices, tmp_path):
+
+    import pandas as pd
+    from GWFish.modules.covariance import sample_from_covariances
+
+    covariances = np.linalg.inv(fisher_matrices[:3])
+    values = pd.DataFrame(
+        np.tile([30., 20., 1e3, 1., 1., 0.], (3, 1)), columns=PARAMETER_NAMES, index=[5, 8, 13]
+    )
+
+    samples = sample_from_covariances(
+        covariances, values, 20_000, parameter_names=PARAMETER_NAMES, bounds={}, rng=np.random.default_rng(2), block_size=2
+    )
+    assert list(samples.columns) == ['event', 'sample'] + PARAMETER_NAMES
+
+    for i, event in enumerate(values.index):
+        event_samples = samples.loc[samples['event'] == event, PARAMETER_NAMES].to_numpy()
+        scale = np.sqrt(np.diag(covariances[i]))
+        assert np.all(np.abs(np.cov(event_samples.T) - covariances[i]) <= 0.05 * np.outer(scale, scale))
+        assert np.all(np.abs(event_samples.mean(axis=0) - values.loc[event].to_numpy()) <= 0.05 * scale)
+
+    # bounds are enforced, and the samples from a store are written to disk
+    store = MatrixStore.create(tmp_path / 'inv_fisher_matrices', PARAMETER_NAMES)
+    store.append(covariances, index=values.index)
+    sample_from_covariances(
+        store, values, 100, bounds={'mass_1': (29.99, 30.01), 'ra': (0.5, 1.5)}, rng=np.random.default_rng(2),
+        filename=tmp_path / 'samples.hdf5', block_size=2, max_redraws=2
+    )
+    written = pd.read_hdf(tmp_path / 'samples.hdf5', 'samples')
+    assert len(written) == 300
+    assert np.all(written['mass_1'].between(29.99, 30.01)) and np.all(written['ra'].between(0.5, 1.5))
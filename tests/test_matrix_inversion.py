@@ -12,7 +12,7 @@ from hypothesis import strategies as st
 from hypothesis import target
 from hypothesis.extra.numpy import arrays
 
-from GWFish.modules.fishermatrix import invertSVD
+from GWFish.modules.fishermatrix import invert_fisher_matrices, invertSVD
 
 MATRIX_DIMENSION = 4
 ABS_TOLERANCE = 1e-1
@@ -58,4 +58,47 @@ def test_matrix_inversion_hypothesis(vector_norms, cosines):
     matrix = np.outer(vector_norms, vector_norms) * cosines
     pseudo_inverse, _ = invertSVD(matrix)
 
-    assert_matrix_pseudo_inverse_correctness(matrix, pseudo_inverse)
\ No newline at end of file
+    assert_matrix_pseudo_inverse_correctness(matrix, pseudo_inverse)
+
+@seed(1)
+@given(
+    vector_norms=arrays(
+        np.float64,
+        (MATRIX_DIMENSION,),
+        elements=st.floats(
+            min_value=MIN_NORM,
+            max_value=MAX_NORM,
+        ),
+        unique=True,
+    ),
+    cosines=arrays(
+        np.float64,
+        (MATRIX_DIMENSION, MATRIX_DIMENSION),
+        elements=st.floats(
+            min_value=-1.0,
+            max_value=1.0,
+        ),
+        unique=True,
+    ),
+)
+def test_batched_inversion_matches_invertSVD(vector_norms, cosines):
+
+    cosines[np.arange(MATRIX_DIMENSION), np.arange(MATRIX_DIMENSION)] = 1
+    cosines = np.maximum(cosines, cosines.T)
+
+    matrix = np.outer(vector_norms, vector_norms) * cosines
+    # a well-conditioned matrix, which takes the Cholesky path, alongside the random one
+    matrices = np.stack([matrix, np.diag(vector_norms**2)])
+
+    inverses, condition_numbers, n_kept = invert_fisher_matrices(matrices)
+
+    for stacked_matrix, inverse in zip(matrices, inverses):
+        assert_matrix_pseudo_inverse_correctness(stacked_matrix, inverse)
+
+    reference, singular_values = invertSVD(matrix)
+    scale = np.outer(1 / vector_norms, 1 / vector_norms)
+    assert np.allclose(inverses[0] / scale, reference / scale, atol=1e-6 * np.max(np.abs(reference / scale)))
+    assert n_kept[0] == np.sum(singular_values > 1e-10)
+    assert n_kept[1] == MATRIX_DIMENSION
+    # the condition number in the Frobenius norm, of the identity once normalized
+    assert np.isclose(condition_numbers[1], MATRIX_DIMENSION)
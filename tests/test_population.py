@@ -0,0 +1,556 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import GWFish.modules.waveforms as waveforms
+from GWFish.modules.detection import Network
+from GWFish.modules.auxiliary import fisco
+from GWFish.modules.fishermatrix import _detector_on_grid, adaptive_frequency_grid, compute_network_errors
+from GWFish.modules.storage import MatrixStore
+
+BASE_PATH = Path(__file__).parent.parent
+
+FISHER_PARAMETERS = [
+    'mass_1',
+    'mass_2',
+    'luminosity_distance',
+    'theta_jn',
+    'dec',
+    'ra',
+    'psi',
+    'phase',
+    'geocent_time',
+]
+
+def assert_matrices_close(matrices, reference, tolerance):
+    # entries are compared relative to the scale set by the diagonal,
+    # since nearly-vanishing correlations are sensitive to rounding
+    scale = np.sqrt(np.abs(np.einsum('...ii->...i', reference)))
+    assert np.all(np.abs(matrices - reference) <= tolerance * scale[..., :, None] * scale[..., None, :])
+
+@pytest.fixture
+def bbh_population():
+    return pd.read_hdf(BASE_PATH / 'injections/BBH_pop_test.hdf5').iloc[:4]
+
+@pytest.mark.parametrize('use_duty_cycle', [False, True])
+def test_parallel_population_matches_serial(bbh_population, use_duty_cycle):
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    kwargs = dict(
+        fisher_parameters=FISHER_PARAMETERS,
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        use_duty_cycle=use_duty_cycle,
+    )
+
+    np.random.seed(42)
+    serial = compute_network_errors(network, bbh_population, **kwargs)
+
+    np.random.seed(42)
+    parallel = compute_network_errors(network, bbh_population, n_workers=2, chunk_size=1, **kwargs)
+
+    for serial_result, parallel_result in zip(serial, parallel):
+        assert np.array_equal(serial_result, parallel_result, equal_nan=True)
+
+def test_checkpointed_population_resumes(bbh_population, tmp_path, monkeypatch):
+
+    import GWFish.modules.fishermatrix as fishermatrix
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    kwargs = dict(
+        fisher_parameters=FISHER_PARAMETERS,
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        chunk_size=2,
+        checkpoint_path=tmp_path,
+    )
+
+    first = compute_network_errors(network, bbh_population, **kwargs)
+
+    chunk_files = sorted(tmp_path.glob('*/chunk_*.npz'))
+    assert len(chunk_files) == 2
+
+    # simulate a run interrupted after the first chunk
+    chunk_files[1].unlink()
+    resumed = compute_network_errors(network, bbh_population, **kwargs)
+    assert chunk_files[1].exists()
+
+    # with all chunks on disk nothing is computed again
+    def fail(*args, **kwargs):
+        raise AssertionError('chunk recomputed')
+    monkeypatch.setattr(fishermatrix, '_compute_signals_errors', fail)
+    reloaded = compute_network_errors(network, bbh_population, **kwargs)
+
+    for result in [resumed, reloaded]:
+        assert np.array_equal(first[0], result[0])
+        assert np.array_equal(first[1], result[1])
+        assert np.allclose(first[2], result[2], rtol=1e-6, atol=0)
+        assert np.allclose(first[3], result[3], rtol=1e-6, atol=0)
+
+def test_checkpointed_population_with_non_numeric_columns(bbh_population, tmp_path):
+
+    from GWFish.modules.storage import population_fingerprint
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+    population = bbh_population.iloc[:2].assign(name=['GW000001', 'GW000002'])
+
+    kwargs = dict(
+        fisher_parameters=FISHER_PARAMETERS,
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        chunk_size=1,
+        checkpoint_path=tmp_path,
+    )
+
+    first = compute_network_errors(network, population, **kwargs)
+    assert len(list(tmp_path.glob('*/chunk_*.npz'))) == 2
+    reloaded = compute_network_errors(network, population, **kwargs)
+
+    for first_result, reloaded_result in zip(first, reloaded):
+        assert np.array_equal(first_result, reloaded_result)
+
+    # the non-numeric columns are part of the fingerprint
+    renamed = population.assign(name=['GW000001', 'GW000003'])
+    assert population_fingerprint(population, ['ET'], (8., 10.)) != population_fingerprint(renamed, ['ET'], (8., 10.))
+
+def test_streamed_population_matches_in_memory(bbh_population, tmp_path):
+
+    from GWFish.modules.fishermatrix import analyze_and_save_to_txt
+
+    population_file = tmp_path / 'population.hdf5'
+    bbh_population.iloc[:3].to_hdf(population_file, 'population', format='table')
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    kwargs = dict(
+        sub_network_ids_list=[[0], [0, 1]],
+        population_name='test',
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        save_matrices=True,
+    )
+
+    analyze_and_save_to_txt(network, bbh_population.iloc[:3], list(FISHER_PARAMETERS), save_path=tmp_path / 'memory', **kwargs)
+    analyze_and_save_to_txt(network, population_file, list(FISHER_PARAMETERS), save_path=tmp_path / 'streamed', population_chunk_size=2, **kwargs)
+
+    for name in ['Errors_ET_test_SNR10.txt', 'Errors_ET_CE1_test_SNR10.txt']:
+        in_memory = np.loadtxt(tmp_path / 'memory' / name, skiprows=1)
+        streamed = np.loadtxt(tmp_path / 'streamed' / name, skiprows=1)
+        assert np.allclose(in_memory, streamed, rtol=1e-3, atol=0)
+
+    for name in ['fisher_matrices_ET_CE1_test_SNR10', 'inv_fisher_matrices_ET_CE1_test_SNR10']:
+        assert_matrices_close(np.load(tmp_path / 'streamed' / f'{name}.npy'), np.load(tmp_path / 'memory' / f'{name}.npy'), 1e-6)
+
+    # other columns of a catalog are not loaded
+    catalog_file = tmp_path / 'catalog.hdf5'
+    bbh_population.iloc[:3].assign(name=['a', 'b', 'c']).to_hdf(catalog_file, 'population', format='table')
+    analyze_and_save_to_txt(
+        network, catalog_file, list(FISHER_PARAMETERS), save_path=tmp_path / 'catalog',
+        population_chunk_size=2, population_columns=list(bbh_population.columns), **kwargs
+    )
+    for name in ['Errors_ET_test_SNR10.txt', 'Errors_ET_CE1_test_SNR10.txt']:
+        assert np.allclose(np.loadtxt(tmp_path / 'catalog' / name, skiprows=1), np.loadtxt(tmp_path / 'streamed' / name, skiprows=1), rtol=1e-3, atol=0)
+
+    with pytest.raises(ValueError):
+        analyze_and_save_to_txt(network, catalog_file, list(FISHER_PARAMETERS), population_columns=['mass_1', 'mass_2'], **kwargs)
+
+    # only the documented options of compute_network_errors are accepted
+    with pytest.raises(TypeError):
+        analyze_and_save_to_txt(network, population_file, list(FISHER_PARAMETERS), early_warning_times=[60.], **kwargs)
+
+def test_matrix_store_matches_npy(bbh_population, tmp_path):
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    kwargs = dict(
+        fisher_parameters=FISHER_PARAMETERS,
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        save_matrices=True,
+        save_matrices_path=tmp_path,
+        chunk_size=2,
+    )
+
+    detected, _, _, _ = compute_network_errors(network, bbh_population, matrix_naming_postfix='npy', **kwargs)
+    compute_network_errors(network, bbh_population, matrix_naming_postfix='store', matrix_format='store', **kwargs)
+    compute_network_errors(network, bbh_population, matrix_naming_postfix='store32', matrix_format='store', matrix_dtype='float32', **kwargs)
+
+    for name in ['fisher_matrices', 'inv_fisher_matrices']:
+        matrices = np.load(tmp_path / f'{name}_npy.npy')
+        store = MatrixStore(tmp_path / f'{name}_store')
+        store32 = MatrixStore(tmp_path / f'{name}_store32')
+
+        assert len(store) == len(detected)
+        assert np.array_equal(store.index, bbh_population.index[detected])
+        assert store.parameter_names == FISHER_PARAMETERS
+        assert store32[:].dtype == np.float32
+        assert_matrices_close(store[:], matrices, 1e-8)
+        assert_matrices_close(store32[:], matrices, 1e-6)
+
+def test_population_file_store_without_fisher_parameters(bbh_population, tmp_path):
+
+    from GWFish.modules.fishermatrix import analyze_and_save_to_txt
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    kwargs = dict(
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        save_matrices=True,
+    )
+
+    population_file = tmp_path / 'population.hdf5'
+    bbh_population.iloc[:3][FISHER_PARAMETERS].to_hdf(population_file, 'population')
+
+    # the Fisher parameters are the columns of the file
+    analyze_and_save_to_txt(
+        network, population_file, None, [[0, 1]], 'test', save_path=tmp_path,
+        population_chunk_size=2, matrix_format='store', **kwargs
+    )
+    compute_network_errors(
+        network, bbh_population.iloc[:3], FISHER_PARAMETERS, save_matrices_path=tmp_path, matrix_naming_postfix='npy', **kwargs
+    )
+
+    for name in ['fisher_matrices', 'inv_fisher_matrices']:
+        store = MatrixStore(tmp_path / f'{name}_ET_CE1_test_SNR10')
+        assert store.parameter_names == FISHER_PARAMETERS
+        assert_matrices_close(store[:], np.load(tmp_path / f'{name}_npy.npy'), 1e-8)
+
+def test_hdf5_output_matches_txt(bbh_population, tmp_path):
+
+    from GWFish.modules.fishermatrix import analyze_and_save_to_txt
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    kwargs = dict(
+        sub_network_ids_list=[[0, 1]],
+        population_name='test',
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        save_path=tmp_path,
+    )
+
+    population_file = tmp_path / 'population.hdf5'
+    bbh_population.iloc[:3].to_hdf(population_file, 'population')
+
+    analyze_and_save_to_txt(network, bbh_population.iloc[:3], list(FISHER_PARAMETERS), **kwargs)
+    analyze_and_save_to_txt(network, population_file, list(FISHER_PARAMETERS), population_chunk_size=2, output_format='hdf5', **kwargs)
+
+    text = pd.read_csv(tmp_path / 'Errors_ET_CE1_test_SNR10.txt', sep=' ')
+    table = pd.read_hdf(tmp_path / 'Errors_ET_CE1_test_SNR10.hdf5', 'errors')
+
+    assert list(table.columns) == list(text.columns)
+    assert np.all(table.index.isin(bbh_population.index))
+    assert np.allclose(table.to_numpy(), text.to_numpy(), rtol=1e-3, atol=0)
+
+def test_shared_parameter_errors_match_saved_matrices(bbh_population, tmp_path):
+
+    from GWFish.modules.fishermatrix import compute_shared_parameter_errors, marginalize_fisher_matrices
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    kwargs = dict(
+        fisher_parameters=FISHER_PARAMETERS,
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+    )
+    shared_parameters = ['luminosity_distance', 'theta_jn']
+
+    compute_network_errors(network, bbh_population, save_matrices=True, save_matrices_path=tmp_path, **kwargs)
+    fisher_matrices = np.load(tmp_path / 'fisher_matrices.npy')
+
+    shared_fisher = compute_shared_parameter_errors(
+        network, bbh_population, shared_parameters, n_workers=2, chunk_size=1, **kwargs
+    )
+
+    indices = [FISHER_PARAMETERS.index(parameter) for parameter in shared_parameters]
+    cumulative = np.cumsum(marginalize_fisher_matrices(fisher_matrices, indices), axis=0)
+    expected_errors = np.sqrt(np.einsum('...ii->...i', np.linalg.inv(cumulative)))
+
+    assert shared_fisher.n_signals == len(fisher_matrices)
+    assert_matrices_close(shared_fisher.fisher_matrix, cumulative[-1], 1e-6)
+    assert np.allclose(shared_fisher.cumulative_errors, expected_errors, rtol=1e-5)
+    assert np.allclose(shared_fisher.errors, expected_errors[-1], rtol=1e-5)
+
+def test_sweep_errors_match_single_deviation_runs(bbh_population):
+
+    from GWFish.modules.fishermatrix import compute_sweep_errors
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+    population = bbh_population.iloc[:2]
+
+    kwargs = dict(
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+    )
+    sweep_parameters = ['delta_phi_0', 'delta_phi_3', 'delta_phi_6']
+
+    _, network_snr, sweep_errors = compute_sweep_errors(
+        network, population, sweep_parameters, list(FISHER_PARAMETERS), n_workers=2, chunk_size=1, **kwargs
+    )
+
+    for i, parameter in enumerate(sweep_parameters):
+        _, snr, errors, _ = compute_network_errors(
+            network, population, fisher_parameters=FISHER_PARAMETERS + [parameter], **kwargs
+        )
+        assert np.array_equal(snr, network_snr)
+        assert np.allclose(sweep_errors[:, i], errors[:, -1], rtol=1e-5)
+
+def test_bias_of_deviation_parameter(bbh_population):
+
+    from GWFish.modules.fishermatrix import compute_network_biases
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+    population = bbh_population.iloc[:2]
+    fisher_parameters = FISHER_PARAMETERS + ['delta_phi_2']
+    deviation = 1e-8
+
+    # a true signal differing from the template by a small change of a Fisher parameter
+    # is recovered at the value of that parameter in the true signal, at linear order
+    _, _, errors, _, biases = compute_network_biases(
+        network, population, fisher_parameters,
+        true_parameters={'delta_phi_2': deviation},
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        n_workers=2,
+        chunk_size=1,
+    )
+
+    assert np.allclose(biases[:, -1], deviation, rtol=1e-3)
+    assert np.all(np.abs(biases[:, :-1]) < 1e-3 * deviation / errors[:, -1:] * errors[:, :-1])
+
+def test_early_warning_matches_frequency_cutoff(bbh_population):
+
+    from GWFish.modules.fishermatrix import compute_early_warning_errors
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+    signal = bbh_population.iloc[:1]
+
+    kwargs = dict(
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+    )
+
+    # the times at which the signal reaches these frequencies, which lie between grid points
+    max_frequencies = np.array([12.03, 20.07])
+    times_before_merger = signal['geocent_time'].iloc[0] - waveforms.t_of_f_PN(signal.iloc[0], max_frequencies)
+
+    _, network_snr, early_warning_snr, early_warning_errors, early_warning_sky = compute_early_warning_errors(
+        network, signal, times_before_merger, list(FISHER_PARAMETERS), **kwargs
+    )
+
+    assert np.all(np.diff(early_warning_snr[0]) > 0)
+    assert early_warning_snr[0, -1] < network_snr[0]
+
+    for i, max_frequency in enumerate(max_frequencies):
+        cut_signal = signal.assign(max_frequency_cutoff=max_frequency)
+        _, snr, errors, sky = compute_network_errors(network, cut_signal, list(FISHER_PARAMETERS), **kwargs)
+
+        assert np.allclose(early_warning_snr[:, i], snr, rtol=1e-10)
+        assert np.allclose(early_warning_errors[:, i], errors, rtol=1e-6)
+        assert np.allclose(early_warning_sky[:, i], sky, rtol=1e-6)
+
+def test_multiband_network_matches_separate_waveforms():
+
+    class CountingTaylorF2(waveforms.TaylorF2):
+        n_evaluations = 0
+
+        def calculate_frequency_domain_strain(self):
+            CountingTaylorF2.n_evaluations += 1
+            super().calculate_frequency_domain_strain()
+
+    # binaries observed by LISA years before merging in the band of ET
+    population = pd.DataFrame({
+        'mass_1': [60., 40.],
+        'mass_2': [50., 35.],
+        'luminosity_distance': [200., 300.],
+        'theta_jn': [0.5, 1.],
+        'dec': [0.3, -0.5],
+        'ra': [1., 2.],
+        'psi': [0.2, 0.4],
+        'phase': [0.1, 0.7],
+        'geocent_time': [1.9e9, 1.95e9],
+    })
+    network = Network(['LISA', 'ET'], detection_SNR=(0., 10.))
+
+    results = {}
+    n_evaluations = {}
+    for multiband in [False, True]:
+        CountingTaylorF2.n_evaluations = 0
+        results[multiband] = compute_network_errors(
+            network, population, list(population.columns),
+            waveform_model='TaylorF2', waveform_class=CountingTaylorF2, multiband=multiband,
+        )
+        n_evaluations[multiband] = CountingTaylorF2.n_evaluations
+
+    # one waveform, and two for each numerical derivative (mass_1, mass_2, theta_jn), per signal
+    assert n_evaluations[True] == len(population) * (1 + 2 * 3)
+    assert n_evaluations[False] > n_evaluations[True]
+
+    assert np.array_equal(results[True][0], results[False][0])
+    assert np.allclose(results[True][1], results[False][1], rtol=1e-10)
+    assert np.allclose(results[True][2], results[False][2], rtol=1e-6)
+    assert np.allclose(results[True][3], results[False][3], rtol=1e-6)
+
+    # waveforms which depend on the resolution and range of the grid are rejected
+    for waveform_model, waveform_class in [
+        ('IMRPhenomT', waveforms.LALTD_Waveform),
+        ('IMRPhenomXAS', waveforms.LALTD_Waveform),
+        ('IMRPhenomT', waveforms.LALFD_Waveform),
+    ]:
+        with pytest.raises(ValueError):
+            compute_network_errors(
+                network, population, list(population.columns),
+                waveform_model=waveform_model, waveform_class=waveform_class, multiband=True,
+            )
+
+def test_detectors_with_same_grid_share_waveforms(bbh_population, tmp_path):
+
+    class CountingTaylorF2(waveforms.TaylorF2):
+        n_evaluations = 0
+
+        def calculate_frequency_domain_strain(self):
+            CountingTaylorF2.n_evaluations += 1
+            super().calculate_frequency_domain_strain()
+
+    population = bbh_population.iloc[:2]
+    kwargs = dict(
+        waveform_model='TaylorF2',
+        waveform_class=CountingTaylorF2,
+        save_matrices=True,
+        save_matrices_path=tmp_path,
+    )
+    detector_names = ['CE1', 'CE2', 'LLO']
+
+    CountingTaylorF2.n_evaluations = 0
+    compute_network_errors(Network(detector_names, detection_SNR=(0., 0.)), population, list(FISHER_PARAMETERS), matrix_naming_postfix='network', **kwargs)
+    n_network_evaluations = CountingTaylorF2.n_evaluations
+
+    fisher_matrices = 0.
+    for name in detector_names:
+        CountingTaylorF2.n_evaluations = 0
+        compute_network_errors(Network([name], detection_SNR=(0., 0.)), population, list(FISHER_PARAMETERS), matrix_naming_postfix=name, **kwargs)
+        fisher_matrices = fisher_matrices + np.load(tmp_path / f'fisher_matrices_{name}.npy')
+
+    # the three detectors have the same frequency grid: for each signal, one waveform 
+    # and two for each numerical derivative (mass_1, mass_2, theta_jn) are computed for all of them,
+    # fewer than for a single detector, where compute_detector_fisher and Derivative compute the waveform each
+    assert n_network_evaluations == len(population) * (1 + 2 * 3)
+    assert CountingTaylorF2.n_evaluations == len(population) * (2 + 2 * 3)
+    assert_matrices_close(np.load(tmp_path / 'fisher_matrices_network.npy'), fisher_matrices, 1e-12)
+
+def test_adaptive_grids_match_fine_grids(bbh_population, tmp_path):
+
+    population = bbh_population.iloc[:2]
+    kwargs = dict(
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        save_matrices=True,
+        save_matrices_path=tmp_path,
+    )
+
+    network = Network(['ET', 'CE1'], detection_SNR=(0., 0.))
+    _, snr, _, _ = compute_network_errors(network, population, list(FISHER_PARAMETERS), matrix_naming_postfix='adaptive', adaptive_grid_tolerance=1e-3, **kwargs)
+
+    # the reference runs on grids much finer than the default ones of the detectors
+    fine_network = Network(['ET', 'CE1'], detection_SNR=(0., 0.))
+    fine_network.detectors = [
+        _detector_on_grid(detector, np.geomspace(detector.frequencyvector[0, 0], detector.frequencyvector[-1, 0], 50_000))
+        for detector in fine_network.detectors
+    ]
+    _, fine_snr, _, _ = compute_network_errors(fine_network, population, list(FISHER_PARAMETERS), matrix_naming_postfix='fine', **kwargs)
+
+    assert np.allclose(snr, fine_snr, rtol=1e-3)
+    assert_matrices_close(np.load(tmp_path / 'fisher_matrices_adaptive.npy'), np.load(tmp_path / 'fisher_matrices_fine.npy'), 1e-3)
+
+    for detector, signal_parameter_values in zip(network.detectors, [population.iloc[0], population.iloc[1]]):
+        grid = adaptive_frequency_grid(detector, signal_parameter_values, 'TaylorF2', waveforms.TaylorF2)
+        # TaylorF2 vanishes above four times the ISCO frequency, which is the edge of the band
+        # up to the spacing of the grid of the detector
+        frequencyvector = detector.frequencyvector[:, 0]
+        assert grid[-1] <= frequencyvector[np.searchsorted(frequencyvector, 4 * fisco(signal_parameter_values))]
+        assert len(grid) < len(frequencyvector)
+
+def test_adaptive_grids_compute_each_frequency_once(bbh_population):
+
+    class CountingTaylorF2(waveforms.TaylorF2):
+        n_frequencies = 0
+
+        def calculate_frequency_domain_strain(self):
+            CountingTaylorF2.n_frequencies += len(self.frequencyvector)
+            super().calculate_frequency_domain_strain()
+
+    population = bbh_population.iloc[:2]
+    network = Network(['ET', 'CE1'], detection_SNR=(0., 0.))
+
+    for detector in network.detectors:
+        CountingTaylorF2.n_frequencies = 0
+        grid = adaptive_frequency_grid(detector, population.iloc[0], 'TaylorF2', CountingTaylorF2)
+        # the band is chosen on the grid of the detector, and each point
+        # of the last refined grid is computed once along the refinements
+        assert CountingTaylorF2.n_frequencies == len(detector.frequencyvector) + 2 * len(grid) - 1
+
+    CountingTaylorF2.n_frequencies = 0
+    compute_network_errors(network, population, list(FISHER_PARAMETERS), waveform_model='TaylorF2', waveform_class=CountingTaylorF2)
+    n_fixed_grid_frequencies = CountingTaylorF2.n_frequencies
+
+    # the choice of the grids included, the waveforms are computed at fewer frequencies than on the fixed grids
+    CountingTaylorF2.n_frequencies = 0
+    compute_network_errors(
+        network, population, list(FISHER_PARAMETERS), waveform_model='TaylorF2', waveform_class=CountingTaylorF2, adaptive_grid_tolerance=1e-2
+    )
+    assert CountingTaylorF2.n_frequencies < n_fixed_grid_frequencies
+
+def test_interpolated_waveforms_match_exact(bbh_population, tmp_path):
+
+    kwargs = dict(
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        save_matrices=True,
+        save_matrices_path=tmp_path,
+    )
+
+    network = Network(['ET', 'CE1'], detection_SNR=(0., 0.))
+    _, snr, _, _ = compute_network_errors(network, bbh_population, list(FISHER_PARAMETERS), matrix_naming_postfix='interpolated', interpolation_tolerance=1e-4, **kwargs)
+    _, exact_snr, _, _ = compute_network_errors(network, bbh_population, list(FISHER_PARAMETERS), matrix_naming_postfix='exact', **kwargs)
+
+    assert np.allclose(snr, exact_snr, rtol=1e-4)
+    assert_matrices_close(np.load(tmp_path / 'fisher_matrices_interpolated.npy'), np.load(tmp_path / 'fisher_matrices_exact.npy'), 1e-3)
+
+def test_relative_binning_matches_full_grid(bbh_population, tmp_path):
+
+    kwargs = dict(
+        waveform_model='TaylorF2',
+        waveform_class=waveforms.TaylorF2,
+        save_matrices=True,
+        save_matrices_path=tmp_path,
+    )
+
+    network = Network(['ET', 'CE1', 'CE2'], detection_SNR=(0., 0.))
+    _, snr, _, _ = compute_network_errors(network, bbh_population, list(FISHER_PARAMETERS), matrix_naming_postfix='binned', relative_binning_width=0.02, **kwargs)
+    _, exact_snr, _, _ = compute_network_errors(network, bbh_population, list(FISHER_PARAMETERS), matrix_naming_postfix='exact', **kwargs)
+
+    assert np.allclose(snr, exact_snr, rtol=1e-10)
+    assert_matrices_close(np.load(tmp_path / 'fisher_matrices_binned.npy'), np.load(tmp_path / 'fisher_matrices_exact.npy'), 1e-3)
+
+def test_single_precision_matches_double(tmp_path):
+
+    population = pd.read_hdf(BASE_PATH / 'test_data/test_data.hdf5').iloc[:4]
+
+    kwargs = dict(
+        waveform_model='IMRPhenomD',
+        save_matrices=True,
+        save_matrices_path=tmp_path,
+    )
+
+    network = Network(['ET', 'CE1'], detection_SNR=(0., 0.))
+    _, snr, errors, _ = compute_network_errors(network, population, list(FISHER_PARAMETERS), matrix_naming_postfix='single', signal_dtype='complex64', **kwargs)
+    _, double_snr, double_errors, _ = compute_network_errors(network, population, list(FISHER_PARAMETERS), matrix_naming_postfix='double', **kwargs)
+
+    assert np.allclose(snr, double_snr, rtol=1e-6)
+    assert_matrices_close(np.load(tmp_path / 'fisher_matrices_single.npy'), np.load(tmp_path / 'fisher_matrices_double.npy'), 1e-6)
+    assert np.allclose(errors, double_errors, rtol=1e-5)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+from astropy.cosmology import Planck18
+
+import GWFish.modules.waveforms as waveforms
+from GWFish.modules.detection import Detector
+from GWFish.modules.fishermatrix import compute_detector_fisher
+from GWFish.modules.reparameterization import (
+    TRANSFORMATIONS,
+    reparameterization_jacobian,
+    reparameterize_covariance,
+    reparameterize_fisher,
+)
+
+PARAMETER_NAMES = ['mass_1', 'mass_2', 'luminosity_distance', 'a_1', 'a_2', 'theta_jn']
+
+@pytest.fixture
+def parameter_values():
+    return pd.DataFrame({
+        'mass_1': [30., 1.6, 80.],
+        'mass_2': [20., 1.3, 10.],
+        'luminosity_distance': [400., 40., 20_000.],
+        'a_1': [0.3, 0.01, -0.7],
+        'a_2': [-0.2, 0.02, 0.1],
+        'theta_jn': [0.5, 2.6, 1.],
+    })
+
+def new_values(values, transformations):
+    values = {key: np.asarray(value, dtype=float) for key, value in values.items()}
+    for transformation in transformations:
+        _, new_names, new_parameter_values, _ = TRANSFORMATIONS[transformation](values, Planck18)
+        values.update(zip(new_names, new_parameter_values))
+    return values
+
+@pytest.mark.parametrize('transformations', [
+    ['chirp_mass_mass_ratio'],
+    ['source_frame'],
+    ['aligned_spins', 'source_frame', 'source_chirp_mass_mass_ratio'],
+])
+def test_jacobian_matches_finite_differences(parameter_values, transformations):
+
+    jacobian, new_names = reparameterization_jacobian(PARAMETER_NAMES, parameter_values, transformations)
+
+    for j, name in enumerate(PARAMETER_NAMES):
+        step = 1e-6 * np.abs(parameter_values[name].to_numpy()) + 1e-9
+        plus, minus = parameter_values.copy(), parameter_values.copy()
+        plus[name] += step
+        minus[name] -= step
+        values_plus = new_values(plus, transformations)
+        values_minus = new_values(minus, transformations)
+
+        for i, new_name in enumerate(new_names):
+            numerical = (values_plus[new_name] - values_minus[new_name]) / (2 * step)
+            assert np.allclose(jacobian[:, i, j], numerical, rtol=1e-5, atol=1e-8)
+
+def test_fisher_and_covariance_transform_consistently(parameter_values):
+
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(3, len(PARAMETER_NAMES), 10))
+    fisher = vectors @ np.swapaxes(vectors, 1, 2)
+
+    transformations = ['aligned_spins', 'chirp_mass_mass_ratio']
+    new_fisher, names = reparameterize_fisher(fisher, PARAMETER_NAMES, parameter_values, transformations)
+    new_covariance, covariance_names = reparameterize_covariance(np.linalg.inv(fisher), PARAMETER_NAMES, parameter_values, transformations)
+
+    assert names == covariance_names == ['chirp_mass', 'mass_ratio', 'luminosity_distance', 'chi_eff', 'chi_a', 'theta_jn']
+    assert np.allclose(np.linalg.inv(new_fisher), new_covariance, rtol=1e-8)
+
+def test_invalid_transformations(parameter_values):
+
+    with pytest.raises(ValueError):
+        reparameterization_jacobian(PARAMETER_NAMES, parameter_values, ['total_mass'])
+    with pytest.raises(ValueError):
+        reparameterization_jacobian(['mass_1', 'theta_jn'], parameter_values, ['chirp_mass_mass_ratio'])
+    with pytest.raises(ValueError):
+        reparameterization_jacobian(PARAMETER_NAMES, parameter_values, ['chirp_mass_mass_ratio', 'aligned_spins'])
+
+def test_reparameterized_fisher_matches_direct_computation():
+
+    detector = Detector('ET')
+
+    params = {
+        'mass_1': 30.,
+        'mass_2': 20.,
+        'luminosity_distance': 500.,
+        'theta_jn': 0.5,
+        'ra': 1.,
+        'dec': 0.3,
+        'phase': 0.,
+        'psi': 0.,
+        'geocent_time': 1.8e9,
+    }
+    fisher_parameters = ['mass_1', 'mass_2', 'luminosity_distance', 'theta_jn']
+
+    fisher_masses, _ = compute_detector_fisher(detector, params, fisher_parameters, 'TaylorF2', waveforms.TaylorF2)
+
+    params_chirp = dict(params)
+    m1, m2 = params_chirp.pop('mass_1'), params_chirp.pop('mass_2')
+    params_chirp['chirp_mass'] = (m1 * m2)**(3/5) / (m1 + m2)**(1/5)
+    params_chirp['mass_ratio'] = m2 / m1
+    fisher_chirp, _ = compute_detector_fisher(
+        detector, params_chirp, ['chirp_mass', 'mass_ratio', 'luminosity_distance', 'theta_jn'], 'TaylorF2', waveforms.TaylorF2
+    )
+
+    reparameterized, _ = reparameterize_fisher(
+        fisher_masses[np.newaxis], fisher_parameters, pd.DataFrame([params]), ['chirp_mass_mass_ratio']
+    )
+
+    assert np.allclose(
+        np.sqrt(np.diag(np.linalg.inv(reparameterized[0]))),
+        np.sqrt(np.diag(np.linalg.inv(fisher_chirp))),
+        rtol=1e-2,
+    )
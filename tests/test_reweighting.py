@@ -0,0 +1,133 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import GWFish.modules.waveforms as waveforms
+from GWFish.modules.detection import Network
+from GWFish.modules.fishermatrix import compute_network_errors
+from GWFish.modules.reweighting import reweighted_network_errors
+from GWFish.modules.storage import DerivativeStore
+
+BASE_PATH = Path(__file__).parent.parent
+
+FISHER_PARAMETERS = [
+    'mass_1',
+    'mass_2',
+    'luminosity_distance',
+    'theta_jn',
+    'dec',
+    'ra',
+    'psi',
+    'phase',
+    'geocent_time',
+]
+
+KWARGS = dict(
+    waveform_model='TaylorF2',
+    waveform_class=waveforms.TaylorF2,
+)
+
+@pytest.fixture
+def bbh_population():
+    return pd.read_hdf(BASE_PATH / 'injections/BBH_pop_test.hdf5').iloc[:3]
+
+def test_reweighted_errors_match_recomputed(bbh_population, tmp_path):
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    _, snr, errors, sky = compute_network_errors(
+        network, bbh_population, list(FISHER_PARAMETERS), derivatives_path=tmp_path / 'derivatives',
+        n_workers=2, chunk_size=1, **KWARGS
+    )
+    compute_network_errors(
+        network, bbh_population, list(FISHER_PARAMETERS), derivatives_path=tmp_path / 'derivatives64',
+        derivatives_dtype='complex64', **KWARGS
+    )
+
+    store = DerivativeStore(tmp_path / 'derivatives')
+    assert len(store) == 2 * len(bbh_population)
+    assert np.array_equal(store.records[:, 0], np.repeat(bbh_population.index, 2))
+
+    _, reweighted_snr, reweighted_errors, reweighted_sky = reweighted_network_errors(store, network, bbh_population)
+    assert np.allclose(reweighted_snr, snr, rtol=1e-10)
+    assert np.allclose(reweighted_errors, errors, rtol=1e-6)
+    assert np.allclose(reweighted_sky, sky, rtol=1e-6)
+
+    _, snr64, errors64, _ = reweighted_network_errors(tmp_path / 'derivatives64', network, bbh_population)
+    assert np.allclose(snr64, snr, rtol=1e-5)
+    assert np.allclose(errors64, errors, rtol=1e-2)
+
+    # a better ET noise, and a cut of the signals at 20 Hz
+    for component in network.detectors[0].components:
+        component.Sn = lambda frequencies, Sn=component.Sn: Sn(frequencies) / 4.
+    cut_population = bbh_population.assign(max_frequency_cutoff=20.07)
+
+    _, snr, errors, sky = compute_network_errors(network, cut_population, list(FISHER_PARAMETERS), **KWARGS)
+    _, reweighted_snr, reweighted_errors, reweighted_sky = reweighted_network_errors(
+        store, network, bbh_population, max_frequency=20.07
+    )
+    assert np.allclose(reweighted_snr, snr, rtol=1e-10)
+    assert np.allclose(reweighted_errors, errors, rtol=1e-6)
+    assert np.allclose(reweighted_sky, sky, rtol=1e-6)
+
+def test_population_file_derivatives_match_dataframe(bbh_population, tmp_path):
+
+    from GWFish.modules.fishermatrix import analyze_and_save_to_txt
+
+    network = Network(['ET', 'CE1'], detection_SNR=(8., 10.))
+
+    population_file = tmp_path / 'population.hdf5'
+    bbh_population.to_hdf(population_file, 'population')
+
+    analyze_and_save_to_txt(
+        network, population_file, list(FISHER_PARAMETERS), [[0], [0, 1]], 'test', save_path=tmp_path,
+        population_chunk_size=2, derivatives_path=tmp_path / 'streamed', **KWARGS
+    )
+    compute_network_errors(network, bbh_population, list(FISHER_PARAMETERS), derivatives_path=tmp_path / 'derivatives', **KWARGS)
+
+    # one store per sub-network, with the records of all the blocks of the file
+    single = DerivativeStore(tmp_path / 'streamed' / 'derivatives_ET_test_SNR10')
+    assert single.detector_names == ['ET']
+    assert np.array_equal(single.records[:, 0], bbh_population.index)
+
+    streamed = DerivativeStore(tmp_path / 'streamed' / 'derivatives_ET_CE1_test_SNR10')
+    store = DerivativeStore(tmp_path / 'derivatives')
+    assert streamed.parameter_names == store.parameter_names
+    assert np.array_equal(streamed.records, store.records)
+    for item in range(len(store)):
+        assert np.array_equal(streamed[item], store[item])
+
+def test_derivative_store_index(tmp_path, monkeypatch):
+
+    frequencyvectors = [np.linspace(2., 10., 5), np.linspace(1., 4., 4)]
+    store = DerivativeStore.create(tmp_path, ['mass_1', 'phase'], ['ET', 'CE1'], frequencyvectors, [3, 1])
+
+    rng = np.random.default_rng(0)
+    records = np.array([[0, 0, 1, 2], [0, 1, 0, 4], [1, 0, 0, 5]])
+    arrays = [
+        rng.standard_normal((3, n_bins, n_components)) + 1j * rng.standard_normal((3, n_bins, n_components))
+        for n_bins, n_components in [(2, 3), (4, 1), (5, 3)]
+    ]
+    store.append(np.concatenate([array.ravel() for array in arrays[:2]]), records[:2])
+    store.append(arrays[2].ravel(), records[2:])
+
+    # the offsets are computed once after each append, not at each access
+    def fail(*args, **kwargs):
+        raise AssertionError('offsets recomputed')
+    monkeypatch.setattr(store, '_sizes', fail)
+
+    assert len(store) == 3
+    assert np.array_equal(store.offsets, [0, 18, 30, 75])
+    for item, array in enumerate(arrays):
+        assert np.array_equal(store[item], array)
+
+    monkeypatch.undo()
+
+    # a block whose writing was interrupted is ignored
+    with open(tmp_path / 'records.bin', 'ab') as file:
+        records[:1].tofile(file)
+    reopened = DerivativeStore(tmp_path)
+    assert len(reopened) == 3
+    assert np.array_equal(reopened[2], arrays[2])
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import GWFish.modules.waveforms as waveforms
+from GWFish.modules.detection import Network
+from GWFish.modules.fishermatrix import compute_detector_fisher, compute_network_errors
+from GWFish.modules.roq import ReducedOrderQuadrature, build_reduced_order_quadrature, roq_detector_fisher, roq_network_errors
+
+FISHER_PARAMETERS = [
+    'mass_1',
+    'mass_2',
+    'luminosity_distance',
+    'theta_jn',
+    'dec',
+    'ra',
+    'psi',
+    'phase',
+    'geocent_time',
+    'a_1',
+    'a_2',
+]
+
+def bbh_parameters(n_signals, rng):
+    return pd.DataFrame({
+        'mass_1': rng.uniform(28., 32., n_signals),
+        'mass_2': rng.uniform(23., 27., n_signals),
+        'luminosity_distance': rng.uniform(500., 2000., n_signals),
+        'theta_jn': np.arccos(rng.uniform(-1., 1., n_signals)),
+        'dec': np.arcsin(rng.uniform(-1., 1., n_signals)),
+        'ra': rng.uniform(0., 2 * np.pi, n_signals),
+        'psi': rng.uniform(0., np.pi, n_signals),
+        'phase': rng.uniform(0., 2 * np.pi, n_signals),
+        'geocent_time': 1e9 + rng.uniform(0., 86400., n_signals),
+        'a_1': rng.uniform(-0.2, 0.2, n_signals),
+        'a_2': rng.uniform(-0.2, 0.2, n_signals),
+    })
+
+def test_roq_errors_match_full_grid(tmp_path):
+
+    rng = np.random.default_rng(1)
+    network = Network(['CE1'], detection_SNR=(0., 0.))
+
+    roq = build_reduced_order_quadrature(network.detectors[0], bbh_parameters(200, rng), 'IMRPhenomD')
+    assert len(roq.nodes) < len(network.detectors[0].frequencyvector) / 10
+
+    roq.save(tmp_path / 'CE1_roq.npz')
+    loaded = ReducedOrderQuadrature.load(tmp_path / 'CE1_roq.npz')
+    assert loaded.detector_name == 'CE1' and loaded.waveform_model == 'IMRPhenomD'
+    assert np.array_equal(loaded.gram_matrices, roq.gram_matrices)
+
+    population = bbh_parameters(3, rng)
+    for i in range(len(population)):
+        fisher, snr_square = roq_detector_fisher(loaded, network.detectors[0], population.iloc[i], FISHER_PARAMETERS)
+        exact_fisher, exact_snr_square = compute_detector_fisher(
+            network.detectors[0], population.iloc[i], FISHER_PARAMETERS, 'IMRPhenomD', waveforms.LALFD_Waveform
+        )
+        assert np.isclose(snr_square, exact_snr_square, rtol=1e-3)
+        # entries are compared relative to the scale set by the diagonal
+        scale = np.sqrt(np.diag(exact_fisher))
+        assert np.all(np.abs(fisher - exact_fisher) <= 1e-3 * np.outer(scale, scale))
+
+    _, snr, _, _ = roq_network_errors([loaded], network, population, FISHER_PARAMETERS)
+    _, exact_snr, _, _ = compute_network_errors(
+        network, population, list(FISHER_PARAMETERS), waveform_model='IMRPhenomD', waveform_class=waveforms.LALFD_Waveform
+    )
+    assert np.allclose(snr, exact_snr, rtol=1e-3)
+
+def test_roq_rejects_other_grids():
+
+    network = Network(['CE1', 'ET'])
+    rng = np.random.default_rng(2)
+    roq = build_reduced_order_quadrature(network.detectors[0], bbh_parameters(5, rng), 'IMRPhenomD')
+
+    with pytest.raises(ValueError):
+        roq_network_errors([roq, roq], network, bbh_parameters(1, rng), FISHER_PARAMETERS)
@@ -1,7 +1,7 @@
 import numpy as np
 
 from GWFish.modules.detection import Detector, projection
-from GWFish.modules.waveforms import TaylorF2
+from GWFish.modules.waveforms import TaylorF2, IMRPhenomD
 
 import pytest
 
@@ -144,3 +144,149 @@ def test_max_f_cutoff_signal_duration(redefine_tf_vectors):
         atol = delta_t,
         rtol = 0
     )
+
+@pytest.mark.parametrize('waveform_class', [TaylorF2, IMRPhenomD])
+@pytest.mark.parametrize('parameter', ['delta_phi_0', 'delta_phi_2', 'delta_phi_5', 'delta_phi_6', 'ppe_beta'])
+def test_deviation_derivatives_match_finite_differences(waveform_class, parameter):
+
+    params = {
+        'mass_1': 30.,
+        'mass_2': 25.,
+        'a_1': 0.2,
+        'luminosity_distance': 1000.,
+        'theta_jn': 0.5,
+        'phase': 0.,
+        'geocent_time': 0.,
+        'delta_phi_2': 0.05,
+        'ppe_beta': 0.01,
+        'ppe_b': -3.,
+    }
+    data_params = {
+        'frequencyvector': Detector('ET').frequencyvector,
+        'f_ref': 50.
+    }
+    model = waveform_class.__name__
+
+    waveform = waveform_class(model, params, data_params)
+    strain = waveform()
+    analytic = 1j * waveform.phase_derivatives[parameter] * strain
+
+    # small enough for the phase to change by less than 1e-5 rad
+    step = 1e-5 / np.max(np.abs(waveform.phase_derivatives[parameter]))
+    strains = []
+    for sign in [-1, 1]:
+        shifted = dict(params, **{parameter: params.get(parameter, 0.) + sign * step})
+        strains.append(waveform_class(model, shifted, data_params)())
+    numerical = (strains[1] - strains[0]) / (2 * step)
+
+    assert np.allclose(analytic, numerical, rtol=0, atol=1e-4 * np.max(np.abs(analytic)))
+
+def test_deviation_parameters_in_fisher_matrix():
+
+    from GWFish.modules.fishermatrix import compute_detector_fisher
+    
+    params = {
+        'mass_1': 30.,
+        'mass_2': 25.,
+        'luminosity_distance': 1000.,
+        'theta_jn': 0.5,
+        'ra': 1.,
+        'dec': 0.2,
+        'psi': 0.3,
+        'phase': 0.,
+        'geocent_time': 1e9,
+        'ppe_b': -7.,
+    }
+    fisher_parameters = ['mass_1', 'mass_2', 'geocent_time', 'phase', 'delta_phi_2', 'ppe_beta']
+
+    fisher, _ = compute_detector_fisher(Detector('ET'), params, fisher_parameters, 'TaylorF2', TaylorF2)
+    assert fisher.shape == (6, 6)
+    assert np.all(np.diag(fisher) > 0)
+
+    params.pop('ppe_b')
+    with pytest.raises(ValueError):
+        compute_detector_fisher(Detector('ET'), params, fisher_parameters, 'TaylorF2', TaylorF2)
+
+def test_lal_waveforms_share_generators():
+
+    from GWFish.modules.waveforms import LALFD_Waveform
+
+    data_params = {'frequencyvector': np.arange(10., 1024., 0.5)[:, np.newaxis], 'f_ref': 50.}
+    params = {
+        'mass_1': 1.5,
+        'mass_2': 1.3,
+        'luminosity_distance': 100.,
+        'theta_jn': 0.4,
+        'phase': 0.3,
+        'geocent_time': 1e9,
+        'a_1': 0.02,
+    }
+    tidal_params = {**params, 'lambda_1': 400., 'lambda_2': 300.}
+
+    waveform = LALFD_Waveform('IMRPhenomD_NRTidalv2', params, data_params)
+    tidal_waveform = LALFD_Waveform('IMRPhenomD_NRTidalv2', tidal_params, data_params)
+    assert waveform._generator is tidal_waveform._generator
+
+    # the waveforms do not depend on the ones computed before with the same LAL objects
+    strains = [waveform(), tidal_waveform()]
+    for parameters, strain in zip([params, tidal_params, params], strains + strains[:1]):
+        assert np.array_equal(LALFD_Waveform('IMRPhenomD_NRTidalv2', parameters, data_params)(), strain)
+
+    assert not np.allclose(strains[0], strains[1], atol=0)
+
+def test_batched_fft_matches_single_transforms():
+
+    import lal
+    import GWFish.modules.fft as fft
+
+    rng = np.random.default_rng(0)
+    series = []
+    for _ in range(3):
+        timeseries = lal.CreateREAL8TimeSeries('h', lal.LIGOTimeGPS(1e9), 0., 1 / 512, lal.DimensionlessUnit, 4096)
+        timeseries.data.data = rng.standard_normal(4096)
+        series.append(timeseries)
+
+    in_band = fft.fft_lal_timeseries_in_band(series, 100, 1800)
+    assert in_band.shape == (1700, 3)
+    for i, timeseries in enumerate(series):
+        assert np.array_equal(in_band[:, i], fft.fft_lal_timeseries(timeseries, 0.125).data.data[100:1800])
+
+    # the plan is created once for each length
+    assert fft.forward_plan(4096) is fft.forward_plan(4096)
+
+    with pytest.raises(ValueError):
+        fft.fft_lal_timeseries_in_band([series[0], lal.CreateREAL8TimeSeries('h', lal.LIGOTimeGPS(0), 0., 1 / 512, lal.DimensionlessUnit, 2048)], 0, 10)
+
+def test_long_time_domain_waveforms_in_frequency_domain(monkeypatch):
+
+    from GWFish.modules.waveforms import LALTD_Waveform, LALFD_Waveform
+
+    data_params = {'frequencyvector': np.arange(16., 1024.25, 0.25)[:, np.newaxis], 'f_ref': 50.}
+    params = {
+        'mass_1': 30.,
+        'mass_2': 25.,
+        'luminosity_distance': 400.,
+        'theta_jn': 0.4,
+        'phase': 0.3,
+        'geocent_time': 1e9,
+    }
+
+    waveform = LALTD_Waveform('IMRPhenomT', params, data_params)
+    strain = waveform()
+    assert waveform.time_domain_memory_estimate > 2 * 8 * waveform.n_time_domain_samples
+    assert waveform.approximant_used == 'IMRPhenomT'
+    # the time series are released once transformed
+    assert waveform._lal_ht_plus is None
+
+    monkeypatch.setattr(LALTD_Waveform, 'max_time_domain_samples', waveform.n_time_domain_samples // 2)
+
+    # the approximant itself if it is implemented in frequency domain, its equivalent otherwise
+    for name, frequency_domain_name in [('IMRPhenomXAS', 'IMRPhenomXAS'), ('IMRPhenomT', 'IMRPhenomXAS')]:
+        long_waveform = LALTD_Waveform(name, params, data_params)
+        assert np.array_equal(long_waveform(), LALFD_Waveform(frequency_domain_name, params, data_params)())
+        assert long_waveform.time_domain_memory_estimate is None
+        assert long_waveform.approximant_used == frequency_domain_name
+
+    # the two models have the same amplitudes, up to a constant phase and time shift
+    in_band = (data_params['frequencyvector'][:, 0] > 20.) & (data_params['frequencyvector'][:, 0] < 200.)
+    assert np.allclose(np.abs(long_waveform()[in_band]), np.abs(strain[in_band]), rtol=1e-2, atol=0)